@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import case, func
 from sqlmodel import Session, select
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from uuid import UUID
 from datetime import datetime
 from app.core.db import get_session
@@ -57,8 +58,25 @@ def get_active_doctors(
         for user, profile in results
     ]
 
+# Queue position of each triage level; no consultation / no triage = LOW
+TRIAGE_PRIORITY = case(
+    (Consultation.triage_category == TriageCategory.CRITICAL, 0),
+    (Consultation.triage_category == TriageCategory.HIGH, 1),
+    (Consultation.triage_category == TriageCategory.MODERATE, 2),
+    else_=3,
+)
+
+ACTIVE_APPOINTMENT_STATUSES = [
+    AppointmentStatus.SCHEDULED,
+    AppointmentStatus.CHECKED_IN,
+    AppointmentStatus.IN_PROGRESS
+]
+
 @router.get("/triage_queue", response_model=List[Dict[str, Any]])
 def get_triage_queue(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
     session: Session = Depends(get_session),
     current_user: User = Depends(RoleChecker([UserRole.FRONT_DESK, UserRole.DOCTOR]))
 ):
@@ -68,73 +86,62 @@ def get_triage_queue(
     CRITICAL patients appear at TOP of queue.
     Includes patients who booked online OR checked in manually.
     Excludes COMPLETED, CANCELLED, NO_SHOW appointments.
+    Paginated with limit/offset when `limit` is given (the whole queue
+    otherwise); X-Total-Count carries the queue length.
     """
-    # Query appointments with patient profiles
-    active_statuses = [
-        AppointmentStatus.SCHEDULED,
-        AppointmentStatus.CHECKED_IN,
-        AppointmentStatus.IN_PROGRESS
-    ]
-    
+    # One query: appointment, patient name and consultation triage columns,
+    # ordered by triage level, then longest wait (earliest scheduled) first
     statement = (
-        select(Appointment, PatientProfile)
+        select(
+            Appointment.id, Appointment.patient_id, Appointment.status, Appointment.scheduled_at, Appointment.doctor_name,
+            PatientProfile.first_name, PatientProfile.last_name,
+            Consultation.urgency_score, Consultation.triage_category, Consultation.triage_reason,
+        )
         .join(PatientProfile, Appointment.patient_id == PatientProfile.user_id)
-        .where(Appointment.status.in_(active_statuses))
-        .order_by(Appointment.scheduled_at.asc())
+        .outerjoin(Consultation, Consultation.appointment_id == Appointment.id)
+        .where(Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES))
+        .order_by(TRIAGE_PRIORITY, Appointment.scheduled_at.asc(), Appointment.id)
+        .offset(offset)
     )
-    results = session.exec(statement).all()
-    
+    if limit is not None:
+        statement = statement.limit(limit)
+    rows = session.exec(statement).all()
+
+    total = session.exec(
+        select(func.count())
+        .select_from(Appointment)
+        .join(PatientProfile, Appointment.patient_id == PatientProfile.user_id)
+        .where(Appointment.status.in_(ACTIVE_APPOINTMENT_STATUSES))
+    ).one()
+    response.headers["X-Total-Count"] = str(total)
+
+    now = datetime.utcnow()
     queue = []
-    for appointment, profile in results:
-        # Get triage info from consultation
-        urgency_score = 20  # Default LOW
-        triage_category = TriageCategory.LOW
-        triage_reason = None
-        
-        if appointment.consultation:
-            urgency_score = appointment.consultation.urgency_score or 20
-            triage_category = appointment.consultation.triage_category or TriageCategory.LOW
-            triage_reason = appointment.consultation.triage_reason
+    for row in rows:
+        triage_category = row.triage_category or TriageCategory.LOW
         
         # Calculate wait time (minutes since scheduled/check-in)
         wait_time = 0
-        if appointment.scheduled_at:
-            wait_time = int((datetime.utcnow() - appointment.scheduled_at).total_seconds() / 60)
+        if row.scheduled_at:
+            wait_time = int((now - row.scheduled_at).total_seconds() / 60)
             if wait_time < 0:
                 wait_time = 0
         
         queue.append({
-            "id": str(appointment.id),
-            "appointment_id": str(appointment.id),
-            "patient_id": str(appointment.patient_id),
-            "name": f"{title_case(profile.first_name)} {title_case(profile.last_name)}",
-            "triageScore": urgency_score,
+            "id": str(row.id),
+            "appointment_id": str(row.id),
+            "patient_id": str(row.patient_id),
+            "name": f"{title_case(row.first_name)} {title_case(row.last_name)}",
+            "triageScore": row.urgency_score or 20,  # Default LOW
             "triageCategory": triage_category.value if hasattr(triage_category, 'value') else str(triage_category),
-            "triageReason": triage_reason,
-            "status": appointment.status.value if hasattr(appointment.status, 'value') else str(appointment.status),
-            "scheduledAt": appointment.scheduled_at.isoformat() if appointment.scheduled_at else None,
-            "assignedDoctor": title_case(appointment.doctor_name) if appointment.doctor_name else None,
-            "checkInTime": appointment.scheduled_at.isoformat() if appointment.scheduled_at else datetime.utcnow().isoformat(),
+            "triageReason": row.triage_reason,
+            "status": row.status.value if hasattr(row.status, 'value') else str(row.status),
+            "scheduledAt": row.scheduled_at.isoformat() if row.scheduled_at else None,
+            "assignedDoctor": title_case(row.doctor_name) if row.doctor_name else None,
+            "checkInTime": row.scheduled_at.isoformat() if row.scheduled_at else now.isoformat(),
             "waitTime": wait_time
         })
     
-    # Sort queue: CRITICAL first, then by wait time (descending)
-    priority_order = {
-        TriageCategory.CRITICAL.value: 0,
-        TriageCategory.HIGH.value: 1,
-        TriageCategory.MODERATE.value: 2,
-        TriageCategory.LOW.value: 3,
-        "CRITICAL": 0,
-        "HIGH": 1,
-        "MODERATE": 2,
-        "LOW": 3,
-    }
-    
-    queue.sort(key=lambda x: (
-        priority_order.get(x["triageCategory"], 4),
-        -x["waitTime"]  # Higher wait time = higher priority within same triage level
-    ))
-    
     return queue
 
 
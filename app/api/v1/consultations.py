@@ -1,15 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from datetime import datetime, timedelta
 from sqlmodel import Session, select
-from app.core.db import get_session
-from app.models.base import Consultation, ConsultationStatus, Appointment, User, UserRole, AudioFile, SOAPNote, AudioUploaderType, AudioFileType, PatientProfile, DoctorProfile, Bill, PaymentStatus
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.db import get_async_session, get_session
+from app.models.base import Consultation, ConsultationStatus, Appointment, User, UserRole, AudioFile, SOAPNote, AudioUploaderType, AudioFileType, PatientProfile, DoctorProfile, Bill, PaymentStatus, JobType
 from app.api.deps import get_current_user, RoleChecker
-from app.services.consultation_processor import process_transcription_only, process_soap_generation
+from app.services.job_queue import JobQueue
+from app.services.upload_storage import UploadTooLarge, discard_upload, move_upload, save_upload
+from app.services.audio_transcoder import needs_transcode
+from app.core.config import settings
 from pydantic import BaseModel
 from typing import Optional, List, Any, Dict
 from uuid import UUID, uuid4
 import os
-import shutil
 
 router = APIRouter()
 
@@ -179,50 +182,51 @@ def get_patient_consultations(
 @router.post("/{id}/upload")
 async def upload_audio(
     id: UUID,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     source: Optional[str] = Form(None), # PRE_VISIT or CONSULTATION
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(RoleChecker([UserRole.DOCTOR, UserRole.PATIENT, UserRole.FRONT_DESK]))
 ):
+    stored = None
     try:
         print(f"DEBUG_UPLOAD: Request for Consultation {id}, File: {file.filename}, Source: {source}", flush=True)
-        consultation = session.get(Consultation, id)
+        consultation = await session.get(Consultation, id)
         if not consultation:
             print(f"Consultation {id} not found")
             raise HTTPException(status_code=404, detail="Consultation not found")
             
         # Enforce Front Desk Restriction: Upload ONLY ONCE
         if current_user.role == UserRole.FRONT_DESK:
-            existing_audio = session.exec(select(AudioFile).where(AudioFile.consultation_id == id)).first()
+            existing_audio = (await session.exec(select(AudioFile).where(AudioFile.consultation_id == id))).first()
             if existing_audio:
                 raise HTTPException(status_code=403, detail="Front Desk can only upload audio once during check-in.")
             
         # Validation
-        # 1. Size Limit (50MB)
-        file.file.seek(0, 2)
-        file_size = file.file.tell()
-        file.file.seek(0)
-        
-        if file_size > 50 * 1024 * 1024: # 50 MB
-             print(f"File too large: {file_size} bytes")
-             raise HTTPException(status_code=413, detail="File too large. Maximum size is 50MB.")
-
-        # 2. Format
+        # 1. Format
         if not file.filename.lower().endswith(('.wav', '.mp3', '.m4a', '.aac', '.webm')): # Case insensitive check
             print(f"Invalid file format: {file.filename}")
             raise HTTPException(status_code=400, detail="Invalid file format")
 
+        # 2. Size Limit (50MB), enforced while streaming to disk, before any existing data is cleared
+        file_ext = os.path.splitext(file.filename)[1]
+        # Unique ID still needed to prevent collision if multiple uploads in same minute, prepending
+        file_id = uuid4()
+        try:
+            stored = await save_upload(file, os.path.join(UPLOAD_DIR, f"incoming_{file_id}{file_ext}"), settings.UPLOAD_MAX_BYTES)
+        except UploadTooLarge:
+            print(f"File too large: {file.filename}")
+            raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {settings.UPLOAD_MAX_BYTES // (1024 * 1024)}MB.")
+
         # Clear existing SOAP note if exists (for Redo scenarios)
         # This ensures frontend polling puts UI back into "processing" state
-        existing_soap = session.exec(select(SOAPNote).where(SOAPNote.consultation_id == id)).first()
+        existing_soap = (await session.exec(select(SOAPNote).where(SOAPNote.consultation_id == id))).first()
         if existing_soap:
-            session.delete(existing_soap)
+            await session.delete(existing_soap)
         
         # Clean Slate: Delete OLD Audio Files for this consultation to avoid accumulation
-        existing_audio_files = session.exec(select(AudioFile).where(AudioFile.consultation_id == id)).all()
+        existing_audio_files = (await session.exec(select(AudioFile).where(AudioFile.consultation_id == id))).all()
         for audio in existing_audio_files:
-            session.delete(audio) # Delete file record (Physical file deletion could be added here if needed)
+            await session.delete(audio) # Delete file record (Physical file deletion could be added here if needed)
 
         # Also clear the "flat" fields on the consultation object to prevent old data from showing
         # while the new analysis is running (or if it fails).
@@ -230,9 +234,9 @@ async def upload_audio(
         consultation.diagnosis = ""
         consultation.prescription = ""
         session.add(consultation)
-        session.commit()
+        await session.commit()
         # Refresh consultation to ensure relation is updated in session if needed
-        session.refresh(consultation)
+        await session.refresh(consultation)
 
         # --- NAMING CONVENTION LOGIC ---
         # Fetch Profiles for Naming
@@ -242,14 +246,14 @@ async def upload_audio(
         
         try:
             # Patient
-            pat_profile = session.exec(select(PatientProfile).where(PatientProfile.user_id == consultation.patient_id)).first()
+            pat_profile = (await session.exec(select(PatientProfile).where(PatientProfile.user_id == consultation.patient_id))).first()
             if pat_profile:
                  p_first = (pat_profile.first_name or "XXX")[:3].upper()
                  p_last = (pat_profile.last_name or "XXX")[:3].upper()
                  pat_name = f"{p_first}{p_last}"
             
             # Doctor
-            doc_profile = session.exec(select(DoctorProfile).where(DoctorProfile.user_id == consultation.doctor_id)).first()
+            doc_profile = (await session.exec(select(DoctorProfile).where(DoctorProfile.user_id == consultation.doctor_id))).first()
             if doc_profile:
                  d_first = (doc_profile.first_name or "XXX")[:3].upper()
                  d_last = (doc_profile.last_name or "XXX")[:3].upper()
@@ -262,16 +266,10 @@ async def upload_audio(
         now = datetime.now()
         timestamp_str = now.strftime("%d-%m-%Y_%H-%M")
         
-        file_ext = os.path.splitext(file.filename)[1]
-        # Unique ID still needed to prevent collision if multiple uploads in same minute, prepending
-        file_id = uuid4()
-        
         # Final Name: PATLAA_DOCSMI_06-01-2025_10-30_UUID.webm
         safe_filename = f"{pat_name}_{doc_name}_{timestamp_str}_{str(file_id)[:8]}{file_ext}"
         file_path = os.path.join(UPLOAD_DIR, safe_filename)
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        stored = await move_upload(stored, file_path)
             
         # Determine File Type
         try:
@@ -282,46 +280,6 @@ async def upload_audio(
         except ValueError:
             file_type = AudioFileType.PRE_VISIT
 
-        # --- AUDIO CONVERSION (WebM -> MP3) ---
-        # Gemini often rejects raw browser WebM. Convert to MP3 for compatibility.
-        original_path = file_path
-        
-        # Check if conversion is needed (convert everything not MP3/WAV just to be safe, or specifically WebM)
-        if file_ext.lower() not in ['.mp3', '.wav']:
-            try:
-                print(f"Converting {file.filename} to MP3...")
-                mp3_filename = os.path.splitext(safe_filename)[0] + ".mp3"
-                mp3_path = os.path.join(UPLOAD_DIR, mp3_filename)
-                
-                import subprocess
-                # ffmpeg -i input.webm -vn -acodec libmp3lame -q:a 2 output.mp3
-                # -vn: disable video, -y: overwrite
-                cmd = [
-                    "ffmpeg", "-y", 
-                    "-i", original_path, 
-                    "-vn", 
-                    "-acodec", "libmp3lame", 
-                    "-q:a", "2", 
-                    mp3_path
-                ]
-                
-                # Run conversion
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                if result.returncode == 0:
-                    print(f"Conversion successful: {mp3_filename}")
-                    # Update references to use the new MP3
-                    safe_filename = mp3_filename
-                    file_path = mp3_path
-                    # Optional: Remove original to save space? Keep for now for debugging.
-                else:
-                    print(f"FFmpeg conversion failed: {result.stderr.decode()}")
-                    # Fallback to original file if conversion fails
-                    
-            except Exception as e:
-                print(f"Conversion exception: {e}")
-                # Fallback to original file
-
         # Create AudioFile Record
         # CRITICAL: Map FRONT_DESK to DOCTOR uploader type to avoid DB Enum error
         if current_user.role == UserRole.DOCTOR or current_user.role == UserRole.FRONT_DESK:
@@ -336,6 +294,8 @@ async def upload_audio(
             file_type=file_type, # Correctly mapping to DB column file_type
             file_name=safe_filename, # Store the convenient name
             file_url=file_path,
+            file_size=stored.size,
+            content_sha256=stored.sha256,
             is_transcript_verified=False # Explicitly set Unverified by default
         )
         session.add(audio_file)
@@ -343,41 +303,48 @@ async def upload_audio(
         # Update Status
         consultation.status = ConsultationStatus.IN_PROGRESS
         session.add(consultation)
-        session.commit()
+        await session.commit()
+        # The AudioFile row now owns the file; keep it even if queueing fails (reprocess_audio can retry)
+        stored = None
         
-        # Trigger Background Task - TRANSCRIPTION ONLY
-        background_tasks.add_task(process_transcription_only, consultation.id, audio_file.id)
+        # Queue Background Job (picked up by app.worker). WebM etc. are converted to MP3
+        # by a TRANSCODE job, which then transcribes; the upload itself never waits on ffmpeg.
+        job_type = JobType.TRANSCODE if needs_transcode(safe_filename) else JobType.TRANSCRIPTION
+        job = await session.run_sync(JobQueue.enqueue, job_type, consultation.id, audio_file.id)
 
-        print(f"Upload successful. Processing background task for {safe_filename}")
-        return {"message": "Audio uploaded, transcription started", "audio_id": file_id}
+        print(f"Upload successful. Queued {job_type.value.lower()} job {job.id} for {safe_filename}")
+        return {"message": "Audio uploaded, transcription started", "audio_id": file_id, "job_id": job.id}
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"UPLOAD FAILED: {e}")
         import traceback
         traceback.print_exc()
+        if stored is not None:
+            await discard_upload(stored)
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 @router.post("/{id}/reprocess_audio")
 async def reprocess_audio(
     id: UUID,
-    background_tasks: BackgroundTasks,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(RoleChecker([UserRole.DOCTOR, UserRole.MASTER_ADMIN]))
 ):
     """
     Manually triggers transcription for an existing audio file.
     Useful if transcription failed or was skipped.
     """
-    consultation = session.get(Consultation, id)
+    consultation = await session.get(Consultation, id)
     if not consultation:
         raise HTTPException(status_code=404, detail="Consultation not found")
 
     # Find valid audio file
-    audio_file = session.exec(
+    audio_file = (await session.exec(
         select(AudioFile)
         .where(AudioFile.consultation_id == id)
         .where(AudioFile.file_type == AudioFileType.CONSULTATION)
-    ).first()
+    )).first()
 
     if not audio_file:
          raise HTTPException(status_code=404, detail="No consultation audio found to process")
@@ -391,33 +358,32 @@ async def reprocess_audio(
     # Update status to show something is happening
     consultation.status = ConsultationStatus.IN_PROGRESS
     session.add(consultation)
-    session.commit()
+    await session.commit()
 
-    # Trigger Background Task
-    background_tasks.add_task(process_transcription_only, consultation.id, audio_file.id)
+    # Queue Background Job
+    job = await session.run_sync(JobQueue.enqueue, JobType.TRANSCRIPTION, consultation.id, audio_file.id)
 
-    return {"message": "Reprocessing started", "audio_id": audio_file.id}
+    return {"message": "Reprocessing started", "audio_id": audio_file.id, "job_id": job.id}
 
 @router.post("/{id}/generate_soap")
 async def generate_soap(
     id: UUID,
-    background_tasks: BackgroundTasks,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(RoleChecker([UserRole.DOCTOR, UserRole.MASTER_ADMIN]))
 ):
     """
     Triggers SOAP note generation from existing transcript.
     """
-    consultation = session.get(Consultation, id)
+    consultation = await session.get(Consultation, id)
     if not consultation:
         raise HTTPException(status_code=404, detail="Consultation not found")
         
     print(f"Manual SOAP generation triggered for {id}")
     
-    # Trigger Background Processing - STEP 2 (SOAP Gen)
-    background_tasks.add_task(process_soap_generation, id)
+    # Queue Background Job - STEP 2 (SOAP Gen)
+    job = await session.run_sync(JobQueue.enqueue, JobType.SOAP_GENERATION, id)
     
-    return {"status": "SOAP generation started"}
+    return {"status": "SOAP generation started", "job_id": job.id}
 
 class ConsultationUpdate(BaseModel):
     notes: Optional[str] = None
@@ -428,21 +394,23 @@ class ConsultationUpdate(BaseModel):
 @router.get("/{id}/intake_summary")
 async def get_intake_summary(
     id: UUID,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(RoleChecker([UserRole.DOCTOR, UserRole.MASTER_ADMIN]))
 ):
     """
     Returns a clinical summary of any pre-visit (Front Desk/Patient) recordings.
     """
-    consultation = session.get(Consultation, id)
+    consultation = await session.get(Consultation, id)
     if not consultation:
         raise HTTPException(status_code=404, detail="Consultation not found")
         
-    pre_visit_audio = session.exec(
+    pre_visit_audio = (await session.exec(
         select(AudioFile)
         .where(AudioFile.consultation_id == id)
         .where(AudioFile.file_type == AudioFileType.PRE_VISIT)
-    ).all()
+    )).all()
+    # Reads are done: return the connection before the Gemini call
+    await session.close()
     
     if not pre_visit_audio:
         return {"summary": "No pre-visit data available.", "full_transcript": ""}
@@ -618,10 +586,10 @@ async def upload_document(
     id: UUID,
     file: UploadFile = File(...),
     document_type: DocumentType = Form(...),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(RoleChecker([UserRole.DOCTOR, UserRole.FRONT_DESK]))
 ):
-    consultation = session.get(Consultation, id)
+    consultation = await session.get(Consultation, id)
     if not consultation:
         raise HTTPException(status_code=404, detail="Consultation not found")
         
@@ -634,9 +602,7 @@ async def upload_document(
     file_ext = os.path.splitext(file.filename)[1]
     safe_filename = f"doc_{file_id}{file_ext}"
     file_path = os.path.join(UPLOAD_DIR, safe_filename)
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    await save_upload(file, file_path)
         
     # Create Record
     doc = MedicalDocument(
@@ -647,7 +613,7 @@ async def upload_document(
         file_url=file_path
     )
     session.add(doc)
-    session.commit()
+    await session.commit()
     
     return {"message": "Document uploaded", "document_id": file_id}
 
@@ -655,19 +621,21 @@ async def upload_document(
 async def analyze_document(
     id: UUID,
     document_id: str = Form(...),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(RoleChecker([UserRole.DOCTOR, UserRole.FRONT_DESK]))
 ):
     # Retrieve Document record to get path
     # Note: document_id passed from frontend is the UUID string
     try:
         doc_uuid = UUID(document_id)
-        doc = session.get(MedicalDocument, doc_uuid)
+        doc = await session.get(MedicalDocument, doc_uuid)
     except:
         raise HTTPException(status_code=400, detail="Invalid Document ID")
 
     if not doc or doc.consultation_id != id:
         raise HTTPException(status_code=404, detail="Document not found")
+    # Reads are done: return the connection before the Gemini call
+    await session.close()
         
     if not os.path.exists(doc.file_url):
          raise HTTPException(status_code=404, detail="File not found on server")
@@ -687,20 +655,24 @@ class DocumentGenerationRequest(BaseModel):
 async def generate_document(
     id: UUID,
     payload: DocumentGenerationRequest,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(RoleChecker([UserRole.DOCTOR, UserRole.FRONT_DESK]))
 ):
-    consultation = session.get(Consultation, id)
+    consultation = await session.get(Consultation, id)
     if not consultation:
          raise HTTPException(status_code=404, detail="Consultation not found")
 
-    if not consultation.soap_note:
+    soap_note = (await session.exec(select(SOAPNote).where(SOAPNote.consultation_id == id))).first()
+    if not soap_note:
          raise HTTPException(status_code=400, detail="SOAP Note must be generated first")
          
     # Fetch Patient
-    patient = session.get(User, consultation.patient_id)
+    patient = await session.get(User, consultation.patient_id)
     if not patient:
          raise HTTPException(status_code=404, detail="Patient not found")
+    patient_profile = (await session.exec(select(PatientProfile).where(PatientProfile.user_id == patient.id))).first()
+    # Reads are done: return the connection before the Gemini call
+    await session.close()
          
     # Build Context
     patient_context = {
@@ -708,13 +680,13 @@ async def generate_document(
         "last_name": "",
         "age": "N/A"
     }
-    if patient.patient_profile:
-        patient_context["first_name"] = patient.patient_profile.first_name
-        patient_context["last_name"] = patient.patient_profile.last_name
+    if patient_profile:
+        patient_context["first_name"] = patient_profile.first_name
+        patient_context["last_name"] = patient_profile.last_name
         # Calc age if dob exists, else N/A
     
     # Safe extraction from JSON
-    soap_data = consultation.soap_note.soap_json or {}
+    soap_data = soap_note.soap_json or {}
     soap_dict = {
         "subjective": soap_data.get("subjective", ""),
         "objective": soap_data.get("objective", ""),
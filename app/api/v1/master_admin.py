@@ -894,3 +894,33 @@ def get_dashboard_stats(
         "patients": patient_count,
         "clinics": clinic_count
     }
+
+# ============ TRIAGE MAINTENANCE ============
+
+@router.post("/triage/recompute", response_model=Dict[str, Any])
+def recompute_triage(
+    chunk_size: int = 1000,
+    dry_run: bool = False,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(RoleChecker([UserRole.MASTER_ADMIN]))
+):
+    """
+    Re-triage every AI-triaged consultation that has a SOAP note, e.g. after
+    the keyword lists change. Rows are scored in bulk and only changed
+    consultations are written. Use dry_run to preview the counts.
+    """
+    from app.services.triage_service import TriageService
+
+    if not 1 <= chunk_size <= 10000:
+        raise HTTPException(status_code=400, detail="chunk_size must be between 1 and 10000")
+
+    stats = TriageService.retriage_all(session, chunk_size=chunk_size, dry_run=dry_run)
+
+    if not dry_run:
+        log_audit(
+            session, current_user.id, "RECOMPUTE_TRIAGE",
+            target_type="CONSULTATION",
+            details={"scanned": stats["scanned"], "updated": stats["updated"]}
+        )
+
+    return {**stats, "dry_run": dry_run}
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlmodel import Session, select
 from app.core.db import get_session
 from app.models.base import MedicalTerm, MedicalTermCategory, User, UserRole
 from app.api.deps import get_current_user
+from app.services.medication_normalizer import medication_vocabulary
+from app.services.stt_vocabulary import word_boost_vocabulary
+from app.services.term_index import medical_term_index
 from pydantic import BaseModel
 from typing import List, Optional
 from uuid import UUID
@@ -39,6 +42,28 @@ def get_medical_terms(
     query = query.order_by(MedicalTerm.term.asc())
     return session.exec(query).all()
 
+@router.get("/search", response_model=List[MedicalTermRead])
+def search_medical_terms(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=100),
+    category: Optional[MedicalTermCategory] = None,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Autocomplete: up to `limit` terms starting with `q`, then terms with a
+    word starting with it, then near misses. Served from the in-memory
+    index; send the ETag back as If-None-Match to get a 304.
+    """
+    index = medical_term_index.get()
+    etag = index.etag(q, category, limit)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return index.search(q, category, limit)
+
 @router.post("/", response_model=MedicalTermRead)
 def create_medical_term(
     term_data: MedicalTermCreate,
@@ -72,6 +97,10 @@ def create_medical_term(
     session.add(term)
     session.commit()
     session.refresh(term)
+    medical_term_index.add(term)
+    word_boost_vocabulary.invalidate()
+    if term.category == MedicalTermCategory.MEDICATION:
+        medication_vocabulary.invalidate()
     return term
 
 @router.delete("/{term_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -94,5 +123,10 @@ def delete_medical_term(
     if not term:
         raise HTTPException(status_code=404, detail="Medical term not found")
 
+    category = term.category
     session.delete(term)
     session.commit()
+    medical_term_index.remove(term_id)
+    word_boost_vocabulary.invalidate()
+    if category == MedicalTermCategory.MEDICATION:
+        medication_vocabulary.invalidate()
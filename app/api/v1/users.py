@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import and_, func, or_
 from sqlmodel import Session, select
 from app.core.db import get_session
 from app.models.base import User, PatientProfile, UserRole
 from app.api.deps import get_current_user, RoleChecker
+from app.services.medication_normalizer import normalize_medications
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from uuid import UUID
 from datetime import datetime
 
@@ -53,6 +56,8 @@ def update_my_profile(
     profile_data = profile_in.dict(exclude_unset=True)
     for key, value in profile_data.items():
         setattr(profile, key, value)
+    if "current_medications" in profile_data:
+        profile.normalized_medications = normalize_medications(profile.current_medications)
         
     profile.updated_at = datetime.utcnow()
     session.add(profile)
@@ -143,43 +148,82 @@ def get_patient_profile(
 
 @router.get("/patients", response_model=List[dict])
 def list_my_patients(
+    response: Response,
+    q: Optional[str] = Query(None, max_length=100),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
     session: Session = Depends(get_session),
     current_user: User = Depends(RoleChecker([UserRole.DOCTOR]))
 ):
     """
-    Returns list of patients appearing in the doctor's consultation history.
+    Returns list of patients appearing in the doctor's consultation history,
+    most recent visit first. `q` filters on first/last name.
+    Keyset-paginated when `limit` is given (the full list otherwise): pass
+    X-Next-Cursor back as `cursor` for the next page; the header is absent
+    on the last page.
     """
     from app.models.base import Consultation
-    
-    # query distinct patients involved in consultations with this doctor
-    # We want profile details.
-    
-    query = (
-        select(PatientProfile)
-        .join(Consultation, Consultation.patient_id == PatientProfile.user_id)
+
+    # One round trip: each patient's latest consultation with this doctor,
+    # joined to their profile
+    last_visits = (
+        select(Consultation.patient_id, func.max(Consultation.created_at).label("last_visit"))
         .where(Consultation.doctor_id == current_user.id)
-        .distinct()
+        .group_by(Consultation.patient_id)
+        .subquery()
     )
-    
-    profiles = session.exec(query).all()
-    
-    results = []
-    for p in profiles:
-        # Get latest consultation date
-        last_visit = session.exec(
-            select(Consultation.created_at)
-            .where(Consultation.patient_id == p.user_id)
-            .where(Consultation.doctor_id == current_user.id)
-            .order_by(Consultation.created_at.desc())
-        ).first()
-        
-        results.append({
-            "id": str(p.user_id), # Return User ID as the identifier
-            "first_name": p.first_name,
-            "last_name": p.last_name,
-            "gender": p.gender,
-            "date_of_birth": p.date_of_birth,
-            "last_visit": last_visit
-        })
-        
-    return results
+    query = (
+        select(
+            PatientProfile.user_id, PatientProfile.first_name, PatientProfile.last_name,
+            PatientProfile.gender, PatientProfile.date_of_birth, last_visits.c.last_visit,
+        )
+        .join(last_visits, last_visits.c.patient_id == PatientProfile.user_id)
+        .order_by(last_visits.c.last_visit.desc(), PatientProfile.user_id.desc())
+    )
+    if limit is not None:
+        query = query.limit(limit + 1)
+    if q and q.strip():
+        term = q.strip()
+        full_name = PatientProfile.first_name + " " + PatientProfile.last_name
+        query = query.where(or_(
+            PatientProfile.first_name.icontains(term, autoescape=True),
+            PatientProfile.last_name.icontains(term, autoescape=True),
+            full_name.icontains(term, autoescape=True),
+        ))
+    if cursor:
+        after_visit, after_id = _decode_patient_cursor(cursor)
+        query = query.where(or_(
+            last_visits.c.last_visit < after_visit,
+            and_(last_visits.c.last_visit == after_visit, PatientProfile.user_id < after_id),
+        ))
+
+    rows = session.exec(query).all()
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_patient_cursor(rows[-1].last_visit, rows[-1].user_id)
+
+    return [
+        {
+            "id": str(row.user_id), # Return User ID as the identifier
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "gender": row.gender,
+            "date_of_birth": row.date_of_birth,
+            "last_visit": row.last_visit,
+        }
+        for row in rows
+    ]
+
+
+def _encode_patient_cursor(last_visit: datetime, patient_id: UUID) -> str:
+    raw = f"{last_visit.isoformat()}|{patient_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_patient_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        last_visit, patient_id = raw.split("|")
+        return datetime.fromisoformat(last_visit), UUID(patient_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -1,5 +1,5 @@
 import os
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import root_validator
 from pydantic_settings import BaseSettings
 
@@ -8,7 +8,7 @@ class Settings(BaseSettings):
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440
-    ASSEMBLYAI_API_KEY: str
+    ASSEMBLYAI_API_KEY: Optional[str] = None  # Required when STT_BACKEND is "assemblyai"
     GOOGLE_API_KEY: Optional[str] = None
     GEMINI_API_KEY: Optional[str] = None
     UPLOAD_DIR: str = "uploads"
@@ -16,6 +16,86 @@ class Settings(BaseSettings):
     PORT: int = 8000
     USE_MOCK_AI: bool = False
 
+    # Connection pool (ignored for SQLite). Size it for API requests plus
+    # JOB_WORKER_CONCURRENCY when RUN_EMBEDDED_WORKER is on.
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0  # Wait for a free connection before failing the request
+    DB_POOL_PRE_PING: bool = True  # Test connections on checkout (drops ones the server closed)
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+
+    # Background job queue (see app/worker.py)
+    JOB_WORKER_CONCURRENCY: int = 4
+    JOB_LEASE_SECONDS: int = 600  # Visibility timeout before a stuck job is retried
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF_SECONDS: int = 30  # Multiplied by attempt number
+    JOB_POLL_INTERVAL_SECONDS: float = 2.0
+    RUN_EMBEDDED_WORKER: bool = False  # Run a worker inside the API process (local dev)
+
+    # Speech-to-text result cache (keyed by audio SHA-256 + config)
+    TRANSCRIPT_CACHE_ENABLED: bool = True
+    TRANSCRIPT_CACHE_DIR: str = ".cache/transcripts"
+    TRANSCRIPT_CACHE_MAX_MB: int = 256
+
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024  # Audio uploads are rejected while streaming past this
+    # WebM/M4A/AAC -> MP3 conversion, run by the worker as a TRANSCODE job
+    TRANSCODE_CONCURRENCY: int = 2  # ffmpeg processes per worker
+    TRANSCODE_TIMEOUT_SECONDS: int = 300
+
+    # Speech-to-text provider: "assemblyai", "gemini" or "local" (offline TextGrid replay)
+    STT_BACKEND: str = "assemblyai"
+    STT_LOCAL_TRANSCRIPT_DIR: str = "test-audio-transcripts"
+    STT_LOCAL_LATENCY_SECONDS: float = 0.0  # Simulated provider latency for the local backend
+
+    # Long recordings: split on silence and transcribe chunks in parallel
+    STT_CHUNKING_ENABLED: bool = False
+    STT_CHUNK_SECONDS: int = 120  # Target chunk length; cuts snap to the nearest silence
+    STT_CHUNK_OVERLAP_SECONDS: float = 5.0  # Padding on each side, used to match speakers across chunks
+    STT_CHUNK_CONCURRENCY: int = 4
+
+    # word_boost: MedicalTerm vocabulary ranked by usage, reloaded on term changes or after the TTL
+    STT_WORD_BOOST_LIMIT: int = 1000  # AssemblyAI's maximum number of boosted words/phrases
+    STT_WORD_BOOST_TTL_SECONDS: int = 3600
+
+    # Provider rate limiting (0 requests/minute = no token bucket)
+    RATE_LIMIT_BACKEND: str = "local"  # "local" (per process) or "db" (token bucket shared via rate_limit_buckets)
+    GEMINI_MAX_CONCURRENCY: int = 4
+    GEMINI_REQUESTS_PER_MINUTE: int = 60
+    ASSEMBLYAI_MAX_CONCURRENCY: int = 5
+    ASSEMBLYAI_REQUESTS_PER_MINUTE: int = 0
+    # Per provider/model overrides, e.g. {"gemini:gemini-2.5-flash": {"concurrency": 2, "rpm": 10}}
+    RATE_LIMIT_OVERRIDES: Dict[str, Dict[str, int]] = {}
+
+    # Dedicated thread pool for blocking Gemini SDK calls
+    LLM_EXECUTOR_WORKERS: int = 8
+
+    # Gemini response cache: in-memory LRU in front of the llm_response_cache table
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_SQL_TIER: bool = True
+    LLM_CACHE_MEMORY_ENTRIES: int = 512
+    # TTL in seconds per GeminiService method; 0 disables caching for that method
+    LLM_CACHE_TTLS: Dict[str, int] = {
+        "generate_soap_note_async": 7 * 24 * 3600,
+        "refine_transcript_diarization": 7 * 24 * 3600,
+        "generate_intake_summary": 24 * 3600,
+        "check_drug_interactions_async": 7 * 24 * 3600,
+        "check_drug_pairs_async": 0,  # Memoized per pair instead (drug_pair)
+        "check_drug_conditions_async": 7 * 24 * 3600,
+        "drug_pair": 30 * 24 * 3600,  # One drug pair's warnings, shared across patients
+        "generate_clinical_document": 3600,
+        "generate_clinical_bundle_async": 7 * 24 * 3600,
+        "clinical_bundle": 7 * 24 * 3600,  # Bundle handed from the transcription job to the SOAP job
+    }
+    # One Gemini call for diarization + SOAP + interaction warnings (falls back to separate calls on failure).
+    # Needs LLM_CACHE_ENABLED: the bundle reaches the SOAP job through the response cache
+    LLM_COMBINED_BUNDLE: bool = False
+
+    # Safety check: resolve drug pairs from the packaged index, ask Gemini only about unknown pairs
+    DRUG_INTERACTION_INDEX_ENABLED: bool = True
+    DRUG_INTERACTION_INDEX_PATH: Optional[str] = None  # Default: app/data/drug_interactions.json
+    MEDICATION_VOCABULARY_TTL_SECONDS: int = 300
+    MEDICAL_TERM_INDEX_TTL_SECONDS: int = 300  # Search index reload; picks up other workers' term changes
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
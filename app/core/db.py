@@ -1,12 +1,202 @@
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+import logging
+import threading
+import time
+
+from sqlalchemy import event, exc as sa_exc
+from sqlalchemy.orm import Session as _OrmSession
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import create_engine, Session, SQLModel
 from app.core.config import settings
-import logging
 
 logger = logging.getLogger(__name__)
 
+
+class PoolMetrics:
+    """Checkout counts and wait times for the engine's connection pool."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent_waits = deque(maxlen=window)  # ms
+        self.checkouts = 0
+        self.timeouts = 0
+        self.max_wait_ms = 0.0
+        self.held_across_external_calls = 0
+
+    def record_checkout(self, wait_s: float):
+        wait_ms = wait_s * 1000
+        with self._lock:
+            self.checkouts += 1
+            self._recent_waits.append(wait_ms)
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_held_session(self):
+        with self._lock:
+            self.held_across_external_calls += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_p95": round(p95, 2),
+                "wait_ms_max": round(self.max_wait_ms, 2),
+                "held_across_external_calls": self.held_across_external_calls,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class _InstrumentedPool:
+    """Pool mixin that reports how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except sa_exc.TimeoutError:
+            pool_metrics.record_timeout()
+            raise
+        pool_metrics.record_checkout(time.perf_counter() - started)
+        return connection
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def _engine_options(url: str, poolclass=InstrumentedQueuePool) -> Dict[str, Any]:
+    # SQLite (tests, local tools) keeps SQLAlchemy's own pool choice
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+    }
+
+
 # Use PostgreSQL from settings - NO SQLite fallback
 logger.info(f"Connecting to database: {settings.DATABASE_URL[:50]}...")
-engine = create_engine(settings.DATABASE_URL, echo=False)
+engine = create_engine(settings.DATABASE_URL, echo=False, **_engine_options(settings.DATABASE_URL))
+
+
+# Async engine for `async def` routes, on the driver's asyncio dialect
+# (asyncpg for PostgreSQL, aiosqlite for SQLite). Created on first use so the
+# sync app still imports without the async driver installed. It has its own
+# pool of the same size; checkout metrics are shared with the sync pool.
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+_async_engine: Optional[AsyncEngine] = None
+_async_engine_lock = threading.Lock()
+
+
+def async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {dialect!r} URLs")
+    return f"{ASYNC_DRIVERS[dialect]}{sep}{rest}"
+
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        with _async_engine_lock:
+            if _async_engine is None:
+                _async_engine = create_async_engine(
+                    async_database_url(settings.DATABASE_URL), echo=False,
+                    **_engine_options(settings.DATABASE_URL, InstrumentedAsyncQueuePool),
+                )
+    return _async_engine
+
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
+def _queue_pool_stats(pool) -> Dict[str, Any]:
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+    }
+
+
+def pool_stats() -> Dict[str, Any]:
+    stats = {**_queue_pool_stats(engine.pool), **pool_metrics.stats()}
+    if _async_engine is not None:
+        stats["async"] = _queue_pool_stats(_async_engine.pool)
+    return stats
+
+
+# Sessions of the current job or request that hold a connection (an open
+# transaction): id(session) -> time.monotonic() when the transaction began.
+# Each job/request task installs its own dict with track_held_sessions();
+# tasks and threads it starts (gather, asyncio.to_thread) see a copy of its
+# context and so record into the same dict. Outside a scope nothing is tracked.
+_held_sessions: ContextVar[Optional[Dict[int, float]]] = ContextVar("db_held_sessions", default=None)
+
+
+def track_held_sessions():
+    """Starts a fresh held-session scope for the current task (one per job or request)."""
+    return _held_sessions.set({})
+
+
+@event.listens_for(_OrmSession, "after_begin")
+def _track_session_begin(session, transaction, connection):
+    held = _held_sessions.get()
+    if held is not None:
+        held.setdefault(id(session), time.monotonic())
+
+
+@event.listens_for(_OrmSession, "after_transaction_end")
+def _track_session_end(session, transaction):
+    if transaction.parent is None:
+        held = _held_sessions.get()
+        if held:
+            held.pop(id(session), None)
+
+
+def warn_if_session_held(call: str) -> bool:
+    """
+    Called before awaiting an external provider. A session left open across
+    a multi-minute LLM/STT call keeps its pooled connection the whole time;
+    commit or close it first. Returns True if a session was held.
+    """
+    held = _held_sessions.get()
+    if not held:
+        return False
+    pool_metrics.record_held_session()
+    age = time.monotonic() - min(held.values())
+    logger.warning(
+        f"DB session held across external call to {call} "
+        f"({len(held)} open, oldest for {age:.1f}s); commit or close it before awaiting"
+    )
+    return True
 
 
 def init_db():
@@ -22,3 +212,9 @@ def test_connection():
 def get_session():
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session():
+    # Loaded attributes stay readable after commit: async sessions cannot lazy-load
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        yield session
@@ -3,7 +3,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.api.v1 import auth, users, appointments, consultations, dashboard, admin, master_admin, patient, transcription, frontdesk, medical_terms
 
-from app.core.db import init_db
+from app.core.db import dispose_async_engine, init_db, track_held_sessions
+from app.core.config import settings
+import asyncio
 import logging
 import traceback
 
@@ -26,6 +28,12 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Each request tracks the DB sessions it holds open across external calls
+@app.middleware("http")
+async def held_session_scope(request: Request, call_next):
+    track_held_sessions()
+    return await call_next(request)
+
 # Global exception handler to ensure CORS headers on all error responses
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -71,7 +79,51 @@ def startup():
     logger.info("Starting NeuroAssist API server...")
     init_db()
     logger.info("Database initialized successfully")
+    try:
+        from app.services.term_index import medical_term_index
+        logger.info(f"Medical term search index loaded ({len(medical_term_index.get())} terms)")
+    except Exception as e:
+        logger.warning(f"Medical term search index not loaded, will load on first search: {e}")
+
+# Optional in-process job worker for single-process local development.
+# In production run `python -m app.worker` as its own service instead.
+embedded_worker = None
+
+@app.on_event("startup")
+async def start_embedded_worker():
+    global embedded_worker
+    if settings.RUN_EMBEDDED_WORKER:
+        from app.worker import Worker
+        embedded_worker = Worker()
+        app.state.embedded_worker_task = asyncio.create_task(embedded_worker.run())
+        logger.info("Embedded job worker started")
+
+@app.on_event("shutdown")
+async def stop_embedded_worker():
+    if embedded_worker:
+        embedded_worker.stop()
+        await app.state.embedded_worker_task
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await dispose_async_engine()
 
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+@app.get("/health/metrics")
+def health_metrics():
+    from app.services.transcript_cache import transcript_cache
+    from app.services.llm_cache import llm_cache
+    from app.services.llm_runtime import llm_executor, model_registry
+    from app.services.rate_limiter import limiter_stats
+    from app.core.db import pool_stats
+    return {
+        "transcript_cache": transcript_cache.stats(),
+        "llm_cache": llm_cache.stats(),
+        "llm_executor": llm_executor.stats(),
+        "llm_models": len(model_registry),
+        "rate_limits": limiter_stats(),
+        "db_pool": pool_stats(),
+    }
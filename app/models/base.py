@@ -4,7 +4,7 @@ from typing import List, Optional
 from uuid import UUID, uuid4
 from sqlmodel import Field, SQLModel, Relationship, JSON, Column
 
-from sqlalchemy import Enum as SAEnum
+from sqlalchemy import Enum as SAEnum, Index
 
 class UserRole(str, Enum):
     PATIENT = "PATIENT"
@@ -67,6 +67,7 @@ class PatientProfile(SQLModel, table=True):
     emergency_contact_name: Optional[str] = None
     emergency_contact_phone: Optional[str] = None
     current_medications: Optional[str] = None  # JSON string list of current meds
+    normalized_medications: Optional[List[dict]] = Field(default=None, sa_column=Column(JSON))  # Parsed current_medications
     medical_history: Optional[str] = None # Added for Safety Service
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -157,6 +158,10 @@ class TriageCategory(str, Enum):
 
 class Consultation(SQLModel, table=True):
     __tablename__ = "consultations"
+    __table_args__ = (
+        # A doctor's patient list: latest visit per patient
+        Index("ix_consultations_doctor_patient_created", "doctor_id", "patient_id", "created_at"),
+    )
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     appointment_id: UUID = Field(foreign_key="appointments.id", unique=True, index=True)
     patient_id: UUID = Field(foreign_key="users.id")
@@ -205,6 +210,7 @@ class AudioFile(SQLModel, table=True):
     file_name: str
     file_url: str
     file_size: Optional[int] = None
+    content_sha256: Optional[str] = None  # Of the bytes at file_url, hashed during upload
     duration: Optional[float] = None
     transcription: Optional[str] = None # Text field
     label: Optional[str] = Field(default=None, max_length=50) # User Story US-P-004
@@ -220,6 +226,7 @@ class SOAPNote(SQLModel, table=True):
     consultation_id: UUID = Field(foreign_key="consultations.id", unique=True)
     soap_json: Optional[dict] = Field(default=None, sa_column=Column(JSON))
     risk_flags: Optional[dict] = Field(default=None, sa_column=Column(JSON)) # Assuming JSON based on plan
+    plan_medications: Optional[List[dict]] = Field(default=None, sa_column=Column(JSON))  # Drugs parsed from the plan
     confidence: Optional[float] = None
     generated_by_ai: bool = Field(default=True)
     reviewed_by_doctor: bool = Field(default=False)
@@ -288,6 +295,7 @@ class MedicalTerm(SQLModel, table=True):
     term: str = Field(index=True, unique=True)
     category: MedicalTermCategory = Field(sa_column=Column(SAEnum(MedicalTermCategory, native_enum=False), index=True))
     description: Optional[str] = None
+    usage_count: int = Field(default=0)  # Transcripts mentioning the term; ranks the STT word_boost list
     added_by_id: Optional[UUID] = Field(foreign_key="users.id", nullable=True) # Optional tracking
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -328,3 +336,51 @@ class Bill(SQLModel, table=True):
     payment_method: Optional[PaymentMethod] = Field(sa_column=Column(SAEnum(PaymentMethod, native_enum=False), nullable=True))
     generated_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class JobType(str, Enum):
+    TRANSCODE = "TRANSCODE"  # Converts the upload, then transcribes it
+    TRANSCRIPTION = "TRANSCRIPTION"
+    SOAP_GENERATION = "SOAP_GENERATION"
+
+class JobStatus(str, Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+
+class ProcessingJob(SQLModel, table=True):
+    """Durable background job (transcode / transcription / SOAP) consumed by app.worker"""
+    __tablename__ = "processing_jobs"
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    job_type: JobType = Field(sa_column=Column(SAEnum(JobType, native_enum=False), index=True))
+    consultation_id: UUID = Field(foreign_key="consultations.id", index=True)
+    audio_file_id: Optional[UUID] = None
+    status: JobStatus = Field(
+        default=JobStatus.QUEUED,
+        sa_column=Column(SAEnum(JobStatus, native_enum=False), default=JobStatus.QUEUED, index=True)
+    )
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=3)
+    available_at: datetime = Field(default_factory=datetime.utcnow, index=True)  # Not leasable before this time (retry backoff)
+    leased_until: Optional[datetime] = None  # Visibility timeout; expired leases are picked up again
+    lease_owner: Optional[str] = None  # Worker id holding the lease
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class LLMCacheEntry(SQLModel, table=True):
+    """Persistent tier of the Gemini response cache (see app/services/llm_cache.py)"""
+    __tablename__ = "llm_response_cache"
+    key: str = Field(primary_key=True, max_length=64)  # sha256(model, generation_config, prompt)
+    method: str = Field(index=True)
+    model_name: str
+    response_text: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime = Field(index=True)
+
+class RateLimitBucket(SQLModel, table=True):
+    """Shared token bucket state for cross-process provider rate limiting"""
+    __tablename__ = "rate_limit_buckets"
+    key: str = Field(primary_key=True)  # e.g. "gemini:gemini-2.5-flash"
+    tokens: float
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
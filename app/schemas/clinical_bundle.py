@@ -0,0 +1,43 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+
+class SOAPSections(BaseModel):
+    subjective: str
+    objective: str
+    assessment: str
+    plan: str
+
+
+class UISummary(BaseModel):
+    diagnosis: str = ""
+    prescription: str = ""
+    notes: str = ""
+
+
+class InteractionWarning(BaseModel):
+    type: str
+    message: str
+    drug: Optional[str] = None
+    severity: Optional[str] = None
+
+
+class ClinicalBundle(BaseModel):
+    """Everything the pipeline needs from one transcript, produced by a single Gemini call."""
+    transcript: str  # Speaker-labelled ("Doctor: ...", "Patient: ...")
+    soap_note: SOAPSections
+    ui_summary: UISummary = UISummary()
+    demographics: Dict[str, Any] = {}
+    low_confidence: List[str] = []
+    risk_flags: List[str] = []
+    interaction_warnings: List[InteractionWarning] = []
+    # Set by the pipeline, not the model: the medication text the warnings were checked against
+    checked_medications: Optional[str] = None
+
+    def soap_data(self) -> Dict[str, Any]:
+        """The bundle in the shape generate_soap_note_async returns."""
+        return self.model_dump(include={"soap_note", "ui_summary", "demographics", "low_confidence", "risk_flags"})
+
+    def warnings(self) -> List[Dict[str, Any]]:
+        """The bundle's warnings in the shape check_drug_interactions_async returns."""
+        return [w.model_dump(exclude_none=True) for w in self.interaction_warnings]
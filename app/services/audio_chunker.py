@@ -0,0 +1,225 @@
+"""
+Chunked, parallel transcription for long consultation recordings.
+
+The audio is cut at silences near every `target_seconds`, each chunk is
+extracted with `overlap_seconds` of padding on both sides, and the chunks
+are transcribed concurrently. Results are stitched back together:
+
+- utterance timestamps are shifted by the chunk's start offset;
+- each chunk only keeps utterances whose midpoint falls inside its own
+  region (between its two cut points), so the padded overlap is not
+  duplicated;
+- chunk-local speaker labels ("A", "B", ...) are mapped onto the labels
+  already in use by matching utterances both neighbouring chunks heard in
+  the overlap.
+
+The transcriber is injected (`transcribe_fn(chunk_path) -> result dict`,
+same shape as AssemblyAIService results, timestamps in milliseconds), so
+the stitching can run against a local stand-in.
+"""
+import asyncio
+import os
+import re
+import shutil
+import string
+import tempfile
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+Silence = Tuple[float, float]
+
+SILENCE_NOISE_DB = -35
+SILENCE_MIN_SECONDS = 0.4
+
+
+async def _run(cmd: List[str]) -> Tuple[int, str, str]:
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate()
+    return process.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+
+async def analyze_audio(file_path: str) -> Tuple[float, List[Silence]]:
+    """Returns (duration in seconds, silent intervals) using ffprobe/ffmpeg silencedetect."""
+    code, out, err = await _run([
+        "ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", file_path
+    ])
+    if code != 0:
+        raise RuntimeError(f"ffprobe failed: {err.strip()}")
+    duration = float(out.strip())
+
+    code, _, err = await _run([
+        "ffmpeg", "-hide_banner", "-nostats", "-i", file_path,
+        "-af", f"silencedetect=noise={SILENCE_NOISE_DB}dB:d={SILENCE_MIN_SECONDS}",
+        "-f", "null", "-"
+    ])
+    if code != 0:
+        raise RuntimeError(f"ffmpeg silencedetect failed: {err.strip()[-500:]}")
+    starts = [float(x) for x in re.findall(r"silence_start: ([\d.]+)", err)]
+    ends = [float(x) for x in re.findall(r"silence_end: ([\d.]+)", err)]
+    return duration, list(zip(starts, ends))
+
+
+async def extract_chunk(file_path: str, start: float, end: float, out_path: str):
+    code, _, err = await _run([
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", file_path,
+        "-vn", "-ac", "1", "-ar", "16000", out_path
+    ])
+    if code != 0:
+        raise RuntimeError(f"ffmpeg chunk extraction failed: {err.strip()}")
+
+
+def plan_chunks(duration: float, silences: List[Silence], target_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Splits [0, duration) into regions of roughly `target_seconds`, cutting at
+    the middle of the silence closest to each ideal cut point (within a
+    quarter of the target). The last region absorbs any remainder shorter
+    than half a target.
+    """
+    mids = sorted((s + e) / 2 for s, e in silences)
+    window = target_seconds / 4
+    cuts = [0.0]
+    while duration - cuts[-1] > target_seconds * 1.5:
+        ideal = cuts[-1] + target_seconds
+        near = [m for m in mids if abs(m - ideal) <= window]
+        cuts.append(min(near, key=lambda m: abs(m - ideal)) if near else ideal)
+    cuts.append(duration)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def _speaker_mapping(previous: List[Dict[str, Any]], current: List[Dict[str, Any]], used: List[str]) -> Dict[str, str]:
+    """
+    Maps a chunk's local speaker labels onto global labels by voting over
+    time-overlapping utterance pairs (both already in global milliseconds).
+    Labels without a match keep their order and take the next free label.
+    """
+    votes: Dict[str, Counter] = {}
+    for cur in current:
+        for prev in previous:
+            overlap = min(cur["end"], prev["end"]) - max(cur["start"], prev["start"])
+            if overlap > 0:
+                votes.setdefault(cur["speaker"], Counter())[prev["speaker"]] += overlap
+
+    mapping: Dict[str, str] = {}
+    taken = set()
+    # Strongest matches first so two local speakers cannot claim the same global one
+    ranked = sorted(
+        ((weight, local, target) for local, counter in votes.items() for target, weight in counter.items()),
+        reverse=True,
+    )
+    for _, local, target in ranked:
+        if local not in mapping and target not in taken:
+            mapping[local] = target
+            taken.add(target)
+
+    for local in sorted({u["speaker"] for u in current}):
+        if local in mapping:
+            continue
+        label = next((l for l in used if l not in taken), None)
+        if label is None:
+            label = _next_label(used)
+            used.append(label)
+        mapping[local] = label
+        taken.add(label)
+    return mapping
+
+
+def _next_label(used: List[str]) -> str:
+    for label in string.ascii_uppercase:
+        if label not in used:
+            return label
+    return f"S{len(used) + 1}"
+
+
+def merge_chunk_results(chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Stitches chunk results into one transcript. Each chunk is a dict with
+    `offset` (seconds the extracted audio starts at), `region` (owned
+    (start, end) in seconds) and `result` (transcriber output).
+    """
+    merged: List[Dict[str, Any]] = []
+    used_labels: List[str] = []
+    previous_all: List[Dict[str, Any]] = []
+    confidences = []
+    ids = []
+
+    for i, chunk in enumerate(chunks):
+        offset_ms = chunk["offset"] * 1000
+        region_start, region_end = (x * 1000 for x in chunk["region"])
+        # Provider timestamps can spill slightly past either end of the file
+        if i == 0:
+            region_start = float("-inf")
+        if i == len(chunks) - 1:
+            region_end = float("inf")
+        result = chunk["result"]
+        if result.get("confidence") is not None:
+            confidences.append(result["confidence"])
+        if result.get("id"):
+            ids.append(str(result["id"]))
+
+        shifted = [
+            {**u, "start": u["start"] + offset_ms, "end": u["end"] + offset_ms}
+            for u in result.get("utterances", [])
+        ]
+
+        if i == 0:
+            mapping = {}
+            for label in sorted({u["speaker"] for u in shifted}):
+                mapping[label] = label
+                if label not in used_labels:
+                    used_labels.append(label)
+        else:
+            mapping = _speaker_mapping(previous_all, shifted, used_labels)
+
+        relabelled = [{**u, "speaker": mapping.get(u["speaker"], u["speaker"])} for u in shifted]
+        merged.extend(
+            u for u in relabelled
+            if region_start <= (u["start"] + u["end"]) / 2 < region_end
+        )
+        previous_all = relabelled
+
+    merged.sort(key=lambda u: u["start"])
+    text = " ".join(u["text"] for u in merged)
+    return {
+        "text": text,
+        "transcript": text,
+        "utterances": merged,
+        "confidence": sum(confidences) / len(confidences) if confidences else None,
+        "id": ",".join(ids),
+    }
+
+
+async def transcribe_chunked(
+    file_path: str,
+    transcribe_fn: Callable[[str], Awaitable[Dict[str, Any]]],
+    target_seconds: float,
+    overlap_seconds: float,
+    concurrency: int,
+    analyze_fn: Callable[[str], Awaitable[Tuple[float, List[Silence]]]] = analyze_audio,
+    extract_fn: Callable[[str, float, float, str], Awaitable[None]] = extract_chunk,
+    plan: Optional[List[Tuple[float, float]]] = None,
+) -> Dict[str, Any]:
+    if plan is None:
+        duration, silences = await analyze_fn(file_path)
+        plan = plan_chunks(duration, silences, target_seconds)
+    duration = plan[-1][1]
+
+    workdir = tempfile.mkdtemp(prefix="stt-chunks-")
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(index: int, region: Tuple[float, float]) -> Dict[str, Any]:
+        start = max(0.0, region[0] - overlap_seconds)
+        end = min(duration, region[1] + overlap_seconds)
+        chunk_path = os.path.join(workdir, f"chunk{index:03d}.wav")
+        async with semaphore:
+            await extract_fn(file_path, start, end, chunk_path)
+            result = await transcribe_fn(chunk_path)
+        return {"offset": start, "region": region, "result": result}
+
+    try:
+        chunks = await asyncio.gather(*(_one(i, region) for i, region in enumerate(plan)))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return merge_chunk_results(list(chunks))
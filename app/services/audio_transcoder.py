@@ -0,0 +1,75 @@
+"""
+Off-request audio transcoding (browser WebM/M4A/AAC -> MP3).
+
+Uploads are stored as-is and a TRANSCODE job converts them in the worker,
+so upload latency no longer depends on the length of the recording. ffmpeg
+runs as an asyncio subprocess: the event loop keeps serving other jobs
+while it works, at most TRANSCODE_CONCURRENCY conversions run at once per
+loop, and a conversion that outlives TRANSCODE_TIMEOUT_SECONDS is killed.
+"""
+import asyncio
+import os
+from typing import List, Optional
+
+from app.core.config import settings
+from app.services.rate_limiter import _PerLoop
+
+# Formats the providers accept as uploaded; everything else is converted
+PASSTHROUGH_EXTENSIONS = (".mp3", ".wav")
+
+_slots = _PerLoop(lambda: asyncio.Semaphore(max(1, settings.TRANSCODE_CONCURRENCY)))
+
+
+class TranscodeError(RuntimeError):
+    pass
+
+
+def needs_transcode(file_name: str) -> bool:
+    return os.path.splitext(file_name)[1].lower() not in PASSTHROUGH_EXTENSIONS
+
+
+def _ffmpeg_command(src: str, dst: str) -> List[str]:
+    # -vn: drop any video stream, -q:a 2: ~190 kbps VBR
+    return ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-i", src, "-vn", "-acodec", "libmp3lame", "-q:a", "2", dst]
+
+
+async def transcode_to_mp3(src: str, dst: str, timeout: Optional[float] = None) -> str:
+    """
+    Converts `src` to MP3 at `dst` and returns `dst`. Raises TranscodeError
+    on a non-zero exit or timeout; no partial output is left behind.
+    """
+    timeout = timeout if timeout is not None else settings.TRANSCODE_TIMEOUT_SECONDS
+    partial = f"{dst}.part.mp3"
+    async with _slots.get():
+        process = await asyncio.create_subprocess_exec(
+            *_ffmpeg_command(src, partial), stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            await _abort(process, partial)
+            raise TranscodeError(f"ffmpeg timed out after {timeout}s")
+        except BaseException:
+            # Cancelled (e.g. worker shutdown): don't leave ffmpeg running
+            await _abort(process, partial)
+            raise
+
+    if process.returncode != 0:
+        await asyncio.to_thread(_discard, partial)
+        raise TranscodeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()[-500:]}")
+    await asyncio.to_thread(os.replace, partial, dst)
+    return dst
+
+
+async def _abort(process, partial: str):
+    if process.returncode is None:
+        process.kill()
+        await process.wait()
+    await asyncio.to_thread(_discard, partial)
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
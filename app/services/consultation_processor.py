@@ -1,12 +1,19 @@
+from sqlalchemy import update
 from sqlmodel import Session, select
 from app.core.db import engine
+from app.core.config import settings
 from app.models.base import Consultation, ConsultationStatus, AudioFile, SOAPNote, PatientProfile, AILog
 from app.services.stt_service import AssemblyAIService
 from app.services.llm_service import GeminiService
 from app.services.triage_service import TriageService
 from app.services.safety_service import SafetyService
+from app.services.medication_normalizer import anormalize_medications
+from app.services.stt_vocabulary import record_term_usage
+from app.services.audio_transcoder import TranscodeError, needs_transcode, transcode_to_mp3
 from uuid import UUID
+from typing import Optional
 import asyncio
+import os
 import time
 from datetime import datetime, timedelta
 import re
@@ -23,6 +30,312 @@ custom_theme = Theme({
 })
 console = Console(theme=custom_theme)
 
+def _patient_context(patient_profile: PatientProfile) -> dict:
+    """Patient details passed to the LLM prompts."""
+    if not patient_profile:
+        return {}
+    age = "N/A"
+    if patient_profile.date_of_birth:
+        today = datetime.now()
+        dob = patient_profile.date_of_birth
+        age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+    return {
+        "first_name": patient_profile.first_name,
+        "last_name": patient_profile.last_name,
+        "age": age,
+        "gender": patient_profile.gender,
+        "notes": f"Address: {patient_profile.city}, {patient_profile.state}"
+    }
+
+async def _refine_with_bundle(patient_profile: PatientProfile, utterances: list):
+    """
+    Combined mode: one Gemini call produces the labelled transcript together
+    with the SOAP note and interaction warnings, which are stashed for
+    process_soap_generation. Returns None on any failure so the caller
+    falls back to refine_transcript_diarization.
+    """
+    current_meds = _bundle_medications(patient_profile)
+    try:
+        bundle = await GeminiService.generate_clinical_bundle_async(utterances, _patient_context(patient_profile), current_meds)
+    except Exception as e:
+        console.print(f"[warning]Clinical bundle failed validation, using separate calls: {e}[/warning]")
+        return None
+    await GeminiService.stash_clinical_bundle(bundle.model_copy(update={"checked_medications": current_meds}))
+    return bundle.transcript
+
+def _bundle_medications(patient_profile: Optional[PatientProfile]) -> Optional[str]:
+    """The medication text a bundle's interaction warnings are checked against."""
+    if not patient_profile:
+        return None
+    return patient_profile.current_medications or patient_profile.medical_history
+
+def _bundle_warnings(bundle, patient_profile: PatientProfile):
+    """
+    The bundle's interaction warnings, or None if the patient's medications
+    changed since the transcription job checked them (rerun the safety check).
+    """
+    if bundle.checked_medications != _bundle_medications(patient_profile):
+        return None
+    return bundle.warnings()
+
+def _apply_soap_results(session: Session, consultation: Consultation, patient_profile: PatientProfile, soap_data: dict, plan_medications: list = None, triage: tuple = None) -> SOAPNote:
+    """
+    Synchronous post-SOAP work: SOAP note upsert, demographics, draft
+    fields and triage. Only stages changes; the caller commits once.
+    `triage` is a precomputed (urgency, category); computed here if omitted.
+    """
+    soap_content = soap_data.get("soap_note", {})
+    risk_flags = soap_data.get("risk_flags", [])
+
+    # Create OR Update SOAP Note Record
+    existing_soap = session.exec(select(SOAPNote).where(SOAPNote.consultation_id == consultation.id)).first()
+
+    if existing_soap:
+         # Update
+         existing_soap.soap_json = soap_data # Store raw JSON for full fidelity
+         existing_soap.risk_flags = {"flags": risk_flags}
+         existing_soap.plan_medications = plan_medications
+         existing_soap.generated_by_ai = True
+         session.add(existing_soap)
+         soap_note = existing_soap # For downstream use (Triage)
+         console.log("Updated existing SOAP note.")
+    else:
+        # Create New
+        soap_note = SOAPNote(
+            consultation_id=consultation.id,
+            soap_json=soap_data, # Store raw JSON for full fidelity
+            risk_flags={"flags": risk_flags}, # Wrap in dict as risk_flags is JSON type
+            plan_medications=plan_medications,
+            generated_by_ai=True
+        )
+        session.add(soap_note)
+        console.log("Created new SOAP note.")
+
+    # --- Auto-Update Demographics ---
+    extracted_demo = soap_data.get("demographics", {})
+    if patient_profile:
+        updated_profile = False
+
+        # Update Age/DOB if missing
+        if not patient_profile.date_of_birth:
+            age_val = None
+            # Try from JSON
+            if extracted_demo.get("age"):
+                 try: age_val = int(extracted_demo["age"])
+                 except: pass
+
+            # Fallback: Regex Search in Subjective
+            if not age_val:
+                 subj = soap_data.get("soap_note", {}).get("subjective", "")
+                 # Matches: "84-year-old", "84 yo", "84 years"
+                 match = re.search(r"(\d{1,3})[\s-]?(?:years?|yrs?|yo|y/o)(?:[\s-]?old)?", subj.lower())
+                 if match:
+                     try: age_val = int(match.group(1))
+                     except: pass
+
+            if age_val and 0 < age_val < 120:
+                # Approximate DOB
+                dob = datetime.utcnow() - timedelta(days=age_val * 365)
+                patient_profile.date_of_birth = dob
+                updated_profile = True
+                console.log(f"[info]Auto-updated Patient DOB based on Age: {age_val}[/info]")
+
+        # Update Gender if missing or "Unknown"
+        current_gender = (patient_profile.gender or "").lower()
+        if (not current_gender or current_gender == "unknown") and extracted_demo.get("gender"):
+            gender_val = extracted_demo["gender"]
+            # Normalize simple cases
+            if gender_val.lower() in ["male", "m"]: gender_val = "Male"
+            elif gender_val.lower() in ["female", "f"]: gender_val = "Female"
+
+            patient_profile.gender = gender_val
+            updated_profile = True
+            console.log(f"[info]Auto-updated Patient Gender: {patient_profile.gender}[/info]")
+
+        if updated_profile:
+            session.add(patient_profile)
+
+    # --- NEW: Auto-Fill Clinical Draft Fields ---
+    # Populate the edit fields for the doctor using CONCISE summaries
+    ui_summary = soap_data.get("ui_summary", {})
+
+    if soap_content or ui_summary:
+        def clean_text(text):
+            if not text: return ""
+            return text.replace("**", "").replace("__", "")
+
+        # 1. Diagnosis
+        # Prefer summary, fallback to assessment
+        diag_text = ui_summary.get("diagnosis") or soap_content.get("assessment")
+        if diag_text:
+            consultation.diagnosis = clean_text(diag_text)
+
+        # 2. Prescription
+        # Prefer summary, fallback to plan
+        rx_text = ui_summary.get("prescription") or soap_content.get("plan")
+        if rx_text:
+            consultation.prescription = clean_text(rx_text)
+
+        # 3. Notes
+        # Request: Internal notes should be EMPTY and prompted manually via UI placeholder.
+        # We do NOT auto-fill this anymore.
+        consultation.notes = ""
+
+    # --- NEW: Phase 2 Logic ---
+    # 5a. Triage Analysis
+    if patient_profile:
+        urgency, category = triage or TriageService.calculate_urgency(soap_note, patient_profile)
+        consultation.urgency_score = urgency
+        consultation.triage_category = category
+        console.log(f"Triage Result: [bold]{category}[/bold] (Score: {urgency})")
+
+    return soap_note
+
+async def process_transcode(consultation_id: UUID, audio_file_id: UUID):
+    """
+    Step 0: Convert the uploaded audio to MP3, then transcribe it in the same job.
+    Providers often reject raw browser WebM; if ffmpeg fails or times out the
+    original file is transcribed instead.
+    """
+    with Session(engine) as session:
+        audio_file = session.get(AudioFile, audio_file_id)
+        if not audio_file:
+            console.print("[error]Audio file missing.[/error]")
+            return
+        file_name = audio_file.file_name
+        source_path = audio_file.file_url or os.path.join("uploads", file_name)
+
+    # A retried job finds the MP3 already in place
+    if needs_transcode(file_name):
+        # Next to the upload, wherever the storage put it
+        mp3_name = os.path.splitext(file_name)[0] + ".mp3"
+        mp3_path = os.path.join(os.path.dirname(source_path), mp3_name)
+        started = time.perf_counter()
+        try:
+            await transcode_to_mp3(source_path, mp3_path)
+        except TranscodeError as e:
+            console.print(f"[warning]{e}; transcribing the original upload[/warning]")
+        else:
+            console.log(f"Converted {file_name} to MP3 in {time.perf_counter() - started:.1f}s")
+            with Session(engine) as session:
+                audio_file = session.get(AudioFile, audio_file_id)
+                audio_file.file_name = mp3_name
+                audio_file.file_url = mp3_path
+                audio_file.content_sha256 = None  # Hashed lazily by the transcript cache
+                session.add(audio_file)
+                session.commit()
+
+    await process_transcription_only(consultation_id, audio_file_id)
+
+# --- Short DB phases ---
+# The jobs below read what they need, close the session, make the provider
+# calls (minutes) holding no connection, then write in one short
+# transaction. Writes are optimistic: they are skipped if the rows the job
+# read have changed meanwhile (re-upload, doctor edits), rather than
+# overwriting newer data with a result computed from stale input.
+
+def _mark_failed(consultation_id: UUID):
+    with Session(engine) as session:
+        consultation = session.get(Consultation, consultation_id)
+        if consultation:
+            consultation.status = ConsultationStatus.FAILED
+            consultation.requires_manual_review = True
+            session.add(consultation)
+            session.commit()
+
+def _latest_audio(session: Session, consultation_id: UUID):
+    return session.exec(select(AudioFile).where(AudioFile.consultation_id == consultation_id).order_by(AudioFile.uploaded_at.desc())).first()
+
+def _load_transcription_inputs(consultation_id: UUID, audio_file_id: UUID = None):
+    """Read phase: marks the consultation IN_PROGRESS; returns (audio_file, patient_profile) or None."""
+    with Session(engine, expire_on_commit=False) as session:
+        consultation = session.get(Consultation, consultation_id)
+        if not consultation:
+            console.print(f"[error]Consultation {consultation_id} not found.[/error]")
+            return None
+
+        audio_file = session.get(AudioFile, audio_file_id) if audio_file_id else _latest_audio(session, consultation_id)
+        if not audio_file:
+            console.print("[error]Audio file missing.[/error]")
+            return None
+
+        patient_profile = session.exec(select(PatientProfile).where(PatientProfile.user_id == consultation.patient_id)).first()
+        consultation.status = ConsultationStatus.IN_PROGRESS
+        session.add(consultation)
+        session.commit()
+        return audio_file, patient_profile
+
+def _save_transcript(audio_file: AudioFile, transcript: str) -> bool:
+    """Write phase: stores the transcript unless the file was replaced or a doctor has verified a transcript since."""
+    with Session(engine) as session:
+        result = session.execute(
+            update(AudioFile)
+            .where(AudioFile.id == audio_file.id)
+            .where(AudioFile.file_name == audio_file.file_name)
+            .where(AudioFile.is_transcript_verified == False)
+            .values(transcription=transcript)
+        )
+        session.commit()
+        return bool(result.rowcount)
+
+def _load_soap_inputs(consultation_id: UUID):
+    """Read phase: returns (audio_file, patient_profile), or None (marking the consultation FAILED if there is no transcript)."""
+    with Session(engine) as session:
+        consultation = session.get(Consultation, consultation_id)
+        if not consultation:
+            console.print(f"[error]Consultation {consultation_id} not found.[/error]")
+            return None
+
+        audio_file = _latest_audio(session, consultation_id)
+        if not audio_file or not audio_file.transcription:
+            console.print("[warning]No transcript found for SOAP generation.[/warning]")
+            consultation.status = ConsultationStatus.FAILED
+            consultation.requires_manual_review = True
+            session.add(consultation)
+            session.commit()
+            return None
+
+        patient_profile = session.exec(select(PatientProfile).where(PatientProfile.user_id == consultation.patient_id)).first()
+        return audio_file, patient_profile
+
+def _save_soap_results(consultation_id: UUID, source: AudioFile, soap_data: dict, plan_medications: list, triage: tuple, warnings: list, latency: float) -> bool:
+    """
+    Write phase: one transaction for the SOAP note, draft fields, triage,
+    safety warnings and AI log. Skipped if the transcript the note was
+    generated from is no longer the consultation's current one.
+    """
+    with Session(engine) as session:
+        consultation = session.get(Consultation, consultation_id)
+        current = _latest_audio(session, consultation_id)
+        if not consultation or not current or current.id != source.id or current.transcription != source.transcription:
+            return False
+
+        session.add(AILog(
+            consultation_id=consultation.id,
+            model_version="gemini-2.0-flash",
+            status="SUCCESS",
+            latency_ms=latency
+        ))
+        patient_profile = session.exec(select(PatientProfile).where(PatientProfile.user_id == consultation.patient_id)).first()
+        _apply_soap_results(session, consultation, patient_profile, soap_data, plan_medications, triage if patient_profile else None)
+
+        if warnings is not None:
+            consultation.safety_warnings = warnings
+            if warnings:
+                console.log(f"[warning]Safety Warnings Found: {len(warnings)}[/warning]")
+
+        # 6. Update Final Status
+        # IMPORTANT: We do NOT mark as COMPLETED here.
+        # The doctor must review and sign off. We keep it IN_PROGRESS.
+        consultation.status = ConsultationStatus.IN_PROGRESS
+        # Reset manual review flag if it was set by previous error
+        consultation.requires_manual_review = False
+
+        session.add(consultation)
+        session.commit()
+        return True
+
 async def process_transcription_only(consultation_id: UUID, audio_file_id: UUID = None):
     """
     Step 1: Transcribe Audio Only
@@ -39,91 +352,82 @@ async def process_transcription_only(consultation_id: UUID, audio_file_id: UUID
     ) as progress:
         
         main_task = progress.add_task("[cyan]Initializing...", total=4)
-        
-        with Session(engine) as session:
-            progress.update(main_task, description="[cyan]Fetching Consultation Data...", advance=1)
-            consultation = session.get(Consultation, consultation_id)
-            if not consultation:
-                console.print(f"[error]Consultation {consultation_id} not found.[/error]")
-                return
 
-            # Update Status
-            consultation.status = ConsultationStatus.IN_PROGRESS
-            session.add(consultation)
+        progress.update(main_task, description="[cyan]Fetching Consultation Data...", advance=1)
+        inputs = await asyncio.to_thread(_load_transcription_inputs, consultation_id, audio_file_id)
+        if not inputs:
+            return
+        audio_file, patient_profile = inputs
+
+        try:
+            # Transcribe with AssemblyAI (Matching Patient UI reliability)
+            progress.update(main_task, description=f"[bold yellow]Transcribing Audio with AssemblyAI (File: {audio_file.file_name})...", advance=1)
             
-            # Get Audio File
-            if audio_file_id:
-                 audio_file = session.get(AudioFile, audio_file_id)
-            else:
-                audio_file = session.exec(select(AudioFile).where(AudioFile.consultation_id == consultation_id).order_by(AudioFile.uploaded_at.desc())).first()
-                
-            if not audio_file:
-                console.print("[error]Audio file missing.[/error]")
+            # Local file path, resolved as the transcode step does (AssemblyAI SDK handles upload automatically)
+            file_path = audio_file.file_url or os.path.join("uploads", audio_file.file_name)
+            
+            if not os.path.exists(file_path):
+                 # Fallback if path construction fails (e.g. absolute paths in DB)
+                 console.print(f"[warning]File not found at {file_path}, trying absolute URL logic...[/warning]")
+                 # Note: In a real prod env with S3, we would pass the presigned URL.
+                 # Here just fail if local file missing.
+                 raise FileNotFoundError(f"Audio file not found at {file_path}")
+
+            console.log(f"Sending audio to AssemblyAI: {file_path}")
+            
+            transcript_result = await AssemblyAIService.transcribe_audio_async(file_path, content_sha256=audio_file.content_sha256)
+            
+            # Extract full text & utterances
+            transcript_text = transcript_result.get("text", "")
+            utterances = transcript_result.get("utterances", [])
+            
+            progress.update(main_task, description="[cyan]Refining Transcript Diarization (AI Guessing Speakers)...", advance=0)
+
+            # Process Diarization if utterances exist
+            final_transcript = transcript_text
+            bundle_transcript = None
+            if utterances and GeminiService.clinical_bundle_enabled() and not settings.USE_MOCK_AI:
+                console.log("Requesting combined transcript + SOAP bundle...")
+                bundle_transcript = await _refine_with_bundle(patient_profile, utterances)
+
+            if bundle_transcript:
+                final_transcript = bundle_transcript
+            elif utterances:
+                try:
+                    console.log("Refining speaker labels (Speaker A -> Doctor)...")
+                    final_transcript = await GeminiService.refine_transcript_diarization(transcript_text, utterances)
+                except Exception as e:
+                    console.print(f"[warning]Diarization refinement failed, using raw text: {e}[/warning]")
+                    # Fallback to crude "Speaker A" format if Gemini fails
+                    formatted_lines = []
+                    for u in utterances:
+                         formatted_lines.append(f"Speaker {u.get('speaker', '?')}: {u.get('text', '')}")
+                    final_transcript = "\n\n".join(formatted_lines)
+
+            progress.update(main_task, description="[cyan]Saving Transcript to Database...", advance=1)
+            
+            # Save Transcript
+            # Note: We aren't storing 'utterances' in DB yet, but could in future.
+            if not await asyncio.to_thread(_save_transcript, audio_file, final_transcript):
+                console.print(f"[warning]Audio for {consultation_id} was replaced or its transcript verified meanwhile; discarding this transcript[/warning]")
+                progress.update(main_task, description="[yellow]Superseded", completed=4)
                 return
 
-            try:
-                # Transcribe with AssemblyAI (Matching Patient UI reliability)
-                progress.update(main_task, description=f"[bold yellow]Transcribing Audio with AssemblyAI (File: {audio_file.file_name})...", advance=1)
-                
-                # Construct local file path (AssemblyAI SDK handles upload automatically)
-                import os
-                file_path = os.path.join("uploads", audio_file.file_name)
-                
-                if not os.path.exists(file_path):
-                     # Fallback if path construction fails (e.g. absolute paths in DB)
-                     console.print(f"[warning]File not found at {file_path}, trying absolute URL logic...[/warning]")
-                     # Note: In a real prod env with S3, we would pass the presigned URL.
-                     # Here just fail if local file missing.
-                     raise FileNotFoundError(f"Audio file not found at {file_path}")
-
-                console.log(f"Sending audio to AssemblyAI: {file_path}")
-                
-                transcript_result = await AssemblyAIService.transcribe_audio_async(file_path)
-                
-                # Extract full text & utterances
-                transcript_text = transcript_result.get("text", "")
-                utterances = transcript_result.get("utterances", [])
-                
-                progress.update(main_task, description="[cyan]Refining Transcript Diarization (AI Guessing Speakers)...", advance=0)
-
-                # Process Diarization if utterances exist
-                final_transcript = transcript_text
-                if utterances:
-                    try:
-                        console.log("Refining speaker labels (Speaker A -> Doctor)...")
-                        final_transcript = await GeminiService.refine_transcript_diarization(transcript_text, utterances)
-                    except Exception as e:
-                        console.print(f"[warning]Diarization refinement failed, using raw text: {e}[/warning]")
-                        # Fallback to crude "Speaker A" format if Gemini fails
-                        formatted_lines = []
-                        for u in utterances:
-                             formatted_lines.append(f"Speaker {u.get('speaker', '?')}: {u.get('text', '')}")
-                        final_transcript = "\n\n".join(formatted_lines)
-
-                progress.update(main_task, description="[cyan]Saving Transcript to Database...", advance=1)
-                
-                # Save Transcript
-                audio_file.transcription = final_transcript
-                # Note: We aren't storing 'utterances' in DB yet, but could in future.
-                
-                session.add(audio_file)
-                session.commit()
-                
-                progress.update(main_task, description="[bold green]Transcription Complete!", completed=4)
-                console.print(f"[success]✓ Transcription saved successfully for {consultation_id}[/success]")
-                
-            except Exception as e:
-                import traceback
-                error_trace = traceback.format_exc()
-                console.print(f"[error]Transcription failed: {e}[/error]")
-                with open("debug_run.log", "a") as f:
-                    f.write(f"\n[ERROR] Transcription {consultation_id}: {str(e)}\n{error_trace}\n")
-                consultation.status = ConsultationStatus.FAILED
-                consultation.requires_manual_review = True
-                session.add(consultation)
-                session.commit()
-                progress.update(main_task, description="[bold red]Task Failed", completed=4)
-                raise e
+            # Term usage ranks the word_boost list for later uploads
+            await asyncio.to_thread(record_term_usage, transcript_text)
+            
+            progress.update(main_task, description="[bold green]Transcription Complete!", completed=4)
+            console.print(f"[success]✓ Transcription saved successfully for {consultation_id}[/success]")
+            
+        except Exception as e:
+            import traceback
+            error_trace = traceback.format_exc()
+            console.print(f"[error]Transcription failed: {e}[/error]")
+            with open("debug_run.log", "a") as f:
+                f.write(f"\n[ERROR] Transcription {consultation_id}: {str(e)}\n{error_trace}\n")
+            await asyncio.to_thread(_mark_failed, consultation_id)
+            progress.update(main_task, description="[bold red]Task Failed", completed=4)
+            raise e
 
 async def process_soap_generation(consultation_id: UUID):
     """
@@ -142,208 +446,81 @@ async def process_soap_generation(consultation_id: UUID):
         
         soap_task = progress.add_task("[magenta]Preparing Context...", total=6)
 
-        with Session(engine) as session:
-            consultation = session.get(Consultation, consultation_id)
-            if not consultation:
-                console.print(f"[error]Consultation {consultation_id} not found.[/error]")
-                return
+        # Get Latest Audio File for Transcript, and the Patient Context
+        progress.update(soap_task, description="[magenta]Fetching Transcript...", advance=1)
+        inputs = await asyncio.to_thread(_load_soap_inputs, consultation_id)
+        if not inputs:
+            return
+        audio_file, patient_profile = inputs
 
-            # Get Latest Audio File for Transcript
-            progress.update(soap_task, description="[magenta]Fetching Transcript...", advance=1)
-            audio_file = session.exec(select(AudioFile).where(AudioFile.consultation_id == consultation_id).order_by(AudioFile.uploaded_at.desc())).first()
-            
-            if not audio_file or not audio_file.transcription:
-                console.print("[warning]No transcript found for SOAP generation.[/warning]")
-                consultation.status = ConsultationStatus.FAILED
-                consultation.requires_manual_review = True
-                session.add(consultation)
-                session.commit()
-                return
+        transcript_text = audio_file.transcription
+        utterances = [] 
 
-            transcript_text = audio_file.transcription
-            utterances = [] 
-
-            # Patient Context
-            progress.update(soap_task, description="[magenta]Loading Patient Profile...", advance=1)
-            patient_profile = session.exec(select(PatientProfile).where(PatientProfile.user_id == consultation.patient_id)).first()
-            patient_context = {}
-            if patient_profile:
-                age = "N/A"
-                if patient_profile.date_of_birth:
-                    today = datetime.now()
-                    dob = patient_profile.date_of_birth
-                    age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-                
-                patient_context = {
-                    "first_name": patient_profile.first_name,
-                    "last_name": patient_profile.last_name,
-                    "age": age,
-                    "gender": patient_profile.gender,
-                    "notes": f"Address: {patient_profile.city}, {patient_profile.state}"
-                }
-
-            try:
-                progress.update(soap_task, description="[bold yellow]Generating SOAP with Gemini...", advance=1)
-                console.log("Analyzing transcript for medical entities...")
-                
-                start_time = time.time()
+        progress.update(soap_task, description="[magenta]Loading Patient Profile...", advance=1)
+        patient_context = _patient_context(patient_profile)
+
+        try:
+            progress.update(soap_task, description="[bold yellow]Generating SOAP with Gemini...", advance=1)
+            console.log("Analyzing transcript for medical entities...")
+            
+            start_time = time.time()
+            bundle = None
+            if GeminiService.clinical_bundle_enabled():
+                bundle = await GeminiService.get_stashed_clinical_bundle(transcript_text)
+            if bundle:
+                console.log("Using SOAP note from the combined transcription bundle.")
+                soap_data = bundle.soap_data()
+            else:
                 soap_data = await GeminiService.generate_soap_note_async(transcript_text, utterances, patient_context)
-                latency = (time.time() - start_time) * 1000
-                
-                # Log Success
-                session.add(AILog(
-                    consultation_id=consultation.id,
-                    model_version="gemini-2.0-flash",
-                    status="SUCCESS",
-                    latency_ms=latency
-                ))
-
-                soap_content = soap_data.get("soap_note", {})
-                risk_flags = soap_data.get("risk_flags", [])
-
-                progress.update(soap_task, description="[magenta]Updating Database Records...", advance=1)
-                
-                # Create OR Update SOAP Note Record
-                existing_soap = session.exec(select(SOAPNote).where(SOAPNote.consultation_id == consultation.id)).first()
-                
-                if existing_soap:
-                     # Update
-                     existing_soap.soap_json = soap_data # Store raw JSON for full fidelity
-                     existing_soap.risk_flags = {"flags": risk_flags}
-                     existing_soap.generated_by_ai = True
-                     session.add(existing_soap)
-                     soap_note = existing_soap # For downstream use (Triage)
-                     console.log("Updated existing SOAP note.")
-                else:
-                    # Create New
-                    soap_note = SOAPNote(
-                        consultation_id=consultation.id,
-                        soap_json=soap_data, # Store raw JSON for full fidelity
-                        risk_flags={"flags": risk_flags}, # Wrap in dict as risk_flags is JSON type
-                        generated_by_ai=True
-                    )
-                    session.add(soap_note)
-                    console.log("Created new SOAP note.")
-                
-                # --- Auto-Update Demographics ---
-                extracted_demo = soap_data.get("demographics", {})
-                if patient_profile:
-                    updated_profile = False
-                    
-                    # Update Age/DOB if missing
-                    if not patient_profile.date_of_birth:
-                        age_val = None
-                        # Try from JSON
-                        if extracted_demo.get("age"):
-                             try: age_val = int(extracted_demo["age"])
-                             except: pass
-                        
-                        # Fallback: Regex Search in Subjective
-                        if not age_val:
-                             import re
-                             subj = soap_data.get("soap_note", {}).get("subjective", "")
-                             # Matches: "84-year-old", "84 yo", "84 years"
-                             match = re.search(r"(\d{1,3})[\s-]?(?:years?|yrs?|yo|y/o)(?:[\s-]?old)?", subj.lower())
-                             if match:
-                                 try: age_val = int(match.group(1))
-                                 except: pass
-    
-                        if age_val and 0 < age_val < 120:
-                            from datetime import datetime, timedelta
-                            # Approximate DOB
-                            dob = datetime.utcnow() - timedelta(days=age_val * 365)
-                            patient_profile.date_of_birth = dob
-                            updated_profile = True
-                            console.log(f"[info]Auto-updated Patient DOB based on Age: {age_val}[/info]")
-                    
-                    # Update Gender if missing or "Unknown"
-                    current_gender = (patient_profile.gender or "").lower()
-                    if (not current_gender or current_gender == "unknown") and extracted_demo.get("gender"):
-                        gender_val = extracted_demo["gender"]
-                        # Normalize simple cases
-                        if gender_val.lower() in ["male", "m"]: gender_val = "Male"
-                        elif gender_val.lower() in ["female", "f"]: gender_val = "Female"
-                        
-                        patient_profile.gender = gender_val
-                        updated_profile = True
-                        console.log(f"[info]Auto-updated Patient Gender: {patient_profile.gender}[/info]")
-                    
-                    if updated_profile:
-                        session.add(patient_profile)
-                        session.commit()
-                        session.refresh(patient_profile)
-    
-                # --- NEW: Auto-Fill Clinical Draft Fields ---
-                # Populate the edit fields for the doctor using CONCISE summaries
-                ui_summary = soap_data.get("ui_summary", {})
-                
-                if soap_content or ui_summary:
-                    def clean_text(text):
-                        if not text: return ""
-                        return text.replace("**", "").replace("__", "")
-    
-                    # 1. Diagnosis
-                    # Prefer summary, fallback to assessment
-                    diag_text = ui_summary.get("diagnosis") or soap_content.get("assessment")
-                    if diag_text:
-                        consultation.diagnosis = clean_text(diag_text)
-                    
-                    # 2. Prescription
-                    # Prefer summary, fallback to plan
-                    rx_text = ui_summary.get("prescription") or soap_content.get("plan")
-                    if rx_text:
-                        consultation.prescription = clean_text(rx_text)
-                    
-                    # 3. Notes
-                    # Request: Internal notes should be EMPTY and prompted manually via UI placeholder.
-                    # We do NOT auto-fill this anymore.
-                    consultation.notes = ""
-    
-                # --- NEW: Phase 2 Logic ---
-                # 5a. Triage Analysis
-                progress.update(soap_task, description="[magenta]Running Triage & Safety Checks...", advance=1)
-                
-                if patient_profile:
-                    urgency, category = TriageService.calculate_urgency(soap_note, patient_profile)
-                    consultation.urgency_score = urgency
-                    consultation.triage_category = category
-                    console.log(f"Triage Result: [bold]{category}[/bold] (Score: {urgency})")
-                
-                # 5b. Safety Checks
-                if patient_profile:
-                    warnings = await SafetyService.check_drug_interactions(soap_note, patient_profile)
-                    consultation.safety_warnings = warnings
-                    if warnings:
-                        console.log(f"[warning]Safety Warnings Found: {len(warnings)}[/warning]")
-    
-                # 6. Update Final Status
-                # IMPORTANT: We do NOT mark as COMPLETED here. 
-                # The doctor must review and sign off. We keep it IN_PROGRESS.
-                consultation.status = ConsultationStatus.IN_PROGRESS
-                # Reset manual review flag if it was set by previous error
-                consultation.requires_manual_review = False
-                
-                session.add(consultation)
-                session.commit()
-                
-                progress.update(soap_task, description="[bold green]SOAP Generation Complete!", completed=6)
-                console.print(f"[success]✓ Processing successfully completed for {consultation_id}[/success]")
-                
-            except Exception as e:
-                import traceback
-                error_trace = traceback.format_exc()
-                console.print(f"[error]Processing failed: {e}[/error]")
-                
-                # Log to file for agent visibility
-                with open("debug_run.log", "a") as f:
-                    f.write(f"\n[ERROR] {consultation_id}: {str(e)}\n{error_trace}\n")
-    
-                # Set status to FAILED so we can track errors in DB
-                consultation.status = ConsultationStatus.FAILED
-                consultation.requires_manual_review = True # Flag for Manual Intervention
-                
-                # Log General Failure if not logged by LLM block
-                session.add(consultation)
-                session.commit()
-                progress.update(soap_task, description="[bold red]Task Failed", completed=6)
+            latency = (time.time() - start_time) * 1000
+
+            progress.update(soap_task, description="[magenta]Updating Records, Triage & Safety Checks...", advance=1)
+
+            # Parse the plan's drugs once: stored on the note and used by the safety check
+            plan_medications = await anormalize_medications(soap_data.get("soap_note", {}).get("plan"))
+            draft_note = SOAPNote(
+                soap_json=soap_data, risk_flags={"flags": soap_data.get("risk_flags", [])}, plan_medications=plan_medications
+            )
+
+            # 5. Triage and Safety Checks
+            # Triage is local work and runs alongside the interaction check
+            async def _safety_check():
+                if not patient_profile:
+                    return None
+                warnings = _bundle_warnings(bundle, patient_profile) if bundle else None
+                if warnings is not None:
+                    return warnings
+                return await SafetyService.check_drug_interactions(draft_note, patient_profile)
+
+            async def _triage():
+                if not patient_profile:
+                    return None
+                return await asyncio.to_thread(TriageService.calculate_urgency, draft_note, patient_profile)
+
+            triage, warnings = await asyncio.gather(_triage(), _safety_check())
+            progress.update(soap_task, advance=1)
+
+            if not await asyncio.to_thread(
+                _save_soap_results, consultation_id, audio_file, soap_data, plan_medications, triage, warnings, latency
+            ):
+                console.print(f"[warning]Transcript for {consultation_id} changed during SOAP generation; discarding this note[/warning]")
+                progress.update(soap_task, description="[yellow]Superseded", completed=6)
+                return
+            
+            progress.update(soap_task, description="[bold green]SOAP Generation Complete!", completed=6)
+            console.print(f"[success]✓ Processing successfully completed for {consultation_id}[/success]")
+            
+        except Exception as e:
+            import traceback
+            error_trace = traceback.format_exc()
+            console.print(f"[error]Processing failed: {e}[/error]")
+            
+            # Log to file for agent visibility
+            with open("debug_run.log", "a") as f:
+                f.write(f"\n[ERROR] {consultation_id}: {str(e)}\n{error_trace}\n")
 
+            # Set status to FAILED so we can track errors in DB
+            # (and flag for Manual Intervention)
+            await asyncio.to_thread(_mark_failed, consultation_id)
+            progress.update(soap_task, description="[bold red]Task Failed", completed=6)
+            raise e  # Let the job worker record the attempt and retry
@@ -0,0 +1,143 @@
+"""
+Local drug-interaction index and medication extraction for the safety check.
+
+The index (app/data/drug_interactions.json) maps normalized drug pairs to a
+warning or to "known safe"; entries may name a drug or a class, so
+"triptan + ssri" covers every member pair. Pairs the index does not cover
+are asked of the model once and memoized per pair in the response cache,
+so a regimen seen for one patient is free for the next. Finding the drugs
+in free text is medication_normalizer's job.
+"""
+import asyncio
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import combinations, product
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.keyword_matcher import tokenize
+from app.services.llm_cache import llm_cache, make_key
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "drug_interactions.json")
+
+SAFE = "SAFE"
+
+# Response-cache method for per-pair results; bump the version when the pair prompt changes
+PAIR_MEMO_METHOD = "drug_pair"
+PAIR_MEMO_VERSION = 1
+
+
+def normalize_drug(name: str) -> str:
+    return " ".join(tokenize(name))
+
+
+def pair_key(a: str, b: str) -> Tuple[str, str]:
+    return (a, b) if a <= b else (b, a)
+
+
+@dataclass(frozen=True)
+class Interaction:
+    drugs: Tuple[str, str]
+    type: str
+    severity: str
+    message: str
+
+    def warning(self, drug: str, other: str) -> Dict[str, str]:
+        """In the shape GeminiService.check_drug_interactions_async returns."""
+        return {
+            "type": self.type,
+            "message": self.message,
+            "drug": drug.title(),
+            "interacts_with": other.title(),
+            "severity": self.severity,
+        }
+
+
+class InteractionIndex:
+    def __init__(self, data: Dict):
+        self.version = data.get("version", 1)
+        self.aliases: Dict[str, str] = {normalize_drug(k): normalize_drug(v) for k, v in data.get("aliases", {}).items()}
+        self.classes: Dict[str, List[str]] = {}
+        for name, members in data.get("classes", {}).items():
+            for member in members:
+                self.classes.setdefault(normalize_drug(member), []).append(name)
+        self.interactions: Dict[Tuple[str, str], Interaction] = {}
+        for entry in data.get("interactions", []):
+            a, b = (normalize_drug(d) for d in entry["drugs"])
+            self.interactions[pair_key(a, b)] = Interaction(pair_key(a, b), entry["type"], entry["severity"], entry["message"])
+        self.safe_pairs: FrozenSet[Tuple[str, str]] = frozenset(
+            pair_key(normalize_drug(a), normalize_drug(b)) for a, b in data.get("safe_pairs", [])
+        )
+        class_names = {name for names in self.classes.values() for name in names}
+        self.drugs: FrozenSet[str] = frozenset(
+            {d for pair in self.interactions for d in pair if d not in class_names}
+            | {d for pair in self.safe_pairs for d in pair}
+            | set(self.classes)
+            | set(self.aliases.values())
+        )
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "InteractionIndex":
+        with open(path or DEFAULT_INDEX_PATH) as f:
+            return cls(json.load(f))
+
+    def canonical(self, name: str) -> str:
+        normalized = normalize_drug(name)
+        return self.aliases.get(normalized, normalized)
+
+    def lookup(self, a: str, b: str):
+        """An Interaction, SAFE, or None if the pair is not covered."""
+        a, b = self.canonical(a), self.canonical(b)
+        if pair_key(a, b) in self.safe_pairs:
+            return SAFE
+        # Drug-level entries win over class-level ones
+        for x, y in product([a] + self.classes.get(a, []), [b] + self.classes.get(b, [])):
+            interaction = self.interactions.get(pair_key(x, y))
+            if interaction:
+                return interaction
+        return None  # Not listed either way: the index is curated, not exhaustive
+
+    def resolve(self, current: Iterable[str], new: Iterable[str]) -> Tuple[List[Dict[str, str]], List[Tuple[str, str]]]:
+        """
+        Checks every new drug against the current ones and against each other.
+        Returns (warnings from the index, pairs the index does not cover).
+        """
+        current, new = list(current), list(new)
+        pairs = [(n, c) for n in new for c in current if n != c] + list(combinations(new, 2))
+        warnings, unknown = [], []
+        for drug, other in pairs:
+            result = self.lookup(drug, other)
+            if result is None:
+                unknown.append((drug, other))
+            elif result is not SAFE:
+                warnings.append(result.warning(drug, other))
+        return warnings, unknown
+
+
+@lru_cache(maxsize=1)
+def get_interaction_index() -> InteractionIndex:
+    return InteractionIndex.load(settings.DRUG_INTERACTION_INDEX_PATH)
+
+
+def _pair_memo_key(pair: Tuple[str, str]) -> str:
+    return make_key(PAIR_MEMO_METHOD, None, {"pair": list(pair_key(*pair)), "version": PAIR_MEMO_VERSION})
+
+
+async def recall_pairs(pairs: Iterable[Tuple[str, str]]) -> Tuple[List[Dict[str, str]], List[Tuple[str, str]]]:
+    """(memoized warnings, pairs with no memo entry)."""
+    pairs = list(pairs)
+    found = await asyncio.gather(*(llm_cache.aget(_pair_memo_key(pair), PAIR_MEMO_METHOD) for pair in pairs))
+    warnings, missing = [], []
+    for pair, cached in zip(pairs, found):
+        if cached is None:
+            missing.append(pair)
+        else:
+            warnings.extend(json.loads(cached))
+    return warnings, missing
+
+
+async def remember_pairs(results: Dict[Tuple[str, str], List[Dict[str, str]]]):
+    for pair, warnings in results.items():
+        await llm_cache.aset(_pair_memo_key(pair), json.dumps(warnings), PAIR_MEMO_METHOD)
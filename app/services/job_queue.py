@@ -0,0 +1,192 @@
+"""
+Durable job queue backed by the `processing_jobs` table.
+
+Jobs are leased with a compare-and-swap UPDATE so that several workers
+(processes or hosts) can poll the same table on Postgres or SQLite without
+row-level locking. A lease is a visibility timeout: if the worker dies, the
+lease expires and another worker picks the job up again.
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+from uuid import UUID
+import logging
+
+from sqlalchemy import update, or_, and_
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models.base import ProcessingJob, JobType, JobStatus
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    @staticmethod
+    def enqueue(
+        session: Session,
+        job_type: JobType,
+        consultation_id: UUID,
+        audio_file_id: Optional[UUID] = None,
+        max_attempts: Optional[int] = None,
+    ) -> ProcessingJob:
+        """
+        Adds a job and commits. If an identical job is still waiting in the
+        queue it is reused instead (double-clicks / repeated redo requests).
+        """
+        existing = session.exec(
+            select(ProcessingJob)
+            .where(ProcessingJob.job_type == job_type)
+            .where(ProcessingJob.consultation_id == consultation_id)
+            .where(ProcessingJob.status == JobStatus.QUEUED)
+        ).first()
+        if existing:
+            existing.audio_file_id = audio_file_id
+            existing.available_at = datetime.utcnow()
+            existing.updated_at = datetime.utcnow()
+            session.add(existing)
+            session.commit()
+            session.refresh(existing)
+            return existing
+
+        job = ProcessingJob(
+            job_type=job_type,
+            consultation_id=consultation_id,
+            audio_file_id=audio_file_id,
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        )
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        return job
+
+    @staticmethod
+    def lease(
+        session: Session,
+        worker_id: str,
+        limit: int,
+        lease_seconds: Optional[int] = None,
+    ) -> List[ProcessingJob]:
+        """
+        Claims up to `limit` runnable jobs for `worker_id`.
+        Runnable = QUEUED and due, or RUNNING with an expired lease.
+        """
+        if limit <= 0:
+            return []
+
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS)
+
+        candidates = session.exec(
+            select(ProcessingJob)
+            .where(or_(
+                and_(ProcessingJob.status == JobStatus.QUEUED, ProcessingJob.available_at <= now),
+                and_(ProcessingJob.status == JobStatus.RUNNING, ProcessingJob.leased_until < now),
+            ))
+            .order_by(ProcessingJob.available_at.asc())
+            .limit(limit * 2)  # Some candidates may be taken by other workers
+        ).all()
+
+        leased_ids = []
+        for job in candidates:
+            if len(leased_ids) >= limit:
+                break
+
+            if job.status == JobStatus.RUNNING and job.attempts >= job.max_attempts:
+                # Lease expired on the final attempt (worker crashed / hung)
+                result = session.execute(
+                    update(ProcessingJob)
+                    .where(ProcessingJob.id == job.id)
+                    .where(ProcessingJob.status == JobStatus.RUNNING)
+                    .where(ProcessingJob.leased_until == job.leased_until)
+                    .values(
+                        status=JobStatus.FAILED,
+                        last_error="Lease expired on final attempt",
+                        leased_until=None,
+                        updated_at=now,
+                    )
+                )
+                session.commit()
+                if result.rowcount:
+                    logger.warning(f"Job {job.id} exhausted its attempts after lease expiry")
+                continue
+
+            # Compare-and-swap on the fields we read: only one worker wins
+            conditions = [ProcessingJob.id == job.id, ProcessingJob.status == job.status]
+            if job.leased_until is None:
+                conditions.append(ProcessingJob.leased_until.is_(None))
+            else:
+                conditions.append(ProcessingJob.leased_until == job.leased_until)
+
+            result = session.execute(
+                update(ProcessingJob)
+                .where(*conditions)
+                .values(
+                    status=JobStatus.RUNNING,
+                    lease_owner=worker_id,
+                    leased_until=lease_until,
+                    attempts=ProcessingJob.attempts + 1,
+                    updated_at=now,
+                )
+            )
+            session.commit()
+            if result.rowcount:
+                leased_ids.append(job.id)
+
+        if not leased_ids:
+            return []
+
+        # Loaded after the last commit, so attributes stay readable once the session closes
+        return list(session.exec(select(ProcessingJob).where(ProcessingJob.id.in_(leased_ids))).all())
+
+    @staticmethod
+    def heartbeat(session: Session, job_id: UUID, worker_id: str, lease_seconds: Optional[int] = None) -> bool:
+        """Extends the lease of a running job. Returns False if the lease was lost."""
+        now = datetime.utcnow()
+        result = session.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.id == job_id)
+            .where(ProcessingJob.lease_owner == worker_id)
+            .where(ProcessingJob.status == JobStatus.RUNNING)
+            .values(
+                leased_until=now + timedelta(seconds=lease_seconds or settings.JOB_LEASE_SECONDS),
+                updated_at=now,
+            )
+        )
+        session.commit()
+        return bool(result.rowcount)
+
+    @staticmethod
+    def complete(session: Session, job_id: UUID, worker_id: str) -> bool:
+        result = session.execute(
+            update(ProcessingJob)
+            .where(ProcessingJob.id == job_id)
+            .where(ProcessingJob.lease_owner == worker_id)
+            .where(ProcessingJob.status == JobStatus.RUNNING)
+            .values(status=JobStatus.SUCCEEDED, leased_until=None, last_error=None, updated_at=datetime.utcnow())
+        )
+        session.commit()
+        return bool(result.rowcount)
+
+    @staticmethod
+    def fail(session: Session, job_id: UUID, worker_id: str, error: str) -> Optional[JobStatus]:
+        """
+        Records a failed attempt. The job goes back to QUEUED with a linear
+        backoff while attempts remain, otherwise it is marked FAILED.
+        Returns the new status, or None if the lease had already been lost.
+        """
+        job = session.get(ProcessingJob, job_id)
+        if not job or job.lease_owner != worker_id or job.status != JobStatus.RUNNING:
+            return None
+
+        now = datetime.utcnow()
+        job.last_error = (error or "")[:2000]
+        job.leased_until = None
+        job.updated_at = now
+        if job.attempts < job.max_attempts:
+            job.status = JobStatus.QUEUED
+            job.available_at = now + timedelta(seconds=settings.JOB_RETRY_BACKOFF_SECONDS * job.attempts)
+        else:
+            job.status = JobStatus.FAILED
+        session.add(job)
+        session.commit()
+        return job.status
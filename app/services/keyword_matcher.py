@@ -0,0 +1,320 @@
+"""
+Multi-pattern keyword matching (Aho-Corasick).
+
+One automaton holds every keyword of every tier, so a text is scanned in a
+single pass, O(len(text) + matches), no matter how many keywords there are.
+The automaton is generic over sequences: patterns and texts can be strings
+(matched per character) or token lists (matched per token).
+
+TieredKeywordMatcher runs it over word tokens, so keywords only match whole
+words ("pain" never matches "painting"), and annotates each match with the
+negation a triage decision needs ("denies chest pain"). The text is split
+into words once and the words that occur in any keyword are stepped through
+the automaton; negation is looked up around each match only, so cost stays
+linear in the text.
+"""
+import re
+import string
+from bisect import bisect_right
+from itertools import compress
+from operator import itemgetter
+from typing import Any, Callable, Dict, Generic, Hashable, List, NamedTuple, Sequence, Tuple, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+
+class AhoCorasick(Generic[T]):
+    def __init__(self, patterns: Sequence[Tuple[Sequence[T], Any]]):
+        """`patterns` is a list of (pattern, payload); payloads are returned with each match."""
+        self._goto: List[Dict[T, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]  # Pattern ids ending at each state (incl. via fail links)
+        self._patterns: List[Tuple[int, Any]] = []  # (length, payload)
+
+        for pattern, payload in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for symbol in pattern:
+                nxt = self._goto[state].get(symbol)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][symbol] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(len(self._patterns))
+            self._patterns.append((len(pattern), payload))
+
+        # Breadth-first failure links
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for symbol, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and symbol not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(symbol, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def iter_matches(self, text: Sequence[T]):
+        """Yields (start, end, payload) for every occurrence, in order of end position."""
+        goto, fail, out, patterns = self._goto, self._fail, self._out, self._patterns
+        state = 0
+        for i, symbol in enumerate(text):
+            while state and symbol not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(symbol, 0)
+            for pattern_id in out[state]:
+                length, payload = patterns[pattern_id]
+                yield i + 1 - length, i + 1, payload
+
+
+# Words (with contractions such as "can't") and the punctuation that carries
+# structure: clause/sentence ends, list commas and speaker-label colons.
+TOKEN_RE = re.compile(r"\w+(?:'\w+)*|[.!?;:,\n]")
+
+# Word separators of the keyword pass: punctuation (but "_", a word
+# character), typographic quotes and dashes, and every kind of whitespace
+SEPARATOR_PUNCTUATION = frozenset(string.punctuation.replace("_", "") + "\u2018\u2019\u201c\u201d\u2013\u2014\u2026")
+# str.translate table making each of them a plain space (a str indexed by code point)
+WORD_SEPARATORS = "".join(" " if c.isspace() or c in SEPARATOR_PUNCTUATION else c for c in map(chr, range(0x3001)))
+
+# Sentence and line ends
+TERMINATORS = frozenset({".", "!", "?", ";", "\n"})
+# A negation scope also ends at a comma or colon: "No appetite, had a seizure"
+CLAUSE_BREAKS = "".join(TERMINATORS) + ",:"
+CLAUSE_BREAK_RE = re.compile(f"[{re.escape(CLAUSE_BREAKS)}]")
+# Everything up to the last clause break (greedy, so one backtracking match)
+CLAUSE_PREFIX_RE = re.compile(f".*[{re.escape(CLAUSE_BREAKS)}]", re.DOTALL)
+# Conjunctions that end a negation scope: "no fever but chest pain"
+SCOPE_BREAKERS = frozenset({
+    "but", "however", "although", "though", "except", "apart", "besides",
+    "yet", "whereas", "while", "because", "then",
+})
+NEGATION_CUES = frozenset({
+    "no", "not", "denies", "denied", "deny", "denying", "without", "never",
+    "negative", "nor", "none", "rule", "ruled", "ruling",
+})
+NEGATION_WINDOW = 5  # Tokens between a cue and the start of the phrase it negates
+NEGATION_LOOKBACK_CHARS = 80  # Text searched for those tokens
+WORD_STRIP = string.punctuation.replace("'", "")
+
+
+def singularize(token: str) -> str:
+    """Light plural folding: seizures -> seizure, rashes -> rash, allergies -> allergy."""
+    if len(token) <= 3 or not token.endswith("s") or token.endswith(("ss", "us", "is", "'s")):
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith(("shes", "sses", "xes", "zzes")):
+        return token[:-2]
+    return token[:-1]
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Damerau distance <= 1: one insertion, deletion, substitution or adjacent swap."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return a[i + 1:] == b[i + 1:] or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:])
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower().replace("\u2019", "'"))
+
+
+def _words(lowered: str) -> Tuple[str, List[str]]:
+    """(`lowered` with every separator a single space, its words): "can't" -> ["can", "t"]."""
+    separated = lowered.translate(WORD_SEPARATORS)
+    return separated, separated.split()
+
+
+def _word_offsets(separated: str, words: List[str], indices: List[int]) -> Dict[int, int]:
+    """Character offsets of the words at `indices` (ascending), found again as " word "."""
+    padded = f" {separated} "
+    offsets = {}
+    at, previous = -1, 0
+    for index in indices:
+        word = words[index]
+        needle = f" {word} "
+        # Copies of the word since the last located one come first
+        for _ in range(words[previous:index].count(word) + 1):
+            at = padded.find(needle, at + 1)
+        offsets[index] = at  # The leading space in `padded` is the word's start in `separated`
+        previous = index + 1
+    return offsets
+
+
+def _negated(lowered: str, start: int, floor: int) -> bool:
+    """Whether a negation cue opens within NEGATION_WINDOW words before `start`, in the same clause."""
+    window_start = max(floor, start - NEGATION_LOOKBACK_CHARS)
+    clause = CLAUSE_PREFIX_RE.match(lowered, window_start, start)
+    # Whitespace-separated words stripped of quotes and brackets; cheaper than the token regex
+    if clause is None:
+        words = lowered[window_start:start].split()
+        if window_start > floor:
+            words = words[1:]  # The window may begin mid-word
+    else:
+        words = lowered[clause.end():start].split()
+    for word in reversed(words[-NEGATION_WINDOW:]):
+        word = word.strip(WORD_STRIP)
+        if word in SCOPE_BREAKERS:
+            return False
+        if word in NEGATION_CUES:
+            return True
+    return False
+
+
+class KeywordMatch(NamedTuple):  # A tuple: built once per match on the hot path
+    keyword: str
+    tier: Any
+    rank: int      # Tier position (0 = most severe)
+    position: int  # Keyword position within its tier's list
+    start: int
+    end: int
+    negated: bool = False  # A negation cue opens within its clause
+
+    def as_dict(self) -> Dict[str, Any]:
+        tier = getattr(self.tier, "value", self.tier)
+        return {
+            "keyword": self.keyword, "tier": tier, "start": self.start, "end": self.end,
+            "negated": self.negated,
+        }
+
+
+class TieredKeywordMatcher:
+    """
+    Case-insensitive whole-word matcher over ordered keyword tiers.
+
+    `source` returns (tier, [keywords]) pairs in severity order. The automaton is
+    built immediately and rebuilt automatically whenever the keyword lists
+    change, so editing the module-level lists needs no extra step.
+
+    Plural text tokens match singular keyword words ("seizures" -> "seizure")
+    unless the plural is itself a keyword word, so "fit" does not match "fits".
+    """
+
+    def __init__(self, source: Callable[[], Sequence[Tuple[Any, List[str]]]]):
+        self._source = source
+        self._signature = None
+        self._automaton: AhoCorasick = AhoCorasick([])
+        self._symbols: Dict[str, str] = {}  # Surface form -> keyword word
+        self._ensure_current()
+
+    def _ensure_current(self):
+        tiers = tuple(self._source())
+        # Comparison against the last snapshot is cheap enough to run on every scan
+        if tiers != self._signature:
+            signature = tuple((tier, list(keywords)) for tier, keywords in tiers)
+            patterns = [
+                (tuple(_words(keyword.lower())[1]), (keyword, tier, rank, position))
+                for rank, (tier, keywords) in enumerate(tiers)
+                for position, keyword in enumerate(keywords)
+            ]
+            vocabulary = {word for pattern, _ in patterns for word in pattern}
+            symbols = {}
+            for word in vocabulary:
+                for form in (word + "s", word + "es", word[:-1] + "ies"):
+                    if form not in vocabulary and singularize(form) == word:
+                        symbols[form] = word
+                symbols[word] = word
+            self._automaton = AhoCorasick(patterns)
+            self._symbols = symbols
+            self._signature = signature
+
+    def _hits(self, lowered: str) -> List[Tuple[int, int, Any]]:
+        """(start, end, payload) of every occurrence, ordered, from one automaton pass over the words."""
+        self._ensure_current()
+        separated, words = _words(lowered)
+        automaton, symbols = self._automaton, self._symbols
+        goto, fail, out, patterns = automaton._goto, automaton._fail, automaton._out, automaton._patterns
+        found = []  # (first word, last word, payload)
+        state = 0
+        last = -2
+        # Only keyword words reach the loop; every other word is skipped at C
+        # speed and the index gap ends a phrase.
+        for i in compress(range(len(words)), map(symbols.__contains__, words)):
+            if i != last + 1:
+                state = 0
+            last = i
+            symbol = symbols[words[i]]
+            while state and symbol not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(symbol, 0)
+            for pattern_id in out[state]:
+                length, payload = patterns[pattern_id]
+                found.append((i + 1 - length, i, payload))
+        if not found:
+            return []
+
+        offsets = _word_offsets(separated, words, sorted({first for first, _, _ in found} | {end for _, end, _ in found}))
+        hits = []
+        for first, end, payload in found:
+            start, stop = offsets[first], offsets[end] + len(words[end])
+            # Phrases do not run across a clause break ("chest. Pain started")
+            if first == end or not CLAUSE_BREAK_RE.search(lowered, start, stop):
+                hits.append((start, stop, payload))
+        hits.sort(key=itemgetter(0, 1))
+        return hits
+
+    def _annotate(self, lowered: str, hits, bounds: List[Tuple[int, int]]) -> List[List[KeywordMatch]]:
+        """
+        Matches per (floor, ceiling) span of `lowered`, offsets relative to
+        the span, in the (start, end) order of `hits`. Negation never crosses
+        a span boundary.
+        """
+        results: List[List[KeywordMatch]] = [[] for _ in bounds]
+        if not hits:
+            return results
+
+        floors = [floor for floor, _ in bounds]
+        for start, stop, (keyword, tier, rank, position) in hits:
+            span = bisect_right(floors, start) - 1 if len(floors) > 1 else 0
+            floor = floors[span]
+            results[span].append(KeywordMatch(
+                keyword, tier, rank, position, start - floor, stop - floor, _negated(lowered, start, floor),
+            ))
+        return results
+
+    def scan(self, text: str) -> List[KeywordMatch]:
+        """All keyword occurrences in `text`, ordered by position, with their negation."""
+        if not text:
+            return []
+        lowered = text.lower()
+        hits = self._hits(lowered)
+        return self._annotate(lowered, hits, [(0, len(lowered))])[0] if hits else []
+
+    def scan_many(self, texts: List[str]) -> List[List[KeywordMatch]]:
+        """
+        scan() of each text, from a single pass over all of them joined
+        (offsets stay relative to each text).
+        """
+        if not texts:
+            return []
+        lowered_texts = [(text or "").lower() for text in texts]
+        bounds = []
+        position = 0
+        for lowered in lowered_texts:
+            bounds.append((position, position + len(lowered)))
+            position += len(lowered) + 1  # "\n" separator
+        joined = "\n".join(lowered_texts)
+        return self._annotate(joined, self._hits(joined), bounds)
+
+    @staticmethod
+    def strongest(matches: List[KeywordMatch]):
+        """The match a first-match-wins loop over the tier lists would have reported."""
+        if not matches:
+            return None
+        return min(matches, key=lambda m: (m.rank, m.position))
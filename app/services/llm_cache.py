@@ -0,0 +1,239 @@
+"""
+Response cache for Gemini calls.
+
+Keys are a SHA-256 of (model name, generation config, prompt), so identical
+requests - repeat page loads, job retries, re-running SOAP on an unchanged
+transcript - are answered without touching the model. Backends are
+pluggable; the default is an in-memory LRU in front of the
+`llm_response_cache` table so entries survive restarts and are shared
+between the API and the workers.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models.base import LLMCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(model_name: str, generation_config: Optional[Dict[str, Any]], prompt: Any) -> str:
+    payload = json.dumps(
+        {"model": model_name, "config": generation_config or {}, "prompt": prompt},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCacheBackend:
+    """Interface for a cache tier. Implementations must be thread-safe."""
+    name = "base"
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl_seconds: int, method: str = "", model_name: str = ""):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class MemoryLRUBackend(ResponseCacheBackend):
+    name = "memory"
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl_seconds: int, method: str = "", model_name: str = ""):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def _missing_table(exc: Exception) -> bool:
+    """Whether a DB error means the cache table does not exist (migration not run)."""
+    orig = getattr(exc, "orig", None)
+    if getattr(orig, "pgcode", None) == "42P01":  # undefined_table
+        return True
+    message = str(orig or exc).lower()
+    return "no such table" in message or ("relation" in message and "does not exist" in message)
+
+
+class SQLBackend(ResponseCacheBackend):
+    name = "sql"
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._disabled = False
+
+    def _guard(self, fn, default=None):
+        # A missing table (migration not run) must not break LLM calls; any
+        # other error (dropped connection, lock timeout) only skips this call
+        if self._disabled:
+            return default
+        try:
+            return fn()
+        except Exception as e:
+            if _missing_table(e):
+                logger.warning(f"LLM cache SQL tier disabled: {e}")
+                self._disabled = True
+            else:
+                logger.warning(f"LLM cache SQL tier error, entry skipped: {e}")
+            return default
+
+    def get(self, key: str) -> Optional[str]:
+        def _get():
+            with Session(self.engine) as session:
+                entry = session.get(LLMCacheEntry, key)
+                if entry is None:
+                    return None
+                if entry.expires_at < datetime.utcnow():
+                    session.delete(entry)
+                    session.commit()
+                    return None
+                return entry.response_text
+        return self._guard(_get)
+
+    def set(self, key: str, value: str, ttl_seconds: int, method: str = "", model_name: str = ""):
+        def _set():
+            now = datetime.utcnow()
+            values = dict(
+                key=key, method=method, model_name=model_name, response_text=value,
+                created_at=now, expires_at=now + timedelta(seconds=ttl_seconds),
+            )
+            # Upsert: two processes caching the same prompt must not race on the primary key
+            dialect = self.engine.dialect.name
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert
+            elif dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                with Session(self.engine) as session:
+                    session.merge(LLMCacheEntry(**values))
+                    try:
+                        session.commit()
+                    except IntegrityError:
+                        session.rollback()  # Inserted concurrently: merge now finds the row
+                        session.merge(LLMCacheEntry(**values))
+                        session.commit()
+                return
+            statement = insert(LLMCacheEntry).values(**values)
+            statement = statement.on_conflict_do_update(
+                index_elements=["key"],
+                set_={name: statement.excluded[name] for name in values if name != "key"},
+            )
+            with Session(self.engine) as session:
+                session.execute(statement)
+                session.commit()
+        self._guard(_set)
+
+    def delete(self, key: str):
+        def _delete():
+            with Session(self.engine) as session:
+                entry = session.get(LLMCacheEntry, key)
+                if entry:
+                    session.delete(entry)
+                    session.commit()
+        self._guard(_delete)
+
+
+class TieredResponseCache:
+    """
+    Looks keys up tier by tier (fastest first) and back-fills faster tiers
+    on a hit. Writes go to every tier.
+    """
+
+    def __init__(self, backends: List[ResponseCacheBackend], ttls: Dict[str, int]):
+        self.backends = backends
+        self.ttls = ttls
+        self.hits: Dict[str, int] = {b.name: 0 for b in backends}
+        self.misses = 0
+
+    def ttl_for(self, method: str) -> int:
+        if not self.backends:
+            return 0
+        return self.ttls.get(method, 0)
+
+    def get(self, key: str, method: str = "") -> Optional[str]:
+        for i, backend in enumerate(self.backends):
+            value = backend.get(key)
+            if value is not None:
+                self.hits[backend.name] += 1
+                for faster in self.backends[:i]:
+                    faster.set(key, value, self.ttl_for(method) or 60, method)
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str, method: str, model_name: str = ""):
+        ttl = self.ttl_for(method)
+        if ttl <= 0:
+            return
+        for backend in self.backends:
+            backend.set(key, value, ttl, method, model_name)
+
+    def delete(self, key: str):
+        for backend in self.backends:
+            backend.delete(key)
+
+    # SQL tier blocks; keep it off the event loop
+    async def aget(self, key: str, method: str = "") -> Optional[str]:
+        return await asyncio.get_event_loop().run_in_executor(None, self.get, key, method)
+
+    async def aset(self, key: str, value: str, method: str, model_name: str = ""):
+        await asyncio.get_event_loop().run_in_executor(None, self.set, key, value, method, model_name)
+
+    async def adelete(self, key: str):
+        await asyncio.get_event_loop().run_in_executor(None, self.delete, key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tiers": [b.name for b in self.backends],
+            "hits": dict(self.hits),
+            "misses": self.misses,
+        }
+
+
+def build_llm_cache() -> TieredResponseCache:
+    backends: List[ResponseCacheBackend] = []
+    if settings.LLM_CACHE_ENABLED:
+        backends.append(MemoryLRUBackend(settings.LLM_CACHE_MEMORY_ENTRIES))
+        if settings.LLM_CACHE_SQL_TIER:
+            from app.core.db import engine
+            backends.append(SQLBackend(engine))
+    return TieredResponseCache(backends, settings.LLM_CACHE_TTLS)
+
+
+llm_cache = build_llm_cache()
@@ -0,0 +1,106 @@
+"""
+Shared runtime for blocking Gemini SDK calls.
+
+- ModelRegistry builds each (model name, generation_config) pair once and
+  reuses it, instead of constructing a GenerativeModel per request.
+- InstrumentedExecutor is a dedicated, sized thread pool for LLM calls so
+  they cannot starve the default executor (DB work, file hashing, ...),
+  with queue-depth and wait-time metrics.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import google.generativeai as genai
+
+from app.core.config import settings
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name: str, generation_config: Optional[Dict[str, Any]] = None):
+        key = (model_name, json.dumps(generation_config or {}, sort_keys=True))
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = genai.GenerativeModel(model_name, generation_config=generation_config)
+                    self._models[key] = model
+        return model
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def __len__(self):
+        return len(self._models)
+
+
+class InstrumentedExecutor:
+    def __init__(self, max_workers: int, name: str):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0       # Submitted, waiting for a thread
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.max_wait_ms = 0.0
+        self._recent_waits = deque(maxlen=500)
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+
+        def _task():
+            wait_ms = (time.perf_counter() - submitted_at) * 1000
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+                self._recent_waits.append(wait_ms)
+            try:
+                result = fn(*args, **kwargs)
+                with self._lock:
+                    self.completed += 1
+                return result
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._pool, _task)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "max_queue_depth": self.max_queue_depth,
+                "wait_ms_p95": round(p95, 2),
+                "wait_ms_max": round(self.max_wait_ms, 2),
+            }
+
+
+model_registry = ModelRegistry()
+llm_executor = InstrumentedExecutor(settings.LLM_EXECUTOR_WORKERS, "llm")
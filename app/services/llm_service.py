@@ -1,18 +1,68 @@
 import google.generativeai as genai
 import json
 import asyncio
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from app.core.config import settings
 
 # Configure global API key
 genai.configure(api_key=settings.GOOGLE_API_KEY)
 
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, before_sleep_log
+from app.services.llm_cache import llm_cache, make_key
+from app.services.llm_runtime import model_registry, llm_executor
+from app.services.rate_limiter import get_limiter, is_quota_error
+from app.schemas.clinical_bundle import ClinicalBundle
 import logging
 
 logger = logging.getLogger(__name__)
 
 class GeminiService:
+    @staticmethod
+    async def _generate(method: str, model_name: str, prompt: str, generation_config: Dict[str, Any] = None, parse=None):
+        """
+        Runs a text prompt through the model, answering from the response cache
+        when the same (model, generation_config, prompt) was seen within the
+        method's TTL. If `parse` is given it is applied to the response text and
+        only successfully parsed responses are cached.
+        """
+        parse = parse or (lambda text: text)
+        key = None
+        if llm_cache.ttl_for(method) > 0:
+            key = make_key(model_name, generation_config, prompt)
+            cached = await llm_cache.aget(key, method)
+            if cached is not None:
+                try:
+                    return parse(cached)
+                except Exception:
+                    await llm_cache.adelete(key)
+
+        model = model_registry.get(model_name, generation_config)
+
+        # Queue for quota, then offload the blocking API call to the dedicated LLM pool
+        limiter = get_limiter("gemini", model_name)
+        async with limiter.slot():
+            try:
+                response = await llm_executor.run(model.generate_content, prompt)
+            except Exception as e:
+                if is_quota_error(e):
+                    limiter.throttled()
+                raise
+        result = parse(response.text)
+        if key:
+            await llm_cache.aset(key, response.text, method, model_name)
+        return result
+
+    @staticmethod
+    def _parse_json_response(text: str):
+        """Parses model JSON output, tolerating stray markdown fences."""
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            # Fallback if strict JSON fails (rare with response_mime_type set)
+            print(f"JSON Decode Error. Raw response: {text}")
+            cleaned_text = text.replace("```json", "").replace("```", "").strip()
+            return json.loads(cleaned_text)
+
     @staticmethod
     @retry(
         stop=stop_after_attempt(3),
@@ -23,8 +73,6 @@ class GeminiService:
         """
         Generates a concise (2-3 sentence) summary of the pre-visit intake transcription.
         """
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
         prompt = f"""
         You are an expert medical scribe assisting a Neurologist.
         Summarize the following patient intake conversation (conducted by a nurse or front-desk) into 2-3 concise sentences.
@@ -39,13 +87,8 @@ class GeminiService:
         Summary:
         """
         
-        # Offload the blocking API call to a thread
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None, 
-            lambda: model.generate_content(prompt)
-        )
-        return response.text.strip()
+        summary = await GeminiService._generate("generate_intake_summary", 'gemini-2.5-flash', prompt)
+        return summary.strip()
 
     @staticmethod
     @retry(
@@ -57,8 +100,6 @@ class GeminiService:
         """
         Generates a clinical document (referral, certificate, etc.) based on the SOAP note.
         """
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
         prompt = f"""
         You are an expert medical administrative assistant.
         Draft a professional **{document_type}** based on the following consultation details.
@@ -78,8 +119,8 @@ class GeminiService:
         4. Return ONLY the text of the document, no markdown formatting blocks.
         """
         
-        response = await model.generate_content_async(prompt)
-        return response.text.strip()
+        document = await GeminiService._generate("generate_clinical_document", 'gemini-2.5-flash', prompt)
+        return document.strip()
 
     @staticmethod
     @retry(
@@ -133,12 +174,6 @@ class GeminiService:
                 f"Medical History/Notes: {patient_context.get('notes', 'None provided')}"
             )
             
-        # Initialize Model (Gemini 2.5 Flash)
-        model = genai.GenerativeModel(
-            'gemini-2.5-flash',
-            generation_config={"response_mime_type": "application/json"}
-        )
-        
         prompt = f"""
         You are an expert medical scribe. Your task is to analyze the following Doctor-Patient consultation transcript and generate a HIGHLY DETAILED, professional SOAP note encoded as JSON.
         
@@ -185,36 +220,23 @@ class GeminiService:
         """
 
         
-        # Offload the blocking API call to a thread
-        loop = asyncio.get_event_loop()
-        
         try:
             print("   (Gemini) Sending request...")
-            response = await loop.run_in_executor(
-                None, 
-                lambda: model.generate_content(prompt)
+            # Initialize Model (Gemini 2.5 Flash) with JSON output
+            return await GeminiService._generate(
+                "generate_soap_note_async",
+                'gemini-2.5-flash',
+                prompt,
+                generation_config={"response_mime_type": "application/json"},
+                parse=GeminiService._parse_json_response
             )
+        except json.JSONDecodeError:
+            raise Exception("Failed to generate valid JSON SOAP note")
         except Exception as e:
             # Check for quota errors to print explicit warning (Tenacity handles the retry)
-            if "429" in str(e) or "quota" in str(e).lower() or "resource exhausted" in str(e).lower():
+            if is_quota_error(e):
                 print(f"   ⚠️ Quota Limit Hit (429). Retrying in background...")
-            raise e
-        
-        try:
-            # Parse JSON result
-            result_json = json.loads(response.text)
-            return result_json
-        except json.JSONDecodeError:
-            # Fallback if strict JSON fails (rare with response_mime_type set)
-            print(f"JSON Decode Error. Raw response: {response.text}")
-            # Attempt to clean potential markdown
-            cleaned_text = response.text.replace("```json", "").replace("```", "").strip()
-            try:
-                return json.loads(cleaned_text)
-            except:
-                 raise Exception("Failed to generate valid JSON SOAP note")
-        except Exception as e:
-            raise Exception(f"Gemini generation failed: {str(e)}")
+            raise
 
     @staticmethod
     @retry(
@@ -243,22 +265,21 @@ class GeminiService:
             
             print(f"   (Gemini) Uploading audio for transcription: {audio_file_path}")
             # Upload the audio file to Gemini
-            uploaded_file = genai.upload_file(audio_file_path)
+            uploaded_file = await llm_executor.run(genai.upload_file, audio_file_path)
             
             # Wait for processing to complete (usually instant for small files, but good practice)
-            import time
             while uploaded_file.state.name == "PROCESSING":
                 print("   (Gemini) Waiting for file processing...")
-                time.sleep(1)
-                uploaded_file = genai.get_file(uploaded_file.name)
+                await asyncio.sleep(1)
+                uploaded_file = await llm_executor.run(genai.get_file, uploaded_file.name)
             
             if uploaded_file.state.name == "FAILED":
                 raise Exception("Audio file processing failed on Gemini server.")
 
             # Upgrade to Gemini 2.5 Flash for initial transcription as well
-            model = genai.GenerativeModel(
+            model = model_registry.get(
                 'gemini-2.5-flash',
-                generation_config={"response_mime_type": "application/json"}
+                {"response_mime_type": "application/json"}
             )
             
             prompt = """
@@ -281,12 +302,15 @@ class GeminiService:
             """
             
             # Offload blocking call
-            loop = asyncio.get_event_loop()
             print("   (Gemini) Sending transcription request...")
-            response = await loop.run_in_executor(
-                None,
-                lambda: model.generate_content([prompt, uploaded_file])
-            )
+            limiter = get_limiter("gemini", 'gemini-2.5-flash')
+            async with limiter.slot():
+                try:
+                    response = await llm_executor.run(model.generate_content, [prompt, uploaded_file])
+                except Exception as e:
+                    if is_quota_error(e):
+                        limiter.throttled()
+                    raise
             
             # Parse result
             try:
@@ -322,9 +346,6 @@ class GeminiService:
             speaker_label = u.get("speaker", "Unknown")
             raw_conversation += f"Speaker {speaker_label}: {u.get('text', '')}\n"
 
-        # Use Gemini 2.5 Flash as requested for better label segmentation
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
         prompt = f"""
         You are an expert medical transcription editor. 
         Your task is to take a raw transcript with IMPERFECT speaker separation and fix it.
@@ -350,12 +371,114 @@ class GeminiService:
         Formatted Transcript:
         """
         
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None, 
-            lambda: model.generate_content(prompt)
+        # Use Gemini 2.5 Flash as requested for better label segmentation
+        formatted = await GeminiService._generate("refine_transcript_diarization", 'gemini-2.5-flash', prompt)
+        return formatted.strip()
+
+    @staticmethod
+    async def generate_clinical_bundle_async(utterances: List[Dict[str, Any]], patient_context: Dict[str, Any] = None, current_meds: str = None) -> ClinicalBundle:
+        """
+        Combined mode (LLM_COMBINED_BUNDLE): one JSON request that returns the
+        speaker-labelled transcript, SOAP note, risk flags and interaction
+        warnings, replacing the refine -> SOAP -> interaction round trips.
+        Raises if the response does not match the ClinicalBundle schema, so the
+        caller can fall back to the multi-call path. Not retried here: the
+        fallback is cheaper than another full bundle attempt.
+        """
+        raw_conversation = ""
+        for u in utterances:
+            raw_conversation += f"Speaker {u.get('speaker', 'Unknown')}: {u.get('text', '')}\n"
+
+        context_str = "Unknown"
+        if patient_context:
+            context_str = (
+                f"Name: {patient_context.get('first_name', '')} {patient_context.get('last_name', '')}\n"
+                f"Age: {patient_context.get('age', 'N/A')}\n"
+                f"Gender: {patient_context.get('gender', 'N/A')}\n"
+                f"Medical History/Notes: {patient_context.get('notes', 'None provided')}"
+            )
+
+        prompt = f"""
+        You are an expert medical scribe and Clinical Pharmacist.
+        Process the following raw Doctor-Patient consultation transcript in ONE pass and return a single JSON object.
+
+        Patient Context:
+        {context_str}
+
+        Patient Current Medications/History:
+        {current_meds or "None listed"}
+
+        Raw Transcript (speaker separation is IMPERFECT):
+        {raw_conversation}
+
+        Tasks:
+        1. **transcript**: Fix the speaker labels. Label each turn "Doctor:" or "Patient:" based on what is said, splitting blocks that contain several turns. Do NOT change the words spoken. One turn per line.
+        2. **soap_note**: HIGHLY DETAILED SOAP note grounded strictly in the transcript. Use BULLET POINTS for symptom lists, findings, differentials and each medication/instruction.
+        3. **ui_summary**: ULTRA-CONCISE drafts. Diagnosis: final or primary working impression only, separated by ' | '. Prescription: keywords (Medication Name, Dose, Freq). Notes: MUST BE EMPTY STRING "".
+        4. **demographics**: Age and gender, if mentioned.
+        5. **risk_flags**: Clinical red flags.
+        6. **interaction_warnings**: MAJOR or MODERATE drug-drug interactions or drug-condition contraindications between the current medications and the plan. Empty list if none.
+
+        Required JSON Structure:
+        {{
+            "transcript": "Doctor: Hello...\\nPatient: Hi...",
+            "soap_note": {{
+                "subjective": "...",
+                "objective": "...",
+                "assessment": "...",
+                "plan": "..."
+            }},
+            "ui_summary": {{"diagnosis": "...", "prescription": "...", "notes": ""}},
+            "demographics": {{"age": 45, "gender": "Male"}},
+            "low_confidence": ["ambiguous", "terms"],
+            "risk_flags": ["Risk 1"],
+            "interaction_warnings": [
+                {{"type": "CONTRAINDICATION" | "WARNING", "message": "...", "drug": "...", "severity": "HIGH" | "MODERATE"}}
+            ]
+        }}
+        """
+
+        print("   (Gemini) Sending combined clinical bundle request...")
+        return await GeminiService._generate(
+            "generate_clinical_bundle_async",
+            'gemini-2.5-flash',
+            prompt,
+            generation_config={"response_mime_type": "application/json"},
+            parse=lambda text: ClinicalBundle.model_validate(GeminiService._parse_json_response(text))
         )
-        return response.text.strip()
+
+    @staticmethod
+    def clinical_bundle_enabled() -> bool:
+        """
+        Combined mode hands the bundle to the SOAP job through the response
+        cache; without a cache tier the result would be dropped and the SOAP
+        call made anyway, so the mode is off.
+        """
+        return settings.LLM_COMBINED_BUNDLE and llm_cache.ttl_for("clinical_bundle") > 0
+
+    @staticmethod
+    def _bundle_stash_key(transcript_text: str) -> str:
+        return make_key("clinical_bundle", None, transcript_text)
+
+    @staticmethod
+    async def stash_clinical_bundle(bundle: ClinicalBundle):
+        """
+        Keeps the bundle, keyed by the transcript it produced, for the SOAP step.
+        If the transcript is edited in between, the key no longer matches and
+        the SOAP step takes the multi-call path.
+        """
+        key = GeminiService._bundle_stash_key(bundle.transcript)
+        await llm_cache.aset(key, bundle.model_dump_json(), "clinical_bundle")
+
+    @staticmethod
+    async def get_stashed_clinical_bundle(transcript_text: str):
+        cached = await llm_cache.aget(GeminiService._bundle_stash_key(transcript_text), "clinical_bundle")
+        if cached is None:
+            return None
+        try:
+            return ClinicalBundle.model_validate_json(cached)
+        except Exception:
+            return None
 
     @staticmethod
     @retry(
@@ -376,11 +499,6 @@ class GeminiService:
                 "condition": "Mock Condition"
             }]
 
-        model = genai.GenerativeModel(
-            'gemini-2.5-flash',
-            generation_config={"response_mime_type": "application/json"}
-        )
-        
         prompt = f"""
         You are an expert Clinical Pharmacist and AI Safety Guardrail.
         Analyze the following medication list for potential Drug-Drug Interactions (DDIs) or Drug-Condition Contraindications.
@@ -409,15 +527,154 @@ class GeminiService:
         If no interactions, return empty list [].
         """
         
-        loop = asyncio.get_event_loop()
         try:
             print("   (Gemini) Checking Drug Interactions...")
-            response = await loop.run_in_executor(
-                None, 
-                lambda: model.generate_content(prompt)
+            return await GeminiService._generate(
+                "check_drug_interactions_async",
+                'gemini-2.5-flash',
+                prompt,
+                generation_config={"response_mime_type": "application/json"},
+                parse=json.loads
             )
-            return json.loads(response.text)
         except Exception as e:
             print(f"Safety Check Failed: {e}")
             return [] # Fail safe: return no warnings rather than blocking, or handle upstream
 
+    @staticmethod
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=2, min=4, max=30),
+        reraise=True
+    )
+    async def check_drug_pairs_async(pairs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[Dict[str, str]]]:
+        """
+        Checks each drug pair on its own, so results can be memoized per pair.
+        Returns {pair: warnings} ([] = no significant interaction); pairs the
+        model left out are missing from the result.
+        """
+        if not pairs:
+            return {}
+        if settings.USE_MOCK_AI:
+            a, b = pairs[0]
+            return {pairs[0]: [{
+                "type": "WARNING",
+                "message": "Mock Warning: Potential interaction detected.",
+                "drug": a.title(),
+                "interacts_with": b.title(),
+                "severity": "MODERATE"
+            }]}
+
+        listed = "\n".join(f"{i}. {a} + {b}" for i, (a, b) in enumerate(pairs, 1))
+        prompt = f"""
+        You are an expert Clinical Pharmacist and AI Safety Guardrail.
+        Assess each of the following drug pairs independently for Drug-Drug Interactions (DDIs).
+
+        Pairs:
+        {listed}
+
+        Task:
+        1. For every pair, list any **MAJOR** or **MODERATE** interactions between the two drugs.
+        2. Ignore minor interactions unless critical.
+        3. Return one entry per pair, in the same order, with an empty list when there is no significant interaction.
+
+        Required JSON Structure:
+        [
+            {{
+                "pair": 1,
+                "warnings": [
+                    {{
+                        "type": "CONTRAINDICATION" | "WARNING",
+                        "message": "Clear explanation of the risk (e.g., Risk of Serotonin Syndrome).",
+                        "drug": "Name of the drug causing issue",
+                        "severity": "HIGH" | "MODERATE"
+                    }}
+                ]
+            }}
+        ]
+        """
+
+        def parse(text: str):
+            results = {}
+            for entry in json.loads(text):
+                number = entry.get("pair")
+                if isinstance(number, int) and 1 <= number <= len(pairs) and isinstance(entry.get("warnings"), list):
+                    a, b = pairs[number - 1]
+                    results[pairs[number - 1]] = [
+                        {**w, "interacts_with": w.get("interacts_with") or (b.title() if w.get("drug", "").lower() == a else a.title())}
+                        for w in entry["warnings"] if isinstance(w, dict)
+                    ]
+            return results
+
+        try:
+            print(f"   (Gemini) Checking {len(pairs)} Drug Pair(s)...")
+            return await GeminiService._generate(
+                "check_drug_pairs_async",
+                'gemini-2.5-flash',
+                prompt,
+                generation_config={"response_mime_type": "application/json"},
+                parse=parse
+            )
+        except Exception as e:
+            print(f"Safety Check Failed: {e}")
+            return {} # Fail safe: nothing is memoized, the pairs are asked again next time
+
+    @staticmethod
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=2, min=4, max=30),
+        reraise=True
+    )
+    async def check_drug_conditions_async(medical_history: str, drugs: List[str]) -> List[Dict[str, str]]:
+        """
+        Checks newly prescribed drugs against the patient's medical history
+        (conditions, and any medications it mentions) for contraindications.
+        Returns a list of warnings.
+        """
+        if not drugs:
+            return []
+        if settings.USE_MOCK_AI:
+            return []
+
+        prompt = f"""
+        You are an expert Clinical Pharmacist and AI Safety Guardrail.
+        Analyze the following new prescriptions for Drug-Condition Contraindications against the patient's medical history,
+        and for interactions with any medications the history mentions.
+
+        Patient Medical History:
+        {medical_history}
+
+        New Prescriptions:
+        {", ".join(drugs)}
+
+        Task:
+        1. Identify any **MAJOR** or **MODERATE** contraindications or interactions.
+        2. Ignore minor issues unless critical.
+        3. Return a JSON list of warnings.
+
+        Required JSON Structure:
+        [
+            {{
+                "type": "CONTRAINDICATION" | "WARNING",
+                "message": "Clear explanation of the risk (e.g., Triptans are contraindicated in coronary artery disease).",
+                "drug": "Name of the drug causing issue",
+                "condition": "The condition or medication it conflicts with",
+                "severity": "HIGH" | "MODERATE"
+            }}
+        ]
+
+        If no issues, return empty list [].
+        """
+
+        try:
+            print("   (Gemini) Checking Drug-Condition Contraindications...")
+            return await GeminiService._generate(
+                "check_drug_conditions_async",
+                'gemini-2.5-flash',
+                prompt,
+                generation_config={"response_mime_type": "application/json"},
+                parse=json.loads
+            )
+        except Exception as e:
+            print(f"Safety Check Failed: {e}")
+            return []
+
@@ -0,0 +1,255 @@
+"""
+Medication normalization: free text -> canonical drug, dose and frequency.
+
+Current-medication lists and SOAP plans are free text; every consumer used
+to reparse them. MedicationNormalizer reads a text once - a token trie over
+the vocabulary (interaction-index drugs and aliases plus MedicalTerm
+MEDICATION rows), a one-edit fuzzy lookup for misspelt names, and dose and
+frequency parsing for the rest of each mention's line - and returns
+structured mentions that are stored on PatientProfile.normalized_medications
+and SOAPNote.plan_medications, so later checks are plain lookups.
+
+Misspelt and unknown names are only accepted when a dose follows them
+("Lamotrigne 25mg", "Brivaracetam 50 mg"), which keeps ordinary words out.
+"""
+import asyncio
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models.base import MedicalTerm, MedicalTermCategory
+from app.services.drug_interactions import get_interaction_index, normalize_drug
+from app.services.keyword_matcher import TOKEN_RE, AhoCorasick, tokenize, within_one_edit
+
+logger = logging.getLogger(__name__)
+
+# Words that precede a dose without being a drug: "take 2 tablets", "increase 50mg"
+DOSE_STOPWORDS = frozenset({
+    "take", "takes", "taking", "dose", "doses", "daily", "total", "start", "starting", "increase",
+    "reduce", "then", "with", "plus", "over", "every", "maximum", "max", "upto", "from", "each",
+})
+FUZZY_MIN_LENGTH = 5
+
+# Plan items that prescribe; other plan items (imaging, referrals, follow-up) are not medication items
+PRESCRIBING_WORDS = frozenset({
+    "start", "starting", "commence", "begin", "initiate", "add", "prescribe", "prescribed", "trial",
+    "switch", "increase", "titrate", "continue", "restart", "resume", "take", "give", "use",
+})
+ITEM_SPLIT_RE = re.compile(r"[\n;,+]|\band\b")
+NO_MEDICATIONS_RE = re.compile(
+    r"^(?:none|nil|nkda|n/?a|no (?:regular |current |known )?(?:medications?|meds))(?: listed| known| reported)?$"
+)
+
+DOSE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(mg|mcg|micrograms?|µg|ug|g|grams?|ml|units?|iu)\b")
+LEADING_DOSE_RE = re.compile(r"\s*" + DOSE_RE.pattern)
+DOSE_UNITS = {"microgram": "mcg", "micrograms": "mcg", "µg": "mcg", "ug": "mcg", "gram": "g", "grams": "g", "unit": "units", "iu": "units"}
+
+
+def _abbreviation(letters: str) -> str:
+    """"bid" -> b.i.d., b.i.d or bid."""
+    return r"\.?".join(letters) + r"\.?"
+
+
+FREQUENCIES = {
+    "once daily": ["od", "qd", "once daily", "once a day", "once per day", "daily"],
+    "twice daily": ["bd", "bid", "twice daily", "twice a day", "two times a day"],
+    "three times daily": ["tds", "tid", "three times daily", "three times a day"],
+    "four times daily": ["qds", "qid", "four times daily", "four times a day"],
+    "in the morning": ["mane", "every morning", "in the morning"],
+    "at night": ["nocte", "qhs", "at night", "at bedtime", "every night"],
+    "as needed": ["prn", "as needed", "as required", "when required"],
+    "weekly": ["weekly", "once a week", "once weekly"],
+}
+_FREQUENCY_LOOKUP = {phrase.replace(" ", ""): canonical for canonical, phrases in FREQUENCIES.items() for phrase in phrases}
+_FREQUENCY_PATTERNS = [
+    r"\s+".join(phrase.split()) if " " in phrase else _abbreviation(phrase)
+    for phrase in sorted((p for phrases in FREQUENCIES.values() for p in phrases), key=len, reverse=True)
+]
+FREQUENCY_RE = re.compile(rf"\b(?:every\s+(\d+)\s*(?:hours?|hrs?|h)\b|q(\d+)h\b|({'|'.join(_FREQUENCY_PATTERNS)})(?!\w))")
+
+
+def parse_dose(text: str) -> Optional[str]:
+    match = DOSE_RE.search(text)
+    if not match:
+        return None
+    unit = match.group(2)
+    return f"{match.group(1)} {DOSE_UNITS.get(unit, unit)}"
+
+
+def parse_frequency(text: str) -> Optional[str]:
+    match = FREQUENCY_RE.search(text)
+    if not match:
+        return None
+    hours = match.group(1) or match.group(2)
+    if hours:
+        return f"every {hours} hours"
+    return _FREQUENCY_LOOKUP.get(re.sub(r"[.\s]", "", match.group(3)))
+
+
+def _deletions(word: str):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+@dataclass
+class MedicationMention:
+    name: str  # Canonical generic name, or the word itself for unknown drugs
+    text: str  # As written
+    dose: Optional[str] = None
+    frequency: Optional[str] = None
+    match: str = "exact"  # "exact", "fuzzy" or "unknown"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "text": self.text, "dose": self.dose, "frequency": self.frequency, "match": self.match}
+
+
+class MedicationNormalizer:
+    """Whole-word medication finder over a fixed vocabulary (names -> canonical names)."""
+
+    def __init__(self, names: Dict[str, str]):
+        self._automaton = AhoCorasick([(tuple(tokenize(name)), canonical) for name, canonical in names.items()])
+        self._known_tokens = frozenset(token for name in names for token in tokenize(name))
+        # Symmetric-deletion index over single-word names, for one-edit misspellings
+        self._fuzzy: Dict[str, set] = {}
+        for name, canonical in names.items():
+            if " " not in name and len(name) >= FUZZY_MIN_LENGTH:
+                for key in _deletions(name) | {name}:
+                    self._fuzzy.setdefault(key, set()).add((name, canonical))
+
+    def _fuzzy_lookup(self, word: str) -> Optional[str]:
+        candidates = set()
+        for key in _deletions(word) | {word}:
+            candidates.update(canonical for name, canonical in self._fuzzy.get(key, ()) if within_one_edit(word, name))
+        return candidates.pop() if len(candidates) == 1 else None
+
+    def normalize(self, text: str) -> List[MedicationMention]:
+        """Mentions in text order; a drug written twice is reported once, with the first dose found."""
+        if not text:
+            return []
+        lowered = text.lower().replace("\u2019", "'")
+        words = list(TOKEN_RE.finditer(lowered))
+        tokens = [w.group() for w in words]
+
+        # Longest match at each position wins ("sodium valproate" over "valproate")
+        spans = []
+        taken = set()
+        for start, end, canonical in sorted(self._automaton.iter_matches(tokens), key=lambda m: (m[0], -m[1])):
+            if start not in taken:
+                taken.update(range(start, end))
+                spans.append((start, end, canonical, "exact"))
+        for i, token in enumerate(tokens):
+            if i in taken or token in self._known_tokens or token in DOSE_STOPWORDS or len(token) < 4 or not token.isalpha():
+                continue
+            if not LEADING_DOSE_RE.match(lowered, words[i].end()):
+                continue
+            canonical = self._fuzzy_lookup(token) if len(token) >= FUZZY_MIN_LENGTH else None
+            spans.append((i, i + 1, canonical or token, "fuzzy" if canonical else "unknown"))
+        spans.sort()
+
+        mentions: Dict[str, MedicationMention] = {}
+        for n, (start, end, canonical, match) in enumerate(spans):
+            # Dose and frequency come from the rest of the line, up to the next drug
+            tail_start = words[end - 1].end()
+            line_end = lowered.find("\n", tail_start)
+            tail_end = line_end if line_end != -1 else len(lowered)
+            if n + 1 < len(spans):
+                tail_end = min(tail_end, words[spans[n + 1][0]].start())
+            tail = lowered[tail_start:tail_end]
+            mention = mentions.get(canonical)
+            if mention is None:
+                mentions[canonical] = MedicationMention(
+                    name=canonical,
+                    text=text[words[start].start():tail_start],
+                    dose=parse_dose(tail),
+                    frequency=parse_frequency(tail),
+                    match=match,
+                )
+            else:
+                mention.dose = mention.dose or parse_dose(tail)
+                mention.frequency = mention.frequency or parse_frequency(tail)
+        return list(mentions.values())
+
+    def extract(self, text: str) -> List[str]:
+        """Canonical names in order of first mention."""
+        return [mention.name for mention in self.normalize(text)]
+
+
+class _VocabularyCache:
+    """MedicalTerm MEDICATION names, reloaded after a TTL or an explicit invalidate()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._normalizer: Optional[MedicationNormalizer] = None
+        self._loaded_at = 0.0
+
+    def stale(self) -> bool:
+        return self._normalizer is None or time.monotonic() - self._loaded_at > settings.MEDICATION_VOCABULARY_TTL_SECONDS
+
+    def invalidate(self):
+        with self._lock:
+            self._normalizer = None
+
+    def get(self) -> MedicationNormalizer:
+        if not self.stale():
+            return self._normalizer
+        with self._lock:
+            if self.stale():
+                index = get_interaction_index()
+                names = {name: index.canonical(name) for name in index.drugs | set(index.aliases)}
+                try:
+                    with Session(engine) as session:
+                        terms = session.exec(
+                            select(MedicalTerm.term).where(MedicalTerm.category == MedicalTermCategory.MEDICATION)
+                        ).all()
+                    for term in terms:
+                        names.setdefault(normalize_drug(term), index.canonical(term))
+                except Exception as e:
+                    logger.warning("Medication vocabulary unavailable, using the interaction index only: %s", e)
+                self._normalizer = MedicationNormalizer({name: canonical for name, canonical in names.items() if name})
+                self._loaded_at = time.monotonic()
+            return self._normalizer
+
+    async def aget(self) -> MedicationNormalizer:
+        """get(), loading in a worker thread when the vocabulary has to be (re)read."""
+        if self.stale():
+            return await asyncio.to_thread(self.get)
+        return self._normalizer
+
+
+medication_vocabulary = _VocabularyCache()
+
+
+def normalize_medications(text: Optional[str]) -> List[Dict[str, Any]]:
+    """Structured form of a medication list or plan, as stored on the models."""
+    return [mention.as_dict() for mention in medication_vocabulary.get().normalize(text or "")]
+
+
+async def anormalize_medications(text: Optional[str]) -> List[Dict[str, Any]]:
+    return [mention.as_dict() for mention in (await medication_vocabulary.aget()).normalize(text or "")]
+
+
+def unresolved_items(text: Optional[str], mentions: List[Dict[str, Any]], plan: bool = False) -> List[str]:
+    """
+    Items of a medication list (or, with plan=True, the prescribing items of
+    a plan) that no recognized drug accounts for: "combined oral
+    contraceptive pill", "start topiramate". Works from stored mentions too,
+    without the vocabulary. Doses of drugs outside the vocabulary
+    ("unknown" matches) do not count as recognized.
+    """
+    known = [mention["text"].lower() for mention in mentions if mention.get("match", "exact") != "unknown" and mention.get("text")]
+    unresolved = []
+    for item in ITEM_SPLIT_RE.split((text or "").lower()):
+        item = item.strip(" \t-*\u2022.:()")
+        if not item or NO_MEDICATIONS_RE.match(item):
+            continue
+        if plan and not (PRESCRIBING_WORDS.intersection(tokenize(item)) or parse_dose(item) or parse_frequency(item)):
+            continue
+        if not any(name in item for name in known):
+            unresolved.append(item)
+    return unresolved
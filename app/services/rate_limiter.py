@@ -0,0 +1,253 @@
+"""
+Process-wide concurrency and rate limiting for external AI providers.
+
+Each provider/model gets a ProviderLimiter: a semaphore capping in-flight
+requests plus a token bucket capping requests per minute. Waiters are
+served first-come first-served, so concurrent consultations queue for
+quota instead of each one burning tenacity retries on 429s. With
+RATE_LIMIT_BACKEND="db" the token bucket state lives in the
+`rate_limit_buckets` table and is shared by the API and all workers.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import update
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import warn_if_session_held
+from app.models.base import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_DEFAULTS = {
+    "gemini": lambda: {"concurrency": settings.GEMINI_MAX_CONCURRENCY, "rpm": settings.GEMINI_REQUESTS_PER_MINUTE},
+    "assemblyai": lambda: {"concurrency": settings.ASSEMBLYAI_MAX_CONCURRENCY, "rpm": settings.ASSEMBLYAI_REQUESTS_PER_MINUTE},
+}
+
+
+def is_quota_error(error) -> bool:
+    """Accepts an exception or a provider error message."""
+    message = str(error).lower()
+    return "429" in message or "quota" in message or "resource exhausted" in message
+
+
+class _PerLoop:
+    """asyncio primitives are bound to one event loop; keep one per loop."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._items = weakref.WeakKeyDictionary()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        item = self._items.get(loop)
+        if item is None:
+            item = self._items[loop] = self._factory()
+        return item
+
+
+class TokenBucket:
+    """In-process token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._fifo = _PerLoop(asyncio.Lock)
+
+    def try_take(self) -> float:
+        """Takes a token if available. Returns 0, or the seconds until one is."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        # Holding the FIFO lock while sleeping keeps waiters in arrival order
+        async with self._fifo.get():
+            while True:
+                wait = self.try_take()
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def drain(self):
+        """Called on a provider 429: everyone waits for fresh tokens."""
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+
+class DBTokenBucket(TokenBucket):
+    """Token bucket whose state is shared through the database (compare-and-swap on updated_at)."""
+
+    def __init__(self, key: str, rate_per_minute: float, burst: int, engine):
+        super().__init__(rate_per_minute, burst)
+        self.key = key
+        self.engine = engine
+
+    def try_take(self) -> float:
+        with Session(self.engine) as session:
+            for _ in range(5):  # Retry lost races a few times before sleeping
+                row = session.get(RateLimitBucket, self.key)
+                now = datetime.utcnow()
+                if row is None:
+                    session.add(RateLimitBucket(key=self.key, tokens=self.capacity - 1, updated_at=now))
+                    try:
+                        session.commit()
+                        return 0.0
+                    except Exception:
+                        session.rollback()  # Another process created it first
+                        continue
+
+                elapsed = max(0.0, (now - row.updated_at).total_seconds())
+                tokens = min(self.capacity, row.tokens + elapsed * self.rate)
+                if tokens < 1:
+                    return (1 - tokens) / self.rate
+
+                result = session.execute(
+                    update(RateLimitBucket)
+                    .where(RateLimitBucket.key == self.key)
+                    .where(RateLimitBucket.updated_at == row.updated_at)
+                    .values(tokens=tokens - 1, updated_at=now)
+                )
+                session.commit()
+                if result.rowcount:
+                    return 0.0
+                session.expire_all()
+            return 1.0 / self.rate
+
+    async def acquire(self):
+        async with self._fifo.get():
+            while True:
+                wait = await asyncio.to_thread(self.try_take)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    def drain(self):
+        try:
+            with Session(self.engine) as session:
+                session.execute(
+                    update(RateLimitBucket)
+                    .where(RateLimitBucket.key == self.key)
+                    .values(tokens=0.0, updated_at=datetime.utcnow())
+                )
+                session.commit()
+        except Exception as e:
+            logger.warning(f"Could not drain shared rate limit bucket {self.key}: {e}")
+
+
+class ProviderLimiter:
+    def __init__(self, key: str, max_concurrency: int, bucket: Optional[TokenBucket] = None):
+        self.key = key
+        self.max_concurrency = max_concurrency
+        self.bucket = bucket
+        self._semaphore = _PerLoop(lambda: asyncio.Semaphore(max_concurrency))
+        self.in_flight = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.throttled_count = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+
+    @asynccontextmanager
+    async def slot(self):
+        warn_if_session_held(self.key)
+        started = time.perf_counter()
+        semaphore = self._semaphore.get() if self.max_concurrency > 0 else None
+        self.waiting += 1
+        try:
+            if semaphore:
+                await semaphore.acquire()
+            try:
+                if self.bucket:
+                    await self.bucket.acquire()
+            except BaseException:
+                if semaphore:
+                    semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+
+        waited = time.perf_counter() - started
+        self.acquired += 1
+        self.total_wait_s += waited
+        self.max_wait_s = max(self.max_wait_s, waited)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if semaphore:
+                semaphore.release()
+
+    def throttled(self):
+        """Report a 429 from the provider so all callers back off together."""
+        self.throttled_count += 1
+        if self.bucket:
+            self.bucket.drain()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "requests_per_minute": round(self.bucket.rate * 60, 2) if self.bucket else None,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "throttled": self.throttled_count,
+            "wait_s_avg": round(self.total_wait_s / self.acquired, 3) if self.acquired else 0.0,
+            "wait_s_max": round(self.max_wait_s, 3),
+        }
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limiter_config(provider: str, key: str) -> Dict[str, int]:
+    config = dict(PROVIDER_DEFAULTS.get(provider, lambda: {"concurrency": 0, "rpm": 0})())
+    config.update(settings.RATE_LIMIT_OVERRIDES.get(provider, {}))
+    config.update(settings.RATE_LIMIT_OVERRIDES.get(key, {}))
+    return config
+
+
+def get_limiter(provider: str, model: Optional[str] = None) -> ProviderLimiter:
+    key = f"{provider}:{model}" if model else provider
+    limiter = _limiters.get(key)
+    if limiter is not None:
+        return limiter
+
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            config = _limiter_config(provider, key)
+            rpm = config.get("rpm", 0)
+            bucket = None
+            if rpm > 0:
+                burst = config.get("burst", max(1, rpm // 10))
+                if settings.RATE_LIMIT_BACKEND == "db":
+                    from app.core.db import engine
+                    bucket = DBTokenBucket(key, rpm, burst, engine)
+                else:
+                    bucket = TokenBucket(rpm, burst)
+            limiter = ProviderLimiter(key, config.get("concurrency", 0), bucket)
+            _limiters[key] = limiter
+    return limiter
+
+
+def limiter_stats() -> Dict[str, Any]:
+    return {key: limiter.stats() for key, limiter in _limiters.items()}
@@ -1,6 +1,9 @@
 from app.services.llm_service import GeminiService
+from app.services.drug_interactions import get_interaction_index, recall_pairs, remember_pairs
+from app.services.medication_normalizer import medication_vocabulary, unresolved_items
 from app.models.base import SOAPNote, PatientProfile
-from typing import List, Dict
+from app.core.config import settings
+from typing import List, Dict, Optional
 import json
 
 class SafetyService:
@@ -11,15 +14,80 @@ class SafetyService:
         Returns a list of warnings.
         """
         soap_json = soap_note.soap_json or {}
-        plan_text = soap_json.get("plan", "").lower()
-        
+        plan_text = ((soap_json.get("soap_note") or {}).get("plan") or "").lower()
+
         # Prepare Inputs for AI
         current_meds = patient_profile.current_medications or patient_profile.medical_history or "None listed"
         new_prescription = plan_text
-        
+
+        if settings.DRUG_INTERACTION_INDEX_ENABLED:
+            warnings = await SafetyService._check_normalized(soap_note, patient_profile, new_prescription)
+            if warnings is not None:
+                return warnings
+            # Something on either side is not a known drug: the full check reads all of it
+            if patient_profile.current_medications and patient_profile.medical_history:
+                current_meds = f"{patient_profile.current_medications}\nMedical history: {patient_profile.medical_history}"
+
         if not new_prescription:
             return []
 
         # Use Gemini for Analysis
         warnings = await GeminiService.check_drug_interactions_async(current_meds, new_prescription)
         return warnings
+
+    @staticmethod
+    async def _check_normalized(soap_note: SOAPNote, patient_profile: PatientProfile, plan_text: str) -> Optional[List[Dict[str, str]]]:
+        """
+        Index path, taken only when both the current medications and the
+        plan's prescriptions fully normalize to known drugs; returns None
+        otherwise. Stored normalizations make this a lookup; free text is
+        parsed only when they are missing. New drugs are always checked
+        against the medical history for drug-condition contraindications.
+        """
+        current_text = patient_profile.current_medications or ""
+        current = await SafetyService._mentions(patient_profile.normalized_medications if current_text else None, current_text)
+        new = await SafetyService._mentions(soap_note.plan_medications, plan_text)
+        if unresolved_items(current_text, current) or unresolved_items(plan_text, new, plan=True):
+            return None
+
+        current_names = SafetyService._names(current)
+        # Continuing medication is part of the established regimen, not a new prescription
+        new_names = [drug for drug in SafetyService._names(new) if drug not in current_names]
+        warnings = await SafetyService._check_with_index(current_names, new_names)
+        history = (patient_profile.medical_history or "").strip()
+        if history and new_names:
+            warnings += await GeminiService.check_drug_conditions_async(history, new_names)
+        return warnings
+
+    @staticmethod
+    async def _mentions(stored: Optional[List[dict]], text: str) -> List[dict]:
+        """A stored normalization, else the text parsed now."""
+        if stored is not None:
+            return stored
+        return [mention.as_dict() for mention in (await medication_vocabulary.aget()).normalize(text)]
+
+    @staticmethod
+    def _names(mentions: List[dict]) -> List[str]:
+        return list(dict.fromkeys(mention["name"] for mention in mentions))
+
+    @staticmethod
+    async def _check_with_index(current: List[str], new: List[str]) -> List[Dict[str, str]]:
+        """
+        Resolves drug pairs from the local index, then from the per-pair
+        memo; only pairs neither knows go to Gemini, and its answers are
+        memoized per pair for every later patient.
+        """
+        if not new:
+            return []
+
+        warnings, unknown = get_interaction_index().resolve(current, new)
+        if unknown:
+            memoized, missing = await recall_pairs(unknown)
+            warnings += memoized
+            if missing:
+                results = await GeminiService.check_drug_pairs_async(missing)
+                if not settings.USE_MOCK_AI:
+                    await remember_pairs(results)
+                for pair_warnings in results.values():
+                    warnings += pair_warnings
+        return warnings
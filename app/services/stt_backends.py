@@ -0,0 +1,200 @@
+"""
+Speech-to-text backends.
+
+Every backend returns the AssemblyAI-shaped result the pipeline already
+consumes: {"text", "transcript", "utterances": [{"speaker", "text",
+"start", "end"}], "confidence", "id"} with timestamps in milliseconds.
+The active backend is chosen by settings.STT_BACKEND:
+
+- "assemblyai": AssemblyAI SDK (default).
+- "gemini": GeminiService.transcribe_audio_with_diarization.
+- "local": replays the ground-truth TextGrids in test-audio-transcripts,
+  so the pipeline, benchmarks and load tests run offline and
+  deterministically.
+"""
+import asyncio
+import os
+import re
+from typing import Any, Dict, List, Optional, Protocol
+
+import assemblyai as aai
+
+from app.core.config import settings
+from app.services.rate_limiter import get_limiter, is_quota_error
+
+
+class STTBackend(Protocol):
+    name: str
+    supports_chunking: bool  # False if results depend on the original file name
+
+    async def transcribe(self, file_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+
+def _result(utterances: List[Dict[str, Any]], text: Optional[str] = None, confidence=None, id=None) -> Dict[str, Any]:
+    if text is None:
+        text = " ".join(u["text"] for u in utterances)
+    return {
+        "text": text,
+        "transcript": text,  # frontend compatibility
+        "utterances": utterances,
+        "confidence": confidence,
+        "id": id,
+    }
+
+
+class AssemblyAIBackend:
+    name = "assemblyai"
+    supports_chunking = True
+
+    def __init__(self):
+        self._configured = False
+        # id(options) -> (options, TranscriptionConfig); callers reuse one options dict per vocabulary
+        self._configs: Dict[int, Any] = {}
+
+    def _configure(self):
+        # Configured on first use so importing the service needs no API key
+        if not self._configured:
+            if not settings.ASSEMBLYAI_API_KEY:
+                raise RuntimeError("ASSEMBLYAI_API_KEY is not set (or choose another STT_BACKEND)")
+            aai.settings.api_key = settings.ASSEMBLYAI_API_KEY
+            self._configured = True
+
+    def _config(self, options: Dict[str, Any]) -> aai.TranscriptionConfig:
+        cached = self._configs.get(id(options))
+        if cached is None or cached[0] is not options:
+            if len(self._configs) >= 8:
+                self._configs.clear()
+            cached = self._configs[id(options)] = (options, aai.TranscriptionConfig(**options))
+        return cached[1]
+
+    async def transcribe(self, file_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        self._configure()
+        transcriber = aai.Transcriber()
+        config = self._config(options)
+        loop = asyncio.get_event_loop()
+
+        limiter = get_limiter("assemblyai")
+        async with limiter.slot():
+            transcript = await loop.run_in_executor(
+                None,
+                lambda: transcriber.transcribe(file_path, config=config)
+            )
+        if transcript.status == aai.TranscriptStatus.error:
+            if is_quota_error(transcript.error):
+                limiter.throttled()
+            raise Exception(transcript.error)
+
+        utterances = [
+            {
+                "speaker": u.speaker,
+                "text": u.text,
+                "start": u.start,
+                "end": u.end
+            } for u in transcript.utterances
+        ] if transcript.utterances else []
+        return _result(utterances, transcript.text, transcript.confidence, transcript.id)
+
+
+class GeminiBackend:
+    name = "gemini"
+    supports_chunking = True
+
+    async def transcribe(self, file_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        from app.services.llm_service import GeminiService
+
+        raw = await GeminiService.transcribe_audio_with_diarization(file_path)
+        # Gemini reports seconds; the pipeline expects milliseconds
+        utterances = [
+            {
+                "speaker": u.get("speaker", "Unknown"),
+                "text": u.get("text", ""),
+                "start": int(float(u.get("start") or 0) * 1000),
+                "end": int(float(u.get("end") or 0) * 1000),
+            } for u in raw.get("utterances", [])
+        ]
+        text = " ".join(u["text"] for u in utterances) or raw.get("full_transcript", "")
+        return _result(utterances, text)
+
+
+class TextGridReplayBackend:
+    """
+    Returns the manual transcription for recordings named like
+    `day1_consultation01[_doctor|_patient].wav` (any prefix/suffix, e.g. an
+    upload UUID, is fine). The doctor and patient channel TextGrids are
+    merged by time; the doctor is speaker "A" and the patient "B".
+    """
+    name = "local"
+    supports_chunking = False
+
+    RECORDING_ID = re.compile(r"(day\d+_consultation\d+)")
+    INTERVAL = re.compile(r'xmin = ([\d.]+)\s*\n\s*xmax = ([\d.]+)\s*\n\s*text = "(.*)"')
+    CHANNELS = (("doctor", "A"), ("patient", "B"))
+
+    def __init__(self, transcript_dir: str, latency_seconds: float = 0.0):
+        self.transcript_dir = transcript_dir
+        self.latency_seconds = latency_seconds
+
+    @staticmethod
+    def _clean(text: str) -> str:
+        text = text.replace('""', '"')  # Praat escapes quotes by doubling them
+        text = re.sub(r"<UNIN[^>]*>", "", text)
+        text = text.replace("<UNSURE>", "").replace("</UNSURE>", "")
+        return " ".join(text.split())
+
+    def _read_channel(self, path: str, speaker: str) -> List[Dict[str, Any]]:
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+        utterances = []
+        for xmin, xmax, text in self.INTERVAL.findall(content):
+            text = self._clean(text)
+            if text:
+                utterances.append({
+                    "speaker": speaker,
+                    "text": text,
+                    "start": int(float(xmin) * 1000),
+                    "end": int(float(xmax) * 1000),
+                })
+        return utterances
+
+    def load(self, file_path: str) -> Dict[str, Any]:
+        match = self.RECORDING_ID.search(os.path.basename(file_path))
+        if not match:
+            raise FileNotFoundError(f"No recording id (dayN_consultationNN) in {file_path}")
+        recording = match.group(1)
+
+        utterances = []
+        for channel, speaker in self.CHANNELS:
+            path = os.path.join(self.transcript_dir, f"{recording}_{channel}.TextGrid")
+            if os.path.exists(path):
+                utterances.extend(self._read_channel(path, speaker))
+        if not utterances:
+            raise FileNotFoundError(f"No TextGrid transcripts for {recording} in {self.transcript_dir}")
+
+        utterances.sort(key=lambda u: u["start"])
+        return _result(utterances, confidence=1.0, id=f"local-{recording}")
+
+    async def transcribe(self, file_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return await asyncio.to_thread(self.load, file_path)
+
+
+def build_stt_backend(name: str) -> STTBackend:
+    if name == "assemblyai":
+        return AssemblyAIBackend()
+    if name == "gemini":
+        return GeminiBackend()
+    if name == "local":
+        return TextGridReplayBackend(settings.STT_LOCAL_TRANSCRIPT_DIR, settings.STT_LOCAL_LATENCY_SECONDS)
+    raise ValueError(f"Unknown STT_BACKEND: {name}")
+
+
+_backends: Dict[str, STTBackend] = {}
+
+
+def get_stt_backend(name: Optional[str] = None) -> STTBackend:
+    name = name or settings.STT_BACKEND
+    if name not in _backends:
+        _backends[name] = build_stt_backend(name)
+    return _backends[name]
@@ -1,22 +1,24 @@
 import assemblyai as aai
 import asyncio
+import logging
+from typing import Dict, Optional, Tuple
 from app.core.config import settings
+from app.services import audio_chunker
+from app.services.transcript_cache import transcript_cache, config_fingerprint
+from app.services.stt_backends import get_stt_backend
+from app.services.stt_vocabulary import BoostVocabulary, word_boost_vocabulary
 
-# Configure global API key
-aai.settings.api_key = settings.ASSEMBLYAI_API_KEY
+logger = logging.getLogger(__name__)
 
 
 class AssemblyAIService:
-    @staticmethod
-    async def transcribe_audio_async(file_path: str, redact_pii: bool = True) -> dict:
-        """
-        Asynchronously transcribes audio using AssemblyAI (correct SDK usage).
-        Supports diarization, PII redaction, medical vocabulary boosting.
-        """
-
-        transcriber = aai.Transcriber()
+    # redact_pii -> (vocabulary snapshot, options, options fingerprint)
+    _compiled: Dict[bool, Tuple[BoostVocabulary, dict, str]] = {}
 
-        config = aai.TranscriptionConfig(
+    @staticmethod
+    def _config_options(redact_pii: bool, word_boost: list) -> dict:
+        """TranscriptionConfig keyword arguments (also the cache fingerprint input)."""
+        return dict(
             speaker_labels=True,
             speakers_expected=2,
             redact_pii=redact_pii,
@@ -27,39 +29,88 @@ class AssemblyAIService:
             language_code="en_us",
             punctuate=True,
             format_text=True,
-            word_boost=[
-                "Levetiracetam",
-                "Donepezil",
-                "Carbamazepine",
-                "Sumatriptan",
-                "Topiramate",
-                "Valproate",
-                "Gabapentin",
-                "Memantine"
-            ],
+            word_boost=word_boost,
             boost_param="high"
         )
 
-        loop = asyncio.get_event_loop()
-        transcript = await loop.run_in_executor(
-            None,
-            lambda: transcriber.transcribe(file_path, config=config)
+    @staticmethod
+    async def _compiled_options(redact_pii: bool) -> Tuple[dict, str]:
+        """Options and their fingerprint, rebuilt only when the boost vocabulary changes."""
+        vocabulary = await word_boost_vocabulary.aget()
+        compiled = AssemblyAIService._compiled.get(redact_pii)
+        if compiled is None or compiled[0] is not vocabulary:
+            options = AssemblyAIService._config_options(redact_pii, vocabulary.word_boost)
+            # The boosted terms change the transcript, their ranking does not: a re-ranked list keeps the cache
+            fingerprint = config_fingerprint({**options, "word_boost": sorted(options["word_boost"])})
+            compiled = (vocabulary, options, fingerprint)
+            AssemblyAIService._compiled[redact_pii] = compiled
+        return compiled[1], compiled[2]
+
+    @staticmethod
+    async def _transcribe_maybe_chunked(backend, file_path: str, options: dict) -> dict:
+        """
+        Long recordings are split on silence and the chunks transcribed in
+        parallel (STT_CHUNKING_ENABLED). Short files, or files ffmpeg cannot
+        analyse, go out as a single request.
+        """
+        transcribe_fn = lambda path: backend.transcribe(path, options)
+        if not (settings.STT_CHUNKING_ENABLED and backend.supports_chunking):
+            return await transcribe_fn(file_path)
+
+        try:
+            duration, silences = await audio_chunker.analyze_audio(file_path)
+        except Exception as e:
+            logger.warning(f"Audio analysis failed, transcribing in one request: {e}")
+            return await transcribe_fn(file_path)
+
+        plan = audio_chunker.plan_chunks(duration, silences, settings.STT_CHUNK_SECONDS)
+        if len(plan) == 1:
+            return await transcribe_fn(file_path)
+
+        logger.info(f"Transcribing {file_path} ({duration:.0f}s) as {len(plan)} chunks")
+        return await audio_chunker.transcribe_chunked(
+            file_path,
+            transcribe_fn,
+            settings.STT_CHUNK_SECONDS,
+            settings.STT_CHUNK_OVERLAP_SECONDS,
+            settings.STT_CHUNK_CONCURRENCY,
+            plan=plan,
         )
 
-        if transcript.status == aai.TranscriptStatus.error:
-            raise Exception(transcript.error)
+    @staticmethod
+    async def transcribe_audio_async(file_path: str, redact_pii: bool = True, content_sha256: Optional[str] = None) -> dict:
+        """
+        Asynchronously transcribes audio using AssemblyAI (correct SDK usage).
+        Supports diarization, PII redaction, medical vocabulary boosting.
+        Results are cached by audio content + config, so re-running the same
+        file skips the upload and transcription entirely.
+        Set STT_BACKEND to route through Gemini or the offline TextGrid replay
+        instead (see app/services/stt_backends.py).
+        """
+        options, options_fingerprint = await AssemblyAIService._compiled_options(redact_pii)
+        backend = get_stt_backend()
+        loop = asyncio.get_event_loop()
+
+        cache_key = None
+        if settings.TRANSCRIPT_CACHE_ENABLED:
+            fingerprint_input = {"options": options_fingerprint}
+            if backend.name != "assemblyai":
+                fingerprint_input["backend"] = backend.name
+            if settings.STT_CHUNKING_ENABLED:
+                # Stitched results differ slightly from single-request ones
+                fingerprint_input["chunking"] = [settings.STT_CHUNK_SECONDS, settings.STT_CHUNK_OVERLAP_SECONDS]
+            # Hashing reads the whole file (unless the upload already did); keep it off the event loop
+            cache_key = await loop.run_in_executor(
+                None,
+                lambda: transcript_cache.make_key(file_path, config_fingerprint(fingerprint_input), content_sha256)
+            )
+            cached = await loop.run_in_executor(None, transcript_cache.get, cache_key)
+            if cached is not None:
+                return cached
+
+        result = await AssemblyAIService._transcribe_maybe_chunked(backend, file_path, options)
+
+        if cache_key:
+            await loop.run_in_executor(None, transcript_cache.put, cache_key, result)
 
-        return {
-            "text": transcript.text,
-            "transcript": transcript.text,  # frontend compatibility
-            "utterances": [
-                {
-                    "speaker": u.speaker,
-                    "text": u.text,
-                    "start": u.start,
-                    "end": u.end
-                } for u in transcript.utterances
-            ] if transcript.utterances else [],
-            "confidence": transcript.confidence,
-            "id": transcript.id
-        }
+        return result
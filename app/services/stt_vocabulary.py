@@ -0,0 +1,124 @@
+"""
+Speech-to-text vocabulary boosting from the MedicalTerm table.
+
+The word_boost list sent with every transcription is the MedicalTerm
+vocabulary ranked by usage_count - how many transcripts each term has
+appeared in - and capped at the provider's limit, with a few core drugs as
+a fallback when the table is empty or unreachable. The snapshot is reloaded
+when terms are created or deleted (medical_terms.py calls invalidate()) and
+otherwise only after STT_WORD_BOOST_TTL_SECONDS, so usage re-ranks it slowly
+without a query per upload. Callers key their compiled configs on the
+snapshot object: a new snapshot means rebuild, the same one means reuse.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, update
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models.base import MedicalTerm
+from app.services.keyword_matcher import AhoCorasick, tokenize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORD_BOOST = [
+    "Levetiracetam",
+    "Donepezil",
+    "Carbamazepine",
+    "Sumatriptan",
+    "Topiramate",
+    "Valproate",
+    "Gabapentin",
+    "Memantine",
+]
+MAX_BOOST_PHRASE_WORDS = 6  # AssemblyAI rejects longer word_boost entries
+
+
+class BoostVocabulary:
+    """An immutable snapshot: the ranked boost list and a matcher for usage counting."""
+
+    def __init__(self, ranked_terms: List[str], limit: int):
+        self.terms = tuple(ranked_terms)
+        words: Dict[str, None] = {}
+        for term in list(ranked_terms) + DEFAULT_WORD_BOOST:
+            if len(term.split()) <= MAX_BOOST_PHRASE_WORDS:
+                words.setdefault(term)
+        self.word_boost = list(words)[:limit]
+        self._automaton = AhoCorasick([(tuple(tokenize(term)), term) for term in ranked_terms])
+
+    def count(self, text: str) -> Counter:
+        """Terms mentioned in `text` (each counted once per text)."""
+        if not text or not len(self._automaton):
+            return Counter()
+        return Counter({term for _, _, term in self._automaton.iter_matches(tokenize(text))})
+
+
+class _BoostVocabularyCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vocabulary: Optional[BoostVocabulary] = None
+        self._loaded_at = 0.0
+
+    def stale(self) -> bool:
+        return self._vocabulary is None or time.monotonic() - self._loaded_at > settings.STT_WORD_BOOST_TTL_SECONDS
+
+    def invalidate(self):
+        with self._lock:
+            self._vocabulary = None
+
+    def get(self) -> BoostVocabulary:
+        if not self.stale():
+            return self._vocabulary
+        with self._lock:
+            if self.stale():
+                terms: List[str] = []
+                try:
+                    with Session(engine) as session:
+                        terms = session.exec(
+                            select(MedicalTerm.term).order_by(MedicalTerm.usage_count.desc(), MedicalTerm.term)
+                        ).all()
+                except Exception as e:
+                    logger.warning("Medical terms unavailable, boosting the default vocabulary only: %s", e)
+                self._vocabulary = BoostVocabulary(terms, settings.STT_WORD_BOOST_LIMIT)
+                self._loaded_at = time.monotonic()
+            return self._vocabulary
+
+    async def aget(self) -> BoostVocabulary:
+        """get(), loading in a worker thread when the vocabulary has to be (re)read."""
+        if self.stale():
+            return await asyncio.to_thread(self.get)
+        return self._vocabulary
+
+
+word_boost_vocabulary = _BoostVocabularyCache()
+
+
+def record_term_usage(text: str) -> int:
+    """
+    Bumps usage_count for the terms found in a transcript, in its own
+    transaction so a failure never affects the caller. Returns the number
+    of terms counted.
+    """
+    counts = word_boost_vocabulary.get().count(text)
+    if not counts:
+        return 0
+    table = MedicalTerm.__table__
+    try:
+        with Session(engine) as session:
+            session.connection().execute(
+                update(table)
+                .where(table.c.term == bindparam("b_term"))
+                .values(usage_count=table.c.usage_count + bindparam("b_count")),
+                [{"b_term": term, "b_count": n} for term, n in counts.items()],
+            )
+            session.commit()
+    except Exception as e:
+        logger.warning("Could not record medical term usage: %s", e)
+        return 0
+    return len(counts)
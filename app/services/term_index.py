@@ -0,0 +1,217 @@
+"""
+In-process autocomplete index over the MedicalTerm table.
+
+Sorted arrays per category (plus one for all terms) hold two kinds of key:
+the whole lower-cased term, and each of its words. A search bisects to the
+query prefix and walks forward only until `limit` results are found, so
+its cost follows the page size rather than the vocabulary size. Results
+come in three passes: terms starting with the query, terms with a word
+starting with it ("hyper" -> "Idiopathic intracranial hypertension"), and
+words one edit away from it ("siezure" -> "Seizure", provided the first
+letter and the second or third are right).
+
+The index is loaded on startup and updated in place by the create/delete
+endpoints. Each change bumps `generation`, which feeds the search ETag. Other
+worker processes pick up changes when MEDICAL_TERM_INDEX_TTL_SECONDS runs out.
+"""
+import hashlib
+import threading
+import time
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models.base import MedicalTerm, MedicalTermCategory
+from app.services.keyword_matcher import TOKEN_RE
+
+FUZZY_MIN_LENGTH = 4
+FUZZY_SCAN_LIMIT = 2000  # Keys examined per fuzzy bucket
+
+Key = Tuple[str, UUID]
+
+
+@dataclass(frozen=True)
+class TermEntry:
+    id: UUID
+    term: str
+    category: MedicalTermCategory
+    description: Optional[str]
+    created_at: datetime
+
+    @classmethod
+    def from_model(cls, term: MedicalTerm) -> "TermEntry":
+        return cls(term.id, term.term, term.category, term.description, term.created_at)
+
+    def as_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "term": self.term,
+            "category": self.category,
+            "description": self.description,
+            "created_at": self.created_at,
+        }
+
+    def keys(self) -> Tuple[Key, List[Key]]:
+        lowered = self.term.lower()
+        words = dict.fromkeys(w.group() for w in TOKEN_RE.finditer(lowered) if w.group()[0].isalnum())
+        return (lowered, self.id), [(word, self.id) for word in words]
+
+
+def _near_prefix(q: str, word: str) -> bool:
+    """True if one edit (insert, delete, substitute, swap) turns `q` into a prefix of `word`."""
+    i = 0
+    n = min(len(q), len(word))
+    while i < n and q[i] == word[i]:
+        i += 1
+    if i == len(q):
+        return True
+    rest = q[i + 1:]
+    return (
+        word.startswith(rest, i + 1)  # substitution
+        or word.startswith(rest, i)  # extra letter in q
+        or word.startswith(q[i:], i + 1)  # letter missing from q
+        or (i + 1 < len(q) and word[i + 1:i + 2] == q[i] and word[i:i + 1] == q[i + 1] and word.startswith(q[i + 2:], i + 2))
+    )
+
+
+def _prefixed(keys: List[Key], prefix: str) -> Iterator[Key]:
+    for i in range(bisect_left(keys, (prefix,)), len(keys)):
+        if not keys[i][0].startswith(prefix):
+            return
+        yield keys[i]
+
+
+class MedicalTermIndex:
+    def __init__(self, entries: Iterable[TermEntry] = ()):
+        self._lock = threading.Lock()
+        self._entries: Dict[UUID, TermEntry] = {}
+        # category (None = all) -> (sorted whole-term keys, sorted word keys)
+        self._arrays: Dict[Optional[MedicalTermCategory], Tuple[List[Key], List[Key]]] = {None: ([], [])}
+        self._load_token = format(time.time_ns(), "x")
+        self._version = 0
+        for entry in entries:
+            self._entries[entry.id] = entry
+            term_key, word_keys = entry.keys()
+            for terms, words in self._targets(entry):
+                terms.append(term_key)
+                words.extend(word_keys)
+        for terms, words in self._arrays.values():
+            terms.sort()
+            words.sort()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def generation(self) -> str:
+        return f"{self._load_token}.{self._version}"
+
+    def _targets(self, entry: TermEntry):
+        return [self._arrays[None], self._arrays.setdefault(entry.category, ([], []))]
+
+    def add(self, entry: TermEntry):
+        with self._lock:
+            if entry.id in self._entries:
+                self._remove(entry.id)
+            self._entries[entry.id] = entry
+            term_key, word_keys = entry.keys()
+            for terms, words in self._targets(entry):
+                insort(terms, term_key)
+                for key in word_keys:
+                    insort(words, key)
+            self._version += 1
+
+    def remove(self, term_id: UUID):
+        with self._lock:
+            if term_id in self._entries:
+                self._remove(term_id)
+                self._version += 1
+
+    def _remove(self, term_id: UUID):
+        entry = self._entries.pop(term_id)
+        term_key, word_keys = entry.keys()
+        for terms, words in self._targets(entry):
+            for keys, key in [(terms, term_key)] + [(words, k) for k in word_keys]:
+                i = bisect_left(keys, key)
+                if i < len(keys) and keys[i] == key:
+                    del keys[i]
+
+    def search(self, query: str, category: Optional[MedicalTermCategory] = None, limit: int = 10) -> List[Dict]:
+        q = " ".join(query.lower().split())
+        if not q:
+            return []
+        # Reads work on whatever arrays are current; a concurrent insert at worst shifts one result
+        terms, words = self._arrays.get(category, ([], []))
+        found: Dict[UUID, None] = {}
+
+        for passes in (_prefixed(terms, q), _prefixed(words, q)):
+            for _, term_id in passes:
+                found.setdefault(term_id)
+                if len(found) >= limit:
+                    break
+            if len(found) >= limit:
+                break
+
+        if len(found) < limit and len(q) >= FUZZY_MIN_LENGTH and " " not in q:
+            # Only words sharing the query's first letter and its second or
+            # third ("siezure" -> "se...") are examined, to keep this bounded
+            fuzzy: Dict[UUID, None] = {}
+            for bucket in dict.fromkeys((q[:2], q[0] + q[2])):
+                for scanned, (word, term_id) in enumerate(_prefixed(words, bucket)):
+                    if scanned >= FUZZY_SCAN_LIMIT or len(found) + len(fuzzy) >= limit:
+                        break
+                    if term_id not in found and _near_prefix(q, word):
+                        fuzzy.setdefault(term_id)
+            found.update(fuzzy)
+
+        entries = self._entries
+        return [entries[term_id].as_dict() for term_id in found if term_id in entries]
+
+    def etag(self, query: str, category: Optional[MedicalTermCategory], limit: int) -> str:
+        params = f"{' '.join(query.lower().split())}|{category.value if category else ''}|{limit}"
+        return f'W/"{self.generation}-{hashlib.sha1(params.encode("utf-8")).hexdigest()[:12]}"'
+
+
+class _TermIndexCache:
+    """The process-wide index, reloaded from the table after a TTL or an explicit invalidate()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index: Optional[MedicalTermIndex] = None
+        self._loaded_at = 0.0
+
+    def stale(self) -> bool:
+        return self._index is None or time.monotonic() - self._loaded_at > settings.MEDICAL_TERM_INDEX_TTL_SECONDS
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+    def get(self) -> MedicalTermIndex:
+        if not self.stale():
+            return self._index
+        with self._lock:
+            if self.stale():
+                with Session(engine) as session:
+                    terms = session.exec(select(MedicalTerm)).all()
+                    self._index = MedicalTermIndex(TermEntry.from_model(term) for term in terms)
+                self._loaded_at = time.monotonic()
+            return self._index
+
+    def add(self, term: MedicalTerm):
+        """Applies a created term to the loaded index (a later load reads it anyway)."""
+        if self._index is not None:
+            self._index.add(TermEntry.from_model(term))
+
+    def remove(self, term_id: UUID):
+        if self._index is not None:
+            self._index.remove(term_id)
+
+
+medical_term_index = _TermIndexCache()
@@ -0,0 +1,133 @@
+"""
+Content-addressed cache for speech-to-text results.
+
+Entries are keyed by a streaming SHA-256 of the audio bytes plus a
+fingerprint of the transcription config, so re-running the same file with
+the same settings (reprocess, batch scripts) skips the upload and the
+provider round trip. Entries live as JSON files in a size-bounded directory
+with least-recently-used eviction (file mtime is bumped on every hit).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+def file_sha256(file_path: str) -> str:
+    """Hashes a file without loading it into memory."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def config_fingerprint(config: Dict[str, Any]) -> str:
+    """Stable hash of transcription settings (enums serialised by value)."""
+    payload = json.dumps(config, sort_keys=True, default=lambda o: getattr(o, "value", str(o)))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class TranscriptCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index: Optional["OrderedDict[str, int]"] = None  # key -> size, oldest first
+        self._total_bytes = 0
+
+    def make_key(self, file_path: str, fingerprint: str, content_sha256: Optional[str] = None) -> str:
+        """`content_sha256` skips re-reading a file whose hash is already known (e.g. from the upload)."""
+        return f"{content_sha256 or file_sha256(file_path)}-{fingerprint}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load_index(self):
+        # Rebuild LRU order from disk once per process
+        if self._index is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    result = json.load(f)
+                os.utime(self._path(key))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping unreadable transcript cache entry {key}: {e}")
+                self._total_bytes -= self._index.pop(key, 0)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, result: Dict[str, Any]):
+        data = json.dumps(result).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._load_index()
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+
+            while self._total_bytes > self.max_bytes and self._index:
+                old_key, size = self._index.popitem(last=False)
+                self._total_bytes -= size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old_key))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._index) if self._index is not None else None,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+transcript_cache = TranscriptCache(settings.TRANSCRIPT_CACHE_DIR, settings.TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024)
@@ -1,5 +1,8 @@
-from app.models.base import TriageCategory, SOAPNote, PatientProfile
-from typing import Dict, Any, Tuple, Optional
+from app.models.base import TriageCategory, SOAPNote, PatientProfile, Consultation
+from app.services.keyword_matcher import TieredKeywordMatcher, KeywordMatch
+from sqlalchemy import or_, update
+from sqlmodel import Session, select
+from typing import Dict, Any, List, Tuple, Optional
 
 # Critical keywords that indicate emergency conditions
 # These MUST trigger CRITICAL triage status
@@ -72,7 +75,24 @@ MODERATE_KEYWORDS = [
 ]
 
 
+# Single-pass matcher over all three lists (rebuilt automatically if they change)
+keyword_matcher = TieredKeywordMatcher(lambda: (
+    (TriageCategory.CRITICAL, CRITICAL_KEYWORDS),
+    (TriageCategory.HIGH, HIGH_KEYWORDS),
+    (TriageCategory.MODERATE, MODERATE_KEYWORDS),
+))
+
+# Extra score points per additional mention within a tier
+MAX_EVIDENCE_BONUS = 4
+TIERS = (TriageCategory.CRITICAL, TriageCategory.HIGH, TriageCategory.MODERATE)
+
+
 class TriageService:
+
+    @staticmethod
+    def find_keywords(text: str) -> List[KeywordMatch]:
+        """Every triage keyword occurrence in `text` with its tier and offsets."""
+        return keyword_matcher.scan(text)
     
     @staticmethod
     def evaluate_transcript(transcript: str) -> Dict[str, Any]:
@@ -82,97 +102,177 @@ class TriageService:
         Runs IMMEDIATELY after speech-to-text completes.
         
         Returns:
-            dict with triage_status, risk_score, reason, triage_source
+            dict with triage_status, risk_score, reason, triage_source and
+            matches (every matched phrase with its tier and offsets)
         """
         if not transcript:
             return {
                 "triage_status": TriageCategory.LOW,
                 "risk_score": 10,
                 "reason": "No transcript provided",
-                "triage_source": "AI"
+                "triage_source": "AI",
+                "matches": []
             }
         
-        transcript_lower = transcript.lower()
-        
-        # Check for CRITICAL keywords first
-        for keyword in CRITICAL_KEYWORDS:
-            if keyword in transcript_lower:
-                return {
-                    "triage_status": TriageCategory.CRITICAL,
-                    "risk_score": 95,
-                    "reason": f"Detected critical phrase: '{keyword}'",
-                    "triage_source": "AI"
-                }
+        matches = keyword_matcher.scan(transcript)
+        tier, strongest, bonus = TriageService._weigh(matches)
+        all_matches = [m.as_dict() for m in matches]
+
+        # The reason names the first keyword of the reached tier, as before
+        if tier == TriageCategory.CRITICAL:
+            return {
+                "triage_status": TriageCategory.CRITICAL,
+                "risk_score": 95 + bonus,
+                "reason": f"Detected critical phrase: '{strongest.keyword}'",
+                "triage_source": "AI",
+                "matches": all_matches
+            }
         
-        # Check for HIGH urgency keywords
-        for keyword in HIGH_KEYWORDS:
-            if keyword in transcript_lower:
-                return {
-                    "triage_status": TriageCategory.HIGH,
-                    "risk_score": 75,
-                    "reason": f"Detected high urgency phrase: '{keyword}'",
-                    "triage_source": "AI"
-                }
+        if tier == TriageCategory.HIGH:
+            return {
+                "triage_status": TriageCategory.HIGH,
+                "risk_score": 75 + bonus,
+                "reason": f"Detected high urgency phrase: '{strongest.keyword}'",
+                "triage_source": "AI",
+                "matches": all_matches
+            }
         
-        # Check for MODERATE keywords
-        for keyword in MODERATE_KEYWORDS:
-            if keyword in transcript_lower:
-                return {
-                    "triage_status": TriageCategory.MODERATE,
-                    "risk_score": 50,
-                    "reason": f"Detected moderate symptom: '{keyword}'",
-                    "triage_source": "AI"
-                }
+        if tier == TriageCategory.MODERATE:
+            return {
+                "triage_status": TriageCategory.MODERATE,
+                "risk_score": 50 + bonus,
+                "reason": f"Detected moderate symptom: '{strongest.keyword}'",
+                "triage_source": "AI",
+                "matches": all_matches
+            }
         
         # Default to LOW
         return {
             "triage_status": TriageCategory.LOW,
             "risk_score": 20,
             "reason": "No critical symptoms detected",
-            "triage_source": "AI"
+            "triage_source": "AI",
+            "matches": all_matches
         }
     
+    @staticmethod
+    def _weigh(matches: List[KeywordMatch]) -> Tuple[Optional[TriageCategory], Optional[KeywordMatch], int]:
+        """
+        (most severe tier with a mention that is not negated, the match to
+        report for it, score bonus: one point per further mention of that
+        tier). Mentions nested in a longer match of the same tier ("chest
+        pain" in "crushing chest pain") do not count again.
+        """
+        counted: List[KeywordMatch] = []
+        mentions = 0
+        covered_until = -1
+        for match in matches:  # Ordered by (start, end)
+            if match.negated:
+                continue
+            if counted and match.rank > counted[0].rank:
+                continue
+            if not counted or match.rank < counted[0].rank:
+                counted, mentions, covered_until = [], 0, -1
+            counted.append(match)
+            if match.end > covered_until:
+                covered_until = match.end
+                mentions += 1
+        if not counted:
+            return None, None, 0
+        return TIERS[counted[0].rank], keyword_matcher.strongest(counted), min(MAX_EVIDENCE_BONUS, mentions - 1)
+
+    @staticmethod
+    def _soap_segments(soap_json: Optional[dict], risk_flags: Optional[dict]) -> Tuple[str, str]:
+        """(risk flag text, subjective + assessment text) as calculate_urgency scans them."""
+        risk_data = risk_flags or {}
+        risk_flags_list = risk_data.get("flags", []) if isinstance(risk_data, dict) else []
+        soap_content = (soap_json or {}).get("soap_note") or {}
+        subjective = soap_content.get("subjective") or ""
+        assessment = soap_content.get("assessment") or ""
+        # Newlines end phrases and negation scopes, so flags never match across each other
+        return "\n".join(str(f) for f in risk_flags_list), subjective + "\n" + assessment
+
+    @staticmethod
+    def _score_matches(flag_matches: List[KeywordMatch], text_matches: List[KeywordMatch]) -> Tuple[int, TriageCategory]:
+        # 1. Critical Risk Flags (Suicide, Abuse, Severe Distress), unless negated
+        if any(m.tier == TriageCategory.CRITICAL and not m.negated for m in flag_matches):
+            return 95, TriageCategory.CRITICAL
+
+        # 2-3. Textual content, most severe tier mentioned wins
+        tier, _, bonus = TriageService._weigh(text_matches)
+        if tier == TriageCategory.CRITICAL:
+            return 90 + bonus, TriageCategory.CRITICAL
+        if tier == TriageCategory.HIGH:
+            return 75 + bonus, TriageCategory.HIGH
+        if tier == TriageCategory.MODERATE:
+            return 50 + bonus, TriageCategory.MODERATE
+
+        # 4. Low Urgency (Default)
+        return 20, TriageCategory.LOW
+
     @staticmethod
     def calculate_urgency(soap_note: SOAPNote, patient_profile: PatientProfile) -> Tuple[int, TriageCategory]:
         """
         Calculates urgency score (0-100) and category based on SOAP note content and risk flags.
         This is a SECONDARY triage method, used after AI processing.
         """
-        score = 0
-        
-        # risk_flags is stored as {"flags": ["Risk1", "Risk2"]}
-        risk_data = soap_note.risk_flags or {}
-        risk_flags_list = risk_data.get("flags", []) if isinstance(risk_data, dict) else []
-        soap_json = soap_note.soap_json or {}
-        
-        subjective = soap_json.get("subjective", "").lower()
-        assessment = soap_json.get("assessment", "").lower()
-        
-        # 1. Critical Risk Flags (Suicide, Abuse, Severe Distress)
-        for flag in risk_flags_list:
-            if any(k in flag.lower() for k in CRITICAL_KEYWORDS):
-                score = 95
-                return score, TriageCategory.CRITICAL
-        
-        # Check textual content for critical keywords
-        combined_text = subjective + " " + assessment
-        for keyword in CRITICAL_KEYWORDS:
-            if keyword in combined_text:
-                score = 90
-                return score, TriageCategory.CRITICAL
- 
-        # 2. High Urgency
-        for keyword in HIGH_KEYWORDS:
-            if keyword in combined_text:
-                score = 75
-                return score, TriageCategory.HIGH
- 
-        # 3. Moderate Urgency
-        for keyword in MODERATE_KEYWORDS:
-            if keyword in combined_text:
-                score = 50
-                return score, TriageCategory.MODERATE
- 
-        # 4. Low Urgency (Default)
-        score = 20
-        return score, TriageCategory.LOW
+        flags_text, combined_text = TriageService._soap_segments(soap_note.soap_json, soap_note.risk_flags)
+        return TriageService._score_matches(keyword_matcher.scan(flags_text), keyword_matcher.scan(combined_text))
+
+    @staticmethod
+    def evaluate_batch(rows: List[Tuple[Any, Optional[dict], Optional[dict]]]) -> Dict[Any, Tuple[int, TriageCategory]]:
+        """
+        Scores many SOAP notes at once; same result per row as calculate_urgency.
+        `rows` are (key, soap_json, risk_flags). All segments are scanned in
+        a single pass over the chunk; negation scopes are reset at every
+        segment boundary, so nothing leaks between notes.
+        """
+        segments: List[str] = []
+        for _, soap_json, risk_flags in rows:
+            segments.extend(TriageService._soap_segments(soap_json, risk_flags))
+        matches = keyword_matcher.scan_many(segments)
+        return {
+            key: TriageService._score_matches(matches[2 * i], matches[2 * i + 1])
+            for i, (key, _, _) in enumerate(rows)
+        }
+
+    @staticmethod
+    def retriage_all(session: Session, chunk_size: int = 1000, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Recomputes urgency for every consultation with a SOAP note (e.g. after
+        a keyword list change). Streams rows in keyset-paginated chunks,
+        scores each chunk with evaluate_batch and writes changed rows back
+        with one bulk UPDATE per chunk. Manually triaged consultations are
+        left alone.
+        """
+        stats = {"scanned": 0, "updated": 0, "by_category": {}}
+        last_id = None
+        while True:
+            query = (
+                select(Consultation.id, SOAPNote.soap_json, SOAPNote.risk_flags, Consultation.urgency_score, Consultation.triage_category)
+                .join(SOAPNote, SOAPNote.consultation_id == Consultation.id)
+                .where(or_(Consultation.triage_source.is_(None), Consultation.triage_source != "MANUAL"))
+                .order_by(Consultation.id)
+                .limit(chunk_size)
+            )
+            if last_id is not None:
+                query = query.where(Consultation.id > last_id)
+            rows = session.exec(query).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            scores = TriageService.evaluate_batch([(row[0], row[1], row[2]) for row in rows])
+            changes = []
+            for consultation_id, _, _, old_score, old_category in rows:
+                score, category = scores[consultation_id]
+                stats["by_category"][category.value] = stats["by_category"].get(category.value, 0) + 1
+                if (score, category) != (old_score, old_category):
+                    changes.append({"id": consultation_id, "urgency_score": score, "triage_category": category, "triage_source": "AI"})
+
+            stats["scanned"] += len(rows)
+            stats["updated"] += len(changes)
+            if changes and not dry_run:
+                session.execute(update(Consultation), changes)
+                session.commit()
+        return stats
@@ -0,0 +1,91 @@
+"""
+Streaming upload storage.
+
+save_upload copies an UploadFile to disk chunk by chunk, hashing and
+counting as it goes, so the upload is read exactly once and the size cap is
+enforced before an oversized file is fully written. Reads go through
+UploadFile.read (threaded by Starlette once the spool is on disk); writes
+and hashing run in worker threads, so the event loop never blocks on file
+I/O. The file is written to a ".part" path and renamed into place only
+once it is complete.
+"""
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import UploadFile
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Upload exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str
+
+
+def _write_chunk(out, digest, chunk: bytes):
+    digest.update(chunk)
+    out.write(chunk)
+
+
+async def save_upload(upload: UploadFile, path: str, max_bytes: Optional[int] = None) -> StoredUpload:
+    """Writes `upload` to `path`; raises UploadTooLarge (leaving nothing behind) past `max_bytes`."""
+    declared = getattr(upload, "size", None)
+    if max_bytes is not None and declared is not None and declared > max_bytes:
+        raise UploadTooLarge(max_bytes)
+
+    partial = f"{path}.part"
+    digest = hashlib.sha256()
+    size = 0
+    out = await asyncio.to_thread(open, partial, "wb")
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            await asyncio.to_thread(_write_chunk, out, digest, chunk)
+        await asyncio.to_thread(out.close)
+        await asyncio.to_thread(os.replace, partial, path)
+    except BaseException:
+        await asyncio.to_thread(_discard, out, partial)
+        raise
+    return StoredUpload(path, size, digest.hexdigest())
+
+
+def _discard(out, partial: str):
+    out.close()
+    try:
+        os.remove(partial)
+    except FileNotFoundError:
+        pass
+
+
+async def move_upload(stored: StoredUpload, path: str) -> StoredUpload:
+    """Renames a stored upload (same filesystem, so no copy)."""
+    await asyncio.to_thread(os.replace, stored.path, path)
+    return StoredUpload(path, stored.size, stored.sha256)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def discard_upload(stored: StoredUpload):
+    """Deletes a stored upload that will not be recorded (missing files are ignored)."""
+    await asyncio.to_thread(_remove, stored.path)
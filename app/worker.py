@@ -0,0 +1,145 @@
+"""
+Background worker for transcode, transcription and SOAP jobs.
+
+Usage:
+    python -m app.worker [--concurrency 4] [--worker-id host-1]
+
+Polls the `processing_jobs` table, leases due jobs and runs them through
+the consultation processor. Any number of workers can run side by side.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+from typing import Dict, Optional
+from uuid import UUID, uuid4
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.db import engine, track_held_sessions
+from app.models.base import ProcessingJob, JobType
+from app.services.job_queue import JobQueue
+from app.services.consultation_processor import process_transcode, process_transcription_only, process_soap_generation
+
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {
+    JobType.TRANSCODE: lambda job: process_transcode(job.consultation_id, job.audio_file_id),
+    JobType.TRANSCRIPTION: lambda job: process_transcription_only(job.consultation_id, job.audio_file_id),
+    JobType.SOAP_GENERATION: lambda job: process_soap_generation(job.consultation_id),
+}
+
+
+class Worker:
+    def __init__(self, concurrency: Optional[int] = None, worker_id: Optional[str] = None):
+        self.concurrency = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{str(uuid4())[:8]}"
+        self.lease_seconds = settings.JOB_LEASE_SECONDS
+        self.active: Dict[UUID, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+        self._slot_freed = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _lease(self, limit: int):
+        with Session(engine) as session:
+            return JobQueue.lease(session, self.worker_id, limit, self.lease_seconds)
+
+    def _heartbeat(self, job_id: UUID) -> bool:
+        with Session(engine) as session:
+            return JobQueue.heartbeat(session, job_id, self.worker_id, self.lease_seconds)
+
+    def _complete(self, job_id: UUID):
+        with Session(engine) as session:
+            JobQueue.complete(session, job_id, self.worker_id)
+
+    def _fail(self, job_id: UUID, error: str):
+        with Session(engine) as session:
+            return JobQueue.fail(session, job_id, self.worker_id, error)
+
+    async def _keep_lease(self, job_id: UUID):
+        # Renew well before the visibility timeout runs out
+        interval = max(self.lease_seconds / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            if not await asyncio.to_thread(self._heartbeat, job_id):
+                logger.warning(f"Worker {self.worker_id} lost lease on job {job_id}")
+                return
+
+    async def _run_job(self, job: ProcessingJob):
+        track_held_sessions()
+        handler = JOB_HANDLERS.get(job.job_type)
+        heartbeat = asyncio.create_task(self._keep_lease(job.id))
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for job type {job.job_type}")
+            logger.info(f"Running {job.job_type} job {job.id} (attempt {job.attempts}/{job.max_attempts})")
+            await handler(job)
+            await asyncio.to_thread(self._complete, job.id)
+        except Exception as e:
+            status = await asyncio.to_thread(self._fail, job.id, str(e))
+            logger.error(f"Job {job.id} failed: {e} -> {status}")
+        finally:
+            heartbeat.cancel()
+            self.active.pop(job.id, None)
+            self._slot_freed.set()
+
+    async def run(self):
+        logger.info(f"Worker {self.worker_id} started (concurrency={self.concurrency})")
+        capacity = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+        if not settings.DATABASE_URL.startswith("sqlite") and self.concurrency > capacity:
+            logger.warning(
+                f"Worker concurrency {self.concurrency} exceeds the DB pool ({capacity} connections); "
+                f"jobs will wait up to {settings.DB_POOL_TIMEOUT_SECONDS}s for a connection"
+            )
+        while not self._stopping.is_set():
+            free_slots = self.concurrency - len(self.active)
+            if free_slots > 0:
+                try:
+                    jobs = await asyncio.to_thread(self._lease, free_slots)
+                except Exception as e:
+                    logger.error(f"Leasing jobs failed: {e}")
+                    jobs = []
+                for job in jobs:
+                    self.active[job.id] = asyncio.create_task(self._run_job(job))
+
+            # Sleep until the poll interval elapses, a slot frees up, or we are asked to stop
+            self._slot_freed.clear()
+            waiters = [asyncio.create_task(self._slot_freed.wait()), asyncio.create_task(self._stopping.wait())]
+            await asyncio.wait(waiters, timeout=settings.JOB_POLL_INTERVAL_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            for w in waiters:
+                w.cancel()
+
+        if self.active:
+            logger.info(f"Worker {self.worker_id} draining {len(self.active)} job(s)...")
+            await asyncio.gather(*self.active.values(), return_exceptions=True)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NeuroAssist background job worker")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY)
+    parser.add_argument("--worker-id", default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    worker = Worker(concurrency=args.concurrency, worker_id=args.worker_id)
+
+    async def _main():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, worker.stop)
+            except NotImplementedError:  # Windows
+                pass
+        await worker.run()
+
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compares two benchmark result files and flags regressions.
+
+    python -m benchmarks.compare benchmarks/results/pipeline-abc123.json benchmarks/results/pipeline-def456.json
+
+Latency metrics (p50/p95/p99, peak RSS) regress when they grow by more
+than --threshold percent; throughput regresses when it drops by more than
+that. Exits 1 if anything regressed.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, Tuple
+
+
+def flatten(result: Dict) -> Iterator[Tuple[str, float, bool]]:
+    """Yields (metric name, value, higher_is_better)."""
+    for level in result.get("levels", []):
+        prefix = f"c={level['concurrency']}"
+        yield f"{prefix} throughput_per_min", level["throughput_per_min"], True
+        for stage, stats in level.get("stages", {}).items():
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                yield f"{prefix} {stage}.{key}", stats[key], False
+    for name, value in result.get("metrics", {}).items():
+        yield name, value, name.endswith(("per_s", "per_min"))
+    if "peak_rss_mb" in result:
+        yield "peak_rss_mb", result["peak_rss_mb"], False
+
+
+def compare(baseline: Dict, candidate: Dict, threshold: float) -> bool:
+    base = {name: (value, higher) for name, value, higher in flatten(baseline)}
+    regressed = False
+    print(f"{'metric':<45}{baseline.get('git_revision', 'base'):>12}{candidate.get('git_revision', 'new'):>12}{'change':>10}")
+    for name, value, higher in flatten(candidate):
+        if name not in base:
+            continue
+        old = base[name][0]
+        change = (value - old) / old * 100 if old else 0.0
+        worse = change < -threshold if higher else change > threshold
+        regressed |= worse
+        marker = "  REGRESSION" if worse else ""
+        print(f"{name:<45}{old:>12.2f}{value:>12.2f}{change:>+9.1f}%{marker}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed change in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    sys.exit(1 if compare(baseline, candidate, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
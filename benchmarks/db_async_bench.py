@@ -0,0 +1,158 @@
+"""
+Sync Session vs AsyncSession inside `async def` routes, on one event loop.
+
+Two routes do the same work, `--queries` round trips per request: one
+with the blocking Session the async handlers used to take from
+get_session, one with get_async_session. Requests are driven in-process
+through the ASGI app (one event loop, like a single uvicorn worker) at
+each concurrency level. A probe task meanwhile sleeps --probe-ms at a
+time and records how late it wakes up: that overshoot is how long the loop
+was stalled by blocking calls.
+
+Each round trip is `SELECT pg_sleep(--query-ms)` on PostgreSQL, so the
+query latency stays the same across runs. On SQLite it is `SELECT 1`, which
+is too fast to show the difference; use it only to check the script runs.
+
+    python -m benchmarks.db_async_bench --database-url postgresql://postgres@localhost/neuroassist
+    python -m benchmarks.db_async_bench --concurrency 1 16 64 --requests 400 --query-ms 5
+"""
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.db import InstrumentedAsyncQueuePool, _engine_options, async_database_url
+from benchmarks.common import peak_rss_mb, summarize, write_result
+
+
+def build_app(database_url: str, queries: int, query_ms: float, pool_size: int) -> FastAPI:
+    options = dict(_engine_options(database_url))
+    async_options = dict(_engine_options(database_url, InstrumentedAsyncQueuePool))
+    if options:
+        # Enough connections for every in-flight request: the loop, not the pool, is measured
+        for opts in (options, async_options):
+            opts.update(pool_size=pool_size, max_overflow=0)
+    sync_engine = create_engine(database_url, **options)
+    async_engine = create_async_engine(async_database_url(database_url), **async_options)
+    if database_url.startswith("postgres"):
+        statement = text("SELECT pg_sleep(:seconds)").bindparams(seconds=query_ms / 1000)
+    else:
+        statement = text("SELECT 1")
+
+    def sync_session():
+        with Session(sync_engine) as session:
+            yield session
+
+    async def async_session():
+        async with AsyncSession(async_engine) as session:
+            yield session
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    async def with_sync_session(session: Session = Depends(sync_session)):
+        for _ in range(queries):
+            session.exec(statement).all()
+        return {"ok": True}
+
+    @app.get("/async")
+    async def with_async_session(session: AsyncSession = Depends(async_session)):
+        for _ in range(queries):
+            (await session.exec(statement)).all()
+        return {"ok": True}
+
+    app.state.engines = (sync_engine, async_engine)
+    return app
+
+
+async def probe_loop_lag(interval_s: float, lags_ms: List[float], stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval_s)
+        lags_ms.append(max(0.0, (time.perf_counter() - started - interval_s) * 1000))
+
+
+async def run_level(client: httpx.AsyncClient, path: str, requests: int, concurrency: int, probe_ms: float) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    lags: List[float] = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(probe_ms / 1000, lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - started
+    stop.set()
+    await probe
+    return {
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(requests / wall, 1),
+        "latency": summarize(latencies),
+        "loop_lag": summarize(lags),
+    }
+
+
+async def main_async(args):
+    database_url = args.database_url or settings.DATABASE_URL
+    app = build_app(database_url, args.queries, args.query_ms, max(args.concurrency))
+    levels = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for path in ("/sync", "/async"):
+                await run_level(client, path, min(args.requests, 20), 4, args.probe_ms)  # Warm up the pool
+            for concurrency in args.concurrency:
+                level = {"concurrency": concurrency, "requests": args.requests}
+                for path in ("/sync", "/async"):
+                    level[path.strip("/")] = await run_level(client, path, args.requests, concurrency, args.probe_ms)
+                levels.append(level)
+                print(f"concurrency={concurrency:>3}  "
+                      f"sync {level['sync']['requests_per_s']:8.1f} req/s (loop lag p95 {level['sync']['loop_lag']['p95_ms']:7.1f}ms)  "
+                      f"async {level['async']['requests_per_s']:8.1f} req/s (loop lag p95 {level['async']['loop_lag']['p95_ms']:7.1f}ms)")
+    finally:
+        sync_engine, async_engine = app.state.engines
+        sync_engine.dispose()
+        await async_engine.dispose()
+
+    path = write_result("db_async", {
+        "config": {
+            "dialect": database_url.split(":", 1)[0],
+            "queries_per_request": args.queries,
+            "query_ms": args.query_ms if database_url.startswith("postgres") else None,
+            "probe_ms": args.probe_ms,
+        },
+        "levels": levels,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.out)
+    print(f"results written to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Database to query (default: DATABASE_URL); PostgreSQL for meaningful numbers")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=400, help="Requests per route per concurrency level")
+    parser.add_argument("--queries", type=int, default=3, help="Round trips per request")
+    parser.add_argument("--query-ms", type=float, default=5.0, help="Server-side latency per query (pg_sleep)")
+    parser.add_argument("--probe-ms", type=float, default=10.0)
+    parser.add_argument("--out", help="Result path (default: benchmarks/results/db_async-<rev>.json)")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
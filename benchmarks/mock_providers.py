@@ -0,0 +1,107 @@
+"""
+Offline stand-ins for AssemblyAI and Gemini with injected latency.
+
+- MockSTTBackend replays TextGrid ground truth (see stt_backends) after a
+  simulated provider delay.
+- mock_generate replaces GeminiService._generate, the single seam every
+  text Gemini call goes through, and returns a canned response per method.
+
+Latencies are (mean seconds, jitter fraction) per stage; jitter is drawn
+from a seeded RNG so runs are comparable.
+"""
+import asyncio
+import json
+import random
+import re
+from typing import Any, Dict, Tuple
+
+from app.services.stt_backends import TextGridReplayBackend
+
+Latency = Tuple[float, float]
+
+DEFAULT_LATENCIES: Dict[str, Latency] = {
+    "transcription": (2.0, 0.3),
+    "refine_transcript_diarization": (1.5, 0.3),
+    "generate_soap_note_async": (3.0, 0.3),
+    "check_drug_interactions_async": (1.0, 0.3),
+    "check_drug_pairs_async": (1.0, 0.3),
+    "generate_clinical_bundle_async": (4.0, 0.3),
+}
+
+CANNED_SOAP = {
+    "soap_note": {
+        "subjective": "58-year-old presenting with two weeks of morning headaches and blurred vision.",
+        "objective": "- Alert and oriented\n- Mild papilledema on fundoscopy",
+        "assessment": "Raised intracranial pressure suspected.\n- Differential: migraine, IIH",
+        "plan": "- MRI Brain\n- Acetazolamide 250mg BID\n- Follow up 1w",
+    },
+    "ui_summary": {"diagnosis": "Suspected raised ICP", "prescription": "Acetazolamide 250mg BID | MRI Brain", "notes": ""},
+    "demographics": {"age": 58, "gender": "Male"},
+    "low_confidence": [],
+    "risk_flags": ["Visual disturbance"],
+}
+
+CANNED_WARNINGS = [
+    {"type": "WARNING", "message": "Monitor electrolytes with concurrent diuretics.", "drug": "Acetazolamide", "severity": "MODERATE"}
+]
+
+
+class MockProviders:
+    def __init__(self, latencies: Dict[str, Latency] = None, seed: int = 7, transcript_dir: str = "test-audio-transcripts"):
+        self.latencies = {**DEFAULT_LATENCIES, **(latencies or {})}
+        self._rng = random.Random(seed)
+        self._replay = TextGridReplayBackend(transcript_dir)
+
+    async def delay(self, stage: str):
+        mean, jitter = self.latencies.get(stage, (0.0, 0.0))
+        if mean > 0:
+            await asyncio.sleep(max(0.0, self._rng.uniform(mean * (1 - jitter), mean * (1 + jitter))))
+
+    # --- STT -------------------------------------------------------------
+
+    def stt_backend(self):
+        providers = self
+
+        class MockSTTBackend:
+            name = "mock"
+            supports_chunking = False
+
+            async def transcribe(self, file_path: str, options: Dict[str, Any]) -> Dict[str, Any]:
+                await providers.delay("transcription")
+                return providers._replay.load(file_path)
+
+        return MockSTTBackend()
+
+    # --- Gemini ----------------------------------------------------------
+
+    def _canned(self, method: str, prompt: str) -> str:
+        if method == "refine_transcript_diarization":
+            # Relabel the raw "Speaker A/B" lines the way the model would
+            lines = [l for l in prompt.splitlines() if l.strip().startswith("Speaker ")]
+            return "\n\n".join(
+                l.strip().replace("Speaker A:", "**Doctor:**").replace("Speaker B:", "**Patient:**") for l in lines
+            )
+        if method == "generate_soap_note_async":
+            return json.dumps(CANNED_SOAP)
+        if method == "check_drug_interactions_async":
+            return json.dumps(CANNED_WARNINGS)
+        if method == "check_drug_pairs_async":
+            pairs = [l for l in prompt.splitlines() if re.match(r"\s*\d+\. \S.* \+ ", l)]
+            return json.dumps([{"pair": n, "warnings": []} for n in range(1, len(pairs) + 1)])
+        if method == "generate_clinical_bundle_async":
+            return json.dumps({
+                **CANNED_SOAP,
+                "transcript": self._canned("refine_transcript_diarization", prompt).replace("**", ""),
+                "interaction_warnings": CANNED_WARNINGS,
+            })
+        return "Mock response."
+
+    def generate(self):
+        providers = self
+
+        async def mock_generate(method: str, model_name: str, prompt: str, generation_config=None, parse=None):
+            await providers.delay(method)
+            text = providers._canned(method, prompt)
+            return (parse or (lambda t: t))(text)
+
+        return mock_generate
@@ -0,0 +1,246 @@
+"""
+End-to-end pipeline benchmark against mock providers.
+
+Drives upload -> transcription -> diarization -> SOAP -> triage -> safety
+through the real consultation_processor code with the STT backend and
+GeminiService._generate replaced by latency-injected stand-ins, on a
+throwaway SQLite database (or --database-url). Records per-stage
+p50/p95/p99, throughput at each concurrency level and peak RSS, and
+writes JSON for benchmarks/compare.py.
+
+    python -m benchmarks.pipeline_bench --consultations 32 --concurrency 1 8 32
+    python -m benchmarks.pipeline_bench --latency generate_soap_note_async=0.5 --bundle
+"""
+import argparse
+import asyncio
+import functools
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Tuple
+from uuid import UUID, uuid4
+
+from rich.console import Console
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.core.config import settings
+from app.models.base import (
+    Appointment, AudioFile, AudioUploaderType, Consultation, PatientProfile, User, UserRole,
+)
+import app.services.consultation_processor as processor
+import app.services.drug_interactions as drug_interactions
+import app.services.medication_normalizer as medication_normalizer
+import app.services.stt_vocabulary as stt_vocabulary
+import app.services.llm_service as llm_service
+import app.services.stt_service as stt_service
+from app.services.llm_cache import MemoryLRUBackend, TieredResponseCache
+from app.services.llm_service import GeminiService
+from app.services.safety_service import SafetyService
+from app.services.stt_service import AssemblyAIService
+from app.services.triage_service import TriageService
+from benchmarks.common import peak_rss_mb, summarize, write_result
+from benchmarks.mock_providers import DEFAULT_LATENCIES, MockProviders
+
+UPLOAD_DIR = "uploads"
+
+TIMED_STAGES = [
+    ("transcription", AssemblyAIService, "transcribe_audio_async"),
+    ("diarization", GeminiService, "refine_transcript_diarization"),
+    ("bundle", GeminiService, "generate_clinical_bundle_async"),
+    ("soap", GeminiService, "generate_soap_note_async"),
+    ("triage", TriageService, "calculate_urgency"),
+    ("safety", SafetyService, "check_drug_interactions"),
+]
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, stage: str, started: float):
+        self.samples[stage].append((time.perf_counter() - started) * 1000)
+
+    def wrap(self, stage: str, fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed_async(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    self.record(stage, started)
+            return timed_async
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, started)
+        return timed
+
+
+@contextmanager
+def patched(targets):
+    """Temporarily replaces (owner, attribute, value) triples."""
+    originals = [(owner, name, owner.__dict__[name] if isinstance(owner, type) else getattr(owner, name)) for owner, name, _ in targets]
+    for owner, name, value in targets:
+        setattr(owner, name, value)
+    try:
+        yield
+    finally:
+        for owner, name, value in originals:
+            setattr(owner, name, value)
+
+
+def recording_ids(transcript_dir: str) -> List[str]:
+    ids = sorted({m.group(1) for f in os.listdir(transcript_dir) if (m := re.match(r"(day\d+_consultation\d+)_", f))})
+    if not ids:
+        raise SystemExit(f"No TextGrid recordings found in {transcript_dir}")
+    return ids
+
+
+def upload(engine, recording: str) -> Tuple[UUID, str]:
+    """Stands in for the upload endpoint: stores a file and creates the rows."""
+    file_name = f"bench_{uuid4().hex[:8]}_{recording}.wav"
+    with open(os.path.join(UPLOAD_DIR, file_name), "wb") as f:
+        f.write(os.urandom(64 * 1024))  # Content is never decoded by the mock STT
+
+    with Session(engine) as session:
+        patient = User(email=f"{uuid4()}@bench.local", password_hash="x", role=UserRole.PATIENT)
+        doctor = User(email=f"{uuid4()}@bench.local", password_hash="x", role=UserRole.DOCTOR)
+        session.add_all([patient, doctor])
+        session.flush()
+        session.add(PatientProfile(user_id=patient.id, first_name="Bench", last_name=recording, current_medications="Furosemide 20mg"))
+        appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, scheduled_at=datetime.utcnow())
+        session.add(appointment)
+        session.flush()
+        consultation = Consultation(appointment_id=appointment.id, patient_id=patient.id, doctor_id=doctor.id)
+        session.add(consultation)
+        session.flush()
+        session.add(AudioFile(
+            consultation_id=consultation.id, file_name=file_name, file_url=os.path.join(UPLOAD_DIR, file_name),
+            uploaded_by=AudioUploaderType.DOCTOR,
+        ))
+        session.commit()
+        return consultation.id, file_name
+
+
+async def run_level(engine, timer: StageTimer, recordings: List[str], consultations: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    uploaded = []
+
+    async def one(index: int):
+        async with semaphore:
+            started = time.perf_counter()
+            consultation_id, file_name = await asyncio.to_thread(upload, engine, recordings[index % len(recordings)])
+            timer.record("upload", started)
+            uploaded.append(file_name)
+            await processor.process_transcription_only(consultation_id)
+            await processor.process_soap_generation(consultation_id)
+            timer.record("end_to_end", started)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(i) for i in range(consultations)))
+    finally:
+        for file_name in uploaded:
+            os.remove(os.path.join(UPLOAD_DIR, file_name))
+    return time.perf_counter() - started
+
+
+def parse_latency(values: List[str]) -> Dict[str, tuple]:
+    latencies = {}
+    for value in values or []:
+        stage, _, spec = value.partition("=")
+        mean, _, jitter = spec.partition(":")
+        latencies[stage] = (float(mean), float(jitter or DEFAULT_LATENCIES.get(stage, (0, 0.3))[1]))
+    return latencies
+
+
+async def main_async(args):
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        # The processor keeps its session open across provider calls; in a
+        # normal SQLite transaction the first write would lock out every other
+        # consultation on the event loop, so run statements in autocommit.
+        engine = create_engine(
+            f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            connect_args={"check_same_thread": False, "timeout": 30},
+            isolation_level="AUTOCOMMIT",
+        )
+    SQLModel.metadata.create_all(engine)
+
+    providers = MockProviders(parse_latency(args.latency), seed=args.seed, transcript_dir=args.transcripts)
+    timer = StageTimer()
+    targets = [(owner, name, staticmethod(timer.wrap(stage, getattr(owner, name)))) for stage, owner, name in TIMED_STAGES]
+    targets += [
+        (GeminiService, "_generate", staticmethod(providers.generate())),
+        (stt_service, "get_stt_backend", lambda name=None: providers.stt_backend()),
+        (processor, "engine", engine),
+        (medication_normalizer, "engine", engine),
+        (stt_vocabulary, "engine", engine),
+        (processor, "console", Console(quiet=True)),
+        (llm_service, "llm_cache", TieredResponseCache([MemoryLRUBackend(4096)], settings.LLM_CACHE_TTLS)),
+        (drug_interactions, "llm_cache", TieredResponseCache([MemoryLRUBackend(4096)], settings.LLM_CACHE_TTLS)),
+        (settings, "TRANSCRIPT_CACHE_ENABLED", False),
+        (settings, "LLM_COMBINED_BUNDLE", args.bundle),
+    ]
+
+    recordings = recording_ids(args.transcripts)
+    levels = []
+    try:
+        with patched(targets):
+            for concurrency in args.concurrency:
+                timer.samples.clear()
+                wall = await run_level(engine, timer, recordings, args.consultations, concurrency)
+                levels.append({
+                    "concurrency": concurrency,
+                    "consultations": args.consultations,
+                    "wall_s": round(wall, 3),
+                    "throughput_per_min": round(args.consultations / wall * 60, 2),
+                    "stages": {stage: summarize(samples) for stage, samples in sorted(timer.samples.items())},
+                })
+                print(f"concurrency={concurrency:>3}  wall={wall:7.2f}s  "
+                      f"throughput={levels[-1]['throughput_per_min']:8.2f}/min  "
+                      f"e2e p95={levels[-1]['stages']['end_to_end']['p95_ms']:.0f}ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    path = write_result("pipeline", {
+        "config": {
+            "bundle": args.bundle,
+            "seed": args.seed,
+            "latencies": {**DEFAULT_LATENCIES, **parse_latency(args.latency)},
+        },
+        "levels": levels,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.out)
+    print(f"peak RSS {peak_rss_mb()} MB; results written to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultations", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--latency", action="append", metavar="STAGE=MEAN[:JITTER]",
+                        help=f"Override injected latency (seconds). Stages: {', '.join(DEFAULT_LATENCIES)}")
+    parser.add_argument("--bundle", action="store_true", help="Use the single-call clinical bundle mode")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--database-url", help="Empty database to run against (default: throwaway SQLite)")
+    parser.add_argument("--transcripts", default=settings.STT_LOCAL_TRANSCRIPT_DIR)
+    parser.add_argument("--out", help="Result path (default: benchmarks/results/pipeline-<rev>.json)")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
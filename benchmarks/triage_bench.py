@@ -0,0 +1,150 @@
+"""
+Keyword triage benchmark: token engine vs the original substring loops.
+
+Scores every TextGrid consultation (as "Doctor:"/"Patient:" lines) with
+TriageService.evaluate_transcript and with the first-match-wins `in` loops
+it replaced, reports per-call p50/p95 and throughput for both, and lists
+the transcripts whose category changed (negation and word boundaries are
+expected to move some).
+
+Two input shapes are timed: whole consultations and single utterances
+(about the size of booking symptoms or a SOAP section). --extra-keywords
+pads every tier with non-matching phrases to show how each approach scales
+with the keyword lists: the loops rescan the text once per keyword, the
+engine tokenizes it once.
+
+    python -m benchmarks.triage_bench --repeat 50
+    python -m benchmarks.triage_bench --extra-keywords 200
+"""
+import argparse
+import time
+from typing import Callable, Dict, List, Tuple
+
+import app.services.triage_service as triage_service
+from app.core.config import settings
+from app.models.base import TriageCategory
+from app.services.stt_backends import TextGridReplayBackend
+from app.services.triage_service import TriageService
+from benchmarks.common import peak_rss_mb, summarize, write_result
+from benchmarks.pipeline_bench import patched, recording_ids
+
+SPEAKERS = {"A": "Doctor", "B": "Patient"}
+
+
+def legacy_evaluate(transcript: str) -> TriageCategory:
+    """The substring loops evaluate_transcript used before the token engine."""
+    transcript_lower = transcript.lower()
+    for keyword in triage_service.CRITICAL_KEYWORDS:
+        if keyword in transcript_lower:
+            return TriageCategory.CRITICAL
+    for keyword in triage_service.HIGH_KEYWORDS:
+        if keyword in transcript_lower:
+            return TriageCategory.HIGH
+    for keyword in triage_service.MODERATE_KEYWORDS:
+        if keyword in transcript_lower:
+            return TriageCategory.MODERATE
+    return TriageCategory.LOW
+
+
+def engine_evaluate(transcript: str) -> TriageCategory:
+    return TriageService.evaluate_transcript(transcript)["triage_status"]
+
+
+def load_corpus(transcript_dir: str) -> List[Tuple[str, str]]:
+    replay = TextGridReplayBackend(transcript_dir)
+    corpus = []
+    for recording in recording_ids(transcript_dir):
+        utterances = replay.load(f"{recording}.wav")["utterances"]
+        text = "\n".join(f"{SPEAKERS.get(u['speaker'], u['speaker'])}: {u['text']}" for u in utterances)
+        corpus.append((recording, text))
+    return corpus
+
+
+def time_engines(engines: Dict[str, Callable[[str], TriageCategory]], corpus: List[Tuple[str, str]], repeat: int):
+    """
+    Per-call timings of each engine over the corpus. Engines take turns
+    round by round, so machine noise (frequency scaling, neighbours) hits
+    them alike instead of skewing whichever ran second.
+    """
+    samples: Dict[str, List[float]] = {name: [] for name in engines}
+    categories: Dict[str, Dict[str, TriageCategory]] = {name: {} for name in engines}
+    for _ in range(repeat):
+        for name, fn in engines.items():
+            for key, text in corpus:
+                started = time.perf_counter()
+                categories[name][key] = fn(text)
+                samples[name].append((time.perf_counter() - started) * 1000)
+    total_chars = sum(len(text) for _, text in corpus) * repeat
+    results = {}
+    for name, values in samples.items():
+        stats = summarize(values)
+        stats["mean_us"] = round(sum(values) / len(values) * 1000, 2)
+        stats["mb_per_s"] = round(total_chars / (sum(values) / 1000) / 1e6, 2)
+        results[name] = stats
+    return results, categories
+
+
+def padded_keywords(extra: int):
+    """(module, name, list) patches adding `extra` phrases that never match to each tier."""
+    return [
+        (triage_service, name, getattr(triage_service, name) + [f"zq{tier}x{i} marker" for i in range(extra)])
+        for tier, name in enumerate(("CRITICAL_KEYWORDS", "HIGH_KEYWORDS", "MODERATE_KEYWORDS"))
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--extra-keywords", type=int, default=0, help="Non-matching phrases added to each tier")
+    parser.add_argument("--transcripts", default=settings.STT_LOCAL_TRANSCRIPT_DIR)
+    parser.add_argument("--out", help="Result path (default: benchmarks/results/triage-<rev>.json)")
+    args = parser.parse_args()
+
+    transcripts = load_corpus(args.transcripts)
+    utterances = [(f"{key}:{n}", line) for key, text in transcripts for n, line in enumerate(text.splitlines())]
+    shapes = {}
+    changed = {}
+    with patched(padded_keywords(args.extra_keywords)):
+        engine_evaluate(transcripts[0][1])  # Build the automaton outside the timed loop
+        for shape, corpus, repeat in (("transcript", transcripts, args.repeat), ("utterance", utterances, max(1, args.repeat // 10))):
+            stats, categories = time_engines({"legacy": legacy_evaluate, "engine": engine_evaluate}, corpus, repeat)
+            legacy, engine = stats["legacy"], stats["engine"]
+            legacy_categories, engine_categories = categories["legacy"], categories["engine"]
+            shapes[shape] = {
+                "texts": len(corpus),
+                "avg_chars": sum(len(text) for _, text in corpus) // len(corpus),
+                "legacy": legacy,
+                "engine": engine,
+                "slowdown": round(engine["mean_us"] / legacy["mean_us"], 2),
+            }
+            if shape == "transcript":
+                changed = {
+                    key: {"legacy": legacy_categories[key].value, "engine": engine_categories[key].value}
+                    for key, _ in corpus if legacy_categories[key] != engine_categories[key]
+                }
+
+    keywords = sum(len(getattr(triage_service, name)) for name in ("CRITICAL_KEYWORDS", "HIGH_KEYWORDS", "MODERATE_KEYWORDS"))
+    print(f"{keywords + 3 * args.extra_keywords} keywords, {args.repeat} rounds")
+    for shape, result in shapes.items():
+        print(f"{shape}: {result['texts']} texts, ~{result['avg_chars']} chars")
+        for name in ("legacy", "engine"):
+            stats = result[name]
+            print(f"  {name:<8} mean={stats['mean_us']:9.1f}us  p95={stats['p95_ms']:.3f}ms  {stats['mb_per_s']:6.2f} MB/s")
+        print(f"  engine/legacy = {result['slowdown']}x")
+    print(f"{len(changed)} of {len(transcripts)} transcripts changed category")
+
+    path = write_result("triage", {
+        "config": {"repeat": args.repeat, "extra_keywords": args.extra_keywords},
+        "shapes": shapes,
+        "changed": changed,
+        "metrics": {
+            f"{shape}.{name}.{key}": result[name][key]
+            for shape, result in shapes.items() for name in ("legacy", "engine") for key in ("p95_ms", "mb_per_s")
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.out)
+    print(f"results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Admin triage queue: single joined query vs the per-row lazy loads it replaced.
+
+Seeds --appointments active appointments (about half with a triaged
+consultation) into a throwaway SQLite database or --database-url, then
+times GET /admin/triage_queue's handler and counts the SQL statements it
+issues. The old handler loaded every active appointment, lazy-loaded each
+one's consultation (one query per row) and sorted in Python. The new one
+issues one ordered, paginated query plus a count, at any queue size.
+
+    python -m benchmarks.triage_queue_bench --appointments 100 1000 10000
+    python -m benchmarks.triage_queue_bench --database-url postgresql://postgres@localhost/bench --limit 50
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+from uuid import uuid4
+
+from fastapi import Response
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.api.v1.admin import get_triage_queue, title_case
+from app.models.base import (
+    Appointment, AppointmentStatus, Consultation, PatientProfile, TriageCategory, User, UserRole,
+)
+from benchmarks.common import peak_rss_mb, summarize, write_result
+
+CATEGORIES = [TriageCategory.CRITICAL, TriageCategory.HIGH, TriageCategory.MODERATE, TriageCategory.LOW]
+
+
+def legacy_triage_queue(session: Session) -> List[Dict]:
+    """The handler before the joined query: per-row consultation loads (the lazy load's query), Python sort."""
+    active_statuses = [AppointmentStatus.SCHEDULED, AppointmentStatus.CHECKED_IN, AppointmentStatus.IN_PROGRESS]
+    results = session.exec(
+        select(Appointment, PatientProfile)
+        .join(PatientProfile, Appointment.patient_id == PatientProfile.user_id)
+        .where(Appointment.status.in_(active_statuses))
+        .order_by(Appointment.scheduled_at.asc())
+    ).all()
+    queue = []
+    for appointment, profile in results:
+        urgency_score, triage_category, triage_reason = 20, TriageCategory.LOW, None
+        consultation = session.exec(select(Consultation).where(Consultation.appointment_id == appointment.id)).first()
+        if consultation:
+            urgency_score = consultation.urgency_score or 20
+            triage_category = consultation.triage_category or TriageCategory.LOW
+            triage_reason = consultation.triage_reason
+        wait_time = max(0, int((datetime.utcnow() - appointment.scheduled_at).total_seconds() / 60))
+        queue.append({
+            "id": str(appointment.id),
+            "name": f"{title_case(profile.first_name)} {title_case(profile.last_name)}",
+            "triageScore": urgency_score,
+            "triageCategory": triage_category.value,
+            "triageReason": triage_reason,
+            "waitTime": wait_time,
+        })
+    priority = {c.value: i for i, c in enumerate(CATEGORIES)}
+    queue.sort(key=lambda x: (priority.get(x["triageCategory"], 4), -x["waitTime"]))
+    return queue
+
+
+def seed(engine, doctor_id, start: int, stop: int, rng: random.Random):
+    """Adds active appointments start..stop-1, about half with a triaged consultation."""
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        for i in range(start, stop):
+            patient = User(id=uuid4(), email=f"p{i}-{uuid4().hex[:8]}@bench.local", password_hash="x", role=UserRole.PATIENT)
+            appointment = Appointment(
+                id=uuid4(), patient_id=patient.id, doctor_id=doctor_id, doctor_name="Dr Bench",
+                scheduled_at=now + timedelta(minutes=rng.randint(-240, 240)),
+                status=rng.choice([AppointmentStatus.SCHEDULED, AppointmentStatus.CHECKED_IN, AppointmentStatus.IN_PROGRESS]),
+            )
+            session.add(patient)
+            session.add(PatientProfile(user_id=patient.id, first_name=f"patient{i}", last_name="bench"))
+            session.add(appointment)
+            if rng.random() < 0.5:
+                session.add(Consultation(
+                    appointment_id=appointment.id, patient_id=patient.id, doctor_id=doctor_id,
+                    urgency_score=rng.randint(10, 100), triage_category=rng.choice(CATEGORIES), triage_reason="bench",
+                ))
+            if i % 1000 == 999:
+                session.commit()
+        session.commit()
+
+
+def measure(engine, fn: Callable[[Session], List[Dict]], repeat: int) -> Dict:
+    statements = []
+    listener = lambda *args: statements.append(1)
+    timings = []
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        for _ in range(repeat):
+            statements.clear()
+            started = time.perf_counter()
+            with Session(engine) as session:
+                rows = fn(session)
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return {"queries": len(statements), "rows": len(rows), **summarize(timings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--appointments", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--limit", type=int, default=200, help="Page size requested from the new handler")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-legacy-above", type=int, default=10000, help="Skip the N+1 handler above this size")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--database-url", help="Empty database to run against (default: throwaway SQLite); rows are added, never removed")
+    parser.add_argument("--out", help="Result path (default: benchmarks/results/triage_queue-<rev>.json)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="triage-queue-bench-")
+    engine = create_engine(args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    SQLModel.metadata.create_all(engine)
+    current_user = User(email="frontdesk@bench.local", password_hash="x", role=UserRole.FRONT_DESK)
+
+    def joined(session):
+        return get_triage_queue(Response(), limit=args.limit, offset=0, session=session, current_user=current_user)
+
+    with Session(engine, expire_on_commit=False) as session:
+        doctor = User(email=f"doctor-{uuid4().hex[:8]}@bench.local", password_hash="x", role=UserRole.DOCTOR)
+        session.add(doctor)
+        session.commit()
+
+    rng = random.Random(args.seed)
+    seeded = 0
+    levels = []
+    try:
+        # The queue grows between levels; sizes are cumulative
+        for size in sorted(args.appointments):
+            seed(engine, doctor.id, seeded, size, rng)
+            seeded = size
+            level = {"appointments": size, "joined": measure(engine, joined, args.repeat)}
+            if size <= args.skip_legacy_above:
+                level["legacy"] = measure(engine, legacy_triage_queue, max(1, args.repeat // 2))
+            levels.append(level)
+            line = f"appointments={size:>6}  joined: {level['joined']['queries']} queries, p50 {level['joined']['p50_ms']:8.1f}ms"
+            if "legacy" in level:
+                line += f"   legacy: {level['legacy']['queries']} queries, p50 {level['legacy']['p50_ms']:8.1f}ms"
+            print(line)
+    finally:
+        engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    path = write_result("triage_queue", {
+        "config": {"limit": args.limit, "repeat": args.repeat, "dialect": engine.dialect.name},
+        "levels": levels,
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.out)
+    print(f"results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+from sqlmodel import SQLModel
+from app.core.db import engine
+from app.models.base import ProcessingJob  # Essential for metadata registration
+
+def create_job_table():
+    print("Creating processing_jobs table...")
+    SQLModel.metadata.create_all(engine, tables=[ProcessingJob.__table__])
+    print("Done.")
+
+if __name__ == "__main__":
+    create_job_table()
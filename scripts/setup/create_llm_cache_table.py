@@ -0,0 +1,11 @@
+from sqlmodel import SQLModel
+from app.core.db import engine
+from app.models.base import LLMCacheEntry  # Essential for metadata registration
+
+def create_llm_cache_table():
+    print("Creating llm_response_cache table...")
+    SQLModel.metadata.create_all(engine, tables=[LLMCacheEntry.__table__])
+    print("Done.")
+
+if __name__ == "__main__":
+    create_llm_cache_table()
@@ -0,0 +1,11 @@
+from sqlmodel import SQLModel
+from app.core.db import engine
+from app.models.base import RateLimitBucket  # Essential for metadata registration
+
+def create_rate_limit_table():
+    print("Creating rate_limit_buckets table...")
+    SQLModel.metadata.create_all(engine, tables=[RateLimitBucket.__table__])
+    print("Done.")
+
+if __name__ == "__main__":
+    create_rate_limit_table()
@@ -0,0 +1,17 @@
+from sqlalchemy import text
+from sqlmodel import Session
+from app.core.db import engine
+
+def migrate_audio_file_hash():
+    print("Adding audio_files.content_sha256...")
+    with Session(engine) as session:
+        try:
+            session.connection().execute(text("ALTER TABLE audio_files ADD COLUMN content_sha256 VARCHAR"))
+            session.commit()
+            print("✅ Added content_sha256")
+        except Exception as e:
+            session.rollback() # Important for Postgres transaction state
+            print(f"⚠️ Could not add content_sha256 (might exist): {e}")
+
+if __name__ == "__main__":
+    migrate_audio_file_hash()
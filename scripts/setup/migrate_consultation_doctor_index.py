@@ -0,0 +1,20 @@
+from sqlalchemy import text
+from sqlmodel import Session
+from app.core.db import engine
+
+def migrate_consultation_doctor_index():
+    print("Adding index consultations(doctor_id, patient_id, created_at)...")
+    with Session(engine) as session:
+        try:
+            session.connection().execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_consultations_doctor_patient_created "
+                "ON consultations (doctor_id, patient_id, created_at)"
+            ))
+            session.commit()
+            print("✅ Added ix_consultations_doctor_patient_created")
+        except Exception as e:
+            session.rollback() # Important for Postgres transaction state
+            print(f"⚠️ Could not add ix_consultations_doctor_patient_created: {e}")
+
+if __name__ == "__main__":
+    migrate_consultation_doctor_index()
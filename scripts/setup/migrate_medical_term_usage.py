@@ -0,0 +1,17 @@
+from sqlalchemy import text
+from sqlmodel import Session
+from app.core.db import engine
+
+def migrate_medical_term_usage():
+    print("Adding medical_terms.usage_count...")
+    with Session(engine) as session:
+        try:
+            session.connection().execute(text("ALTER TABLE medical_terms ADD COLUMN usage_count INTEGER NOT NULL DEFAULT 0"))
+            session.commit()
+            print("✅ Added usage_count")
+        except Exception as e:
+            session.rollback() # Important for Postgres transaction state
+            print(f"⚠️ Could not add usage_count (might exist): {e}")
+
+if __name__ == "__main__":
+    migrate_medical_term_usage()
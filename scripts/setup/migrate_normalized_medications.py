@@ -0,0 +1,33 @@
+from sqlalchemy import text
+from sqlmodel import Session, select
+from app.core.db import engine
+from app.models.base import PatientProfile, SOAPNote
+from app.services.medication_normalizer import normalize_medications
+
+def migrate_normalized_medications():
+    print("Adding normalized medication columns...")
+    with Session(engine) as session:
+        for table, column in [("patient_profiles", "normalized_medications"), ("soap_notes", "plan_medications")]:
+            try:
+                session.connection().execute(text(f"ALTER TABLE {table} ADD COLUMN {column} JSON"))
+                session.commit()
+                print(f"✅ Added {table}.{column}")
+            except Exception as e:
+                session.rollback() # Important for Postgres transaction state
+                print(f"⚠️ Could not add {table}.{column} (might exist): {e}")
+
+        # Backfill; safe to re-run after large vocabulary changes
+        profiles = session.exec(select(PatientProfile).where(PatientProfile.current_medications != None)).all()
+        for profile in profiles:
+            profile.normalized_medications = normalize_medications(profile.current_medications)
+            session.add(profile)
+        notes = session.exec(select(SOAPNote).where(SOAPNote.soap_json != None)).all()
+        for note in notes:
+            soap_content = (note.soap_json or {}).get("soap_note") or {}
+            note.plan_medications = normalize_medications(soap_content.get("plan"))
+            session.add(note)
+        session.commit()
+        print(f"Normalized {len(profiles)} medication lists and {len(notes)} SOAP plans.")
+
+if __name__ == "__main__":
+    migrate_normalized_medications()
@@ -0,0 +1,109 @@
+import os
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session, select
+
+from app.api.deps import get_current_user
+from app.core.db import async_database_url, engine
+from app.main import app
+from app.models.base import (
+    Appointment, AudioFile, AudioFileType, AudioUploaderType, Consultation, DocumentType, PatientProfile, ProcessingJob,
+    SOAPNote, User, UserRole,
+)
+from app.services.llm_service import GeminiService
+
+pytest.importorskip("aiosqlite")
+
+
+def test_async_url_uses_the_asyncio_driver():
+    assert async_database_url("postgresql://u:p@db/na") == "postgresql+asyncpg://u:p@db/na"
+    assert async_database_url("postgresql+psycopg2://u@db/na?x=1") == "postgresql+asyncpg://u@db/na?x=1"
+    assert async_database_url("sqlite:////tmp/na.db") == "sqlite+aiosqlite:////tmp/na.db"
+    with pytest.raises(ValueError):
+        async_database_url("mysql://u@db/na")
+
+
+@pytest.fixture
+def consultation_id():
+    with Session(engine) as session:
+        patient = User(email=f"async-p-{datetime.utcnow().timestamp()}@example.com", password_hash="x", role=UserRole.PATIENT)
+        doctor = User(email=f"async-d-{datetime.utcnow().timestamp()}@example.com", password_hash="x", role=UserRole.DOCTOR)
+        session.add_all([patient, doctor])
+        session.flush()
+        session.add(PatientProfile(user_id=patient.id, first_name="Ann", last_name="Lee"))
+        appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, scheduled_at=datetime.utcnow())
+        session.add(appointment)
+        session.flush()
+        consultation = Consultation(appointment_id=appointment.id, patient_id=patient.id, doctor_id=doctor.id)
+        session.add(consultation)
+        session.flush()
+        session.add(SOAPNote(consultation_id=consultation.id, soap_json={"assessment": "Migraine", "plan": "Rest"}))
+        session.add(AudioFile(
+            consultation_id=consultation.id, uploaded_by=AudioUploaderType.PATIENT, file_type=AudioFileType.PRE_VISIT,
+            file_name="intake.wav", file_url="uploads/intake.wav", transcription="Patient: headaches for a week",
+        ))
+        session.commit()
+        return consultation.id
+
+
+def test_async_routes_read_through_the_async_session(client, consultation_id, monkeypatch):
+    calls = []
+
+    async def fake_document(document_type, soap, patient_context):
+        calls.append((document_type, soap["assessment"], patient_context["first_name"]))
+        return "Certificate"
+
+    async def fake_summary(transcript):
+        calls.append(("summary", transcript))
+        return "Headache, 1 week"
+
+    monkeypatch.setattr(GeminiService, "generate_clinical_document", fake_document)
+    monkeypatch.setattr(GeminiService, "generate_intake_summary", fake_summary)
+    app.dependency_overrides[get_current_user] = lambda: User(email="d@example.com", password_hash="x", role=UserRole.DOCTOR)
+    try:
+        response = client.post(f"/api/v1/consultations/{consultation_id}/generate-document", json={"document_type": "medical_certificate"})
+        assert response.status_code == 200 and response.json() == {"content": "Certificate"}
+
+        response = client.get(f"/api/v1/consultations/{consultation_id}/intake_summary")
+        assert response.json() == {"summary": "Headache, 1 week", "full_transcript": "Patient: headaches for a week"}
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+    assert calls == [("medical_certificate", "Migraine", "Ann"), ("summary", "Patient: headaches for a week")]
+
+
+def test_job_and_document_routes_use_the_async_session(client, consultation_id, monkeypatch, tmp_path):
+    from app.api.v1 import consultations
+
+    async def fake_digitization(file_path):
+        return {"medications": [], "source": os.path.basename(file_path)}
+
+    monkeypatch.setattr(consultations, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(GeminiService, "generate_prescription_digitization", fake_digitization, raising=False)
+    with Session(engine) as session:
+        session.add(AudioFile(
+            consultation_id=consultation_id, uploaded_by=AudioUploaderType.DOCTOR, file_type=AudioFileType.CONSULTATION,
+            file_name="visit.wav", file_url="uploads/visit.wav",
+        ))
+        session.commit()
+    app.dependency_overrides[get_current_user] = lambda: User(email="d@example.com", password_hash="x", role=UserRole.DOCTOR)
+    try:
+        response = client.post(f"/api/v1/consultations/{consultation_id}/reprocess_audio")
+        assert response.status_code == 200 and response.json()["job_id"]
+        response = client.post(f"/api/v1/consultations/{consultation_id}/generate_soap")
+        assert response.status_code == 200 and response.json()["job_id"]
+
+        response = client.post(
+            f"/api/v1/consultations/{consultation_id}/upload-document",
+            files={"file": ("rx.jpg", b"\xff\xd8image")}, data={"document_type": DocumentType.PRESCRIPTION.value},
+        )
+        document_id = response.json()["document_id"]
+        response = client.post(f"/api/v1/consultations/{consultation_id}/analyze-document", data={"document_id": document_id})
+        assert response.json() == {"medications": [], "source": f"doc_{document_id}.jpg"}
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+    with Session(engine) as session:
+        assert session.get(Consultation, consultation_id).status == "IN_PROGRESS"
+        jobs = session.exec(select(ProcessingJob.job_type).where(ProcessingJob.consultation_id == consultation_id)).all()
+        assert sorted(job.value for job in jobs) == ["SOAP_GENERATION", "TRANSCRIPTION"]
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.services.audio_chunker import merge_chunk_results, plan_chunks, transcribe_chunked
+
+# 10 minutes of alternating turns: 20s of speech, then 2s of silence
+SCRIPT = []
+t = 0
+for i in range(27):
+    SCRIPT.append({"speaker": "AB"[i % 2], "text": f"turn {i}", "start": t * 1000, "end": (t + 20) * 1000})
+    t += 22
+DURATION = t
+SILENCES = [(u["end"] / 1000, u["end"] / 1000 + 2) for u in SCRIPT]
+
+
+def test_plan_cuts_at_silences_near_target():
+    plan = plan_chunks(DURATION, SILENCES, target_seconds=120)
+    assert plan[0][0] == 0 and plan[-1][1] == DURATION
+    for (_, end), (start, _) in zip(plan, plan[1:]):
+        assert end == start
+        assert any(s <= end <= e for s, e in SILENCES)
+    assert all(90 <= end - start <= 180 for start, end in plan)
+
+
+def test_short_audio_is_one_chunk():
+    assert plan_chunks(100, [], target_seconds=120) == [(0.0, 100)]
+
+
+def test_merge_drops_overlap_duplicates_and_offsets_timestamps():
+    first = {"offset": 0, "region": (0, 10), "result": {"utterances": [
+        {"speaker": "A", "text": "one", "start": 0, "end": 4000},
+        {"speaker": "B", "text": "two", "start": 8000, "end": 12000},  # Midpoint in 2nd region
+    ]}}
+    second = {"offset": 7, "region": (10, 20), "result": {"utterances": [
+        {"speaker": "A", "text": "two", "start": 1000, "end": 5000},
+        {"speaker": "B", "text": "three", "start": 6000, "end": 9000},
+    ]}}
+    merged = merge_chunk_results([first, second])
+    assert [u["text"] for u in merged["utterances"]] == ["one", "two", "three"]
+    assert [u["speaker"] for u in merged["utterances"]] == ["A", "B", "A"]
+    assert merged["utterances"][1]["start"] == 8000
+
+
+@pytest.mark.asyncio
+async def test_chunked_transcription_with_local_stand_in():
+    running = 0
+    peak = 0
+
+    async def extract(path, start, end, out_path):
+        with open(out_path, "w") as f:
+            f.write(f"{start},{end}")
+
+    async def transcribe(chunk_path):
+        nonlocal running, peak
+        start, end = (float(x) * 1000 for x in open(chunk_path).read().split(","))
+        index = int(chunk_path[-7:-4])
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        # Every other chunk comes back with the diarization labels swapped
+        swap = {"A": "B", "B": "A"} if index % 2 else {}
+        return {"confidence": 0.9, "id": f"t{index}", "utterances": [
+            {"speaker": swap.get(u["speaker"], u["speaker"]), "text": u["text"],
+             "start": max(u["start"], start) - start, "end": min(u["end"], end) - start}
+            for u in SCRIPT if u["end"] > start and u["start"] < end
+        ]}
+
+    async def analyze(path):
+        return DURATION, SILENCES
+
+    result = await transcribe_chunked(
+        "consultation.mp3", transcribe, target_seconds=120, overlap_seconds=5, concurrency=3,
+        analyze_fn=analyze, extract_fn=extract,
+    )
+
+    assert [u["text"] for u in result["utterances"]] == [u["text"] for u in SCRIPT]
+    assert [u["speaker"] for u in result["utterances"]] == [u["speaker"] for u in SCRIPT]
+    assert result["utterances"][-1]["start"] == SCRIPT[-1]["start"]
+    assert peak == 3
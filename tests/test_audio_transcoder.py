@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.models.base import AudioFile, AudioFileType, AudioUploaderType
+from app.services import audio_transcoder, consultation_processor
+from app.services.audio_transcoder import TranscodeError, needs_transcode, transcode_to_mp3
+
+
+def _fake_ffmpeg(script):
+    """Stands in for ffmpeg: a python process given (src, dst) as argv."""
+    return lambda src, dst: [sys.executable, "-c", script, src, dst]
+
+
+COPY = "import shutil, sys; shutil.copyfile(sys.argv[1], sys.argv[2])"
+
+
+@pytest.mark.asyncio
+async def test_transcode_runs_off_loop_with_timeout_and_cleanup(tmp_path, monkeypatch):
+    src = tmp_path / "visit.webm"
+    src.write_bytes(b"webm-bytes")
+    dst = str(tmp_path / "visit.mp3")
+
+    monkeypatch.setattr(audio_transcoder, "_ffmpeg_command", _fake_ffmpeg(COPY))
+    assert await transcode_to_mp3(str(src), dst) == dst
+    assert open(dst, "rb").read() == b"webm-bytes"
+
+    monkeypatch.setattr(audio_transcoder, "_ffmpeg_command", _fake_ffmpeg("import sys; sys.exit('bad codec')"))
+    with pytest.raises(TranscodeError, match="bad codec"):
+        await transcode_to_mp3(str(src), str(tmp_path / "bad.mp3"))
+
+    monkeypatch.setattr(audio_transcoder, "_ffmpeg_command", _fake_ffmpeg(
+        "import sys, time; open(sys.argv[2], 'wb').write(b'half'); time.sleep(30)"
+    ))
+    started = time.perf_counter()
+    with pytest.raises(TranscodeError, match="timed out"):
+        await transcode_to_mp3(str(src), str(tmp_path / "slow.mp3"), timeout=0.5)
+    assert time.perf_counter() - started < 5
+    assert sorted(os.listdir(tmp_path)) == ["visit.mp3", "visit.webm"]
+
+    assert needs_transcode("a.WEBM") and needs_transcode("a.m4a")
+    assert not needs_transcode("a.mp3") and not needs_transcode("a.Wav")
+
+
+@pytest.mark.asyncio
+async def test_transcode_job_swaps_in_the_mp3_and_hands_off_to_transcription(tmp_path, monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(consultation_processor, "engine", engine)
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("media")  # Wherever the upload was stored; the MP3 goes next to it
+    with open(os.path.join("media", "PAT_DOC_visit.webm"), "wb") as f:
+        f.write(b"webm-bytes")
+
+    audio = AudioFile(
+        consultation_id=uuid4(), uploaded_by=AudioUploaderType.DOCTOR, file_type=AudioFileType.CONSULTATION,
+        file_name="PAT_DOC_visit.webm", file_url=os.path.join("media", "PAT_DOC_visit.webm"), content_sha256="abc",
+    )
+    with Session(engine) as session:
+        session.add(audio)
+        session.commit()
+        audio_id, consultation_id = audio.id, audio.consultation_id
+
+    transcribed = []
+
+    async def fake_transcription(cid, aid):
+        with Session(engine) as session:
+            transcribed.append((cid, session.get(AudioFile, aid).file_name))
+
+    monkeypatch.setattr(consultation_processor, "process_transcription_only", fake_transcription)
+    monkeypatch.setattr(audio_transcoder, "_ffmpeg_command", _fake_ffmpeg(COPY))
+    await consultation_processor.process_transcode(consultation_id, audio_id)
+
+    assert transcribed == [(consultation_id, "PAT_DOC_visit.mp3")]
+    with Session(engine) as session:
+        stored = session.get(AudioFile, audio_id)
+        assert (stored.file_url, stored.content_sha256) == (os.path.join("media", "PAT_DOC_visit.mp3"), None)
+    assert os.path.exists(os.path.join("media", "PAT_DOC_visit.mp3"))
+
+    # A failed conversion still transcribes, using the original upload
+    with Session(engine) as session:
+        stored = session.get(AudioFile, audio_id)
+        stored.file_name = "PAT_DOC_visit.webm"
+        stored.file_url = os.path.join("media", "PAT_DOC_visit.webm")
+        session.add(stored)
+        session.commit()
+    monkeypatch.setattr(audio_transcoder, "_ffmpeg_command", _fake_ffmpeg("import sys; sys.exit(1)"))
+    await consultation_processor.process_transcode(consultation_id, audio_id)
+    assert transcribed[-1] == (consultation_id, "PAT_DOC_visit.webm")
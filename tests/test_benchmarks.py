@@ -0,0 +1,21 @@
+from benchmarks.common import percentile, summarize
+from benchmarks.compare import compare
+
+
+def test_percentiles_use_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert summarize([])["p95_ms"] == 0.0
+
+
+def _result(p95, throughput):
+    return {"levels": [{"concurrency": 4, "throughput_per_min": throughput,
+                        "stages": {"soap": {"p50_ms": 10, "p95_ms": p95, "p99_ms": p95}}}]}
+
+
+def test_compare_flags_latency_and_throughput_regressions():
+    assert not compare(_result(100, 60), _result(105, 58), threshold=10)
+    assert compare(_result(100, 60), _result(130, 60), threshold=10)
+    assert compare(_result(100, 60), _result(100, 40), threshold=10)
@@ -0,0 +1,78 @@
+import json
+import pytest
+
+from app.schemas.clinical_bundle import ClinicalBundle
+from app.services.llm_cache import MemoryLRUBackend, TieredResponseCache
+from app.services.llm_service import GeminiService
+import app.services.llm_service as llm_service
+import app.services.llm_runtime as llm_runtime
+
+BUNDLE = {
+    "transcript": "Doctor: Any headaches?\nPatient: Every morning.",
+    "soap_note": {"subjective": "Morning headaches.", "objective": "-", "assessment": "Migraine", "plan": "- Sumatriptan 50mg PRN"},
+    "ui_summary": {"diagnosis": "Migraine", "prescription": "Sumatriptan 50mg PRN", "notes": ""},
+    "demographics": {"age": 40},
+    "risk_flags": [],
+    "interaction_warnings": [{"type": "WARNING", "message": "Serotonin syndrome risk", "drug": "Sumatriptan", "severity": "MODERATE"}],
+}
+UTTERANCES = [{"speaker": "A", "text": "Any headaches? Every morning."}]
+
+
+def _fake_model(monkeypatch, text):
+    class FakeModel:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def generate_content(self, prompt):
+            return type("Response", (), {"text": text})()
+
+    monkeypatch.setattr(llm_runtime.genai, "GenerativeModel", FakeModel)
+    llm_runtime.model_registry.clear()
+    ttls = {"generate_clinical_bundle_async": 60, "clinical_bundle": 60}
+    monkeypatch.setattr(llm_service, "llm_cache", TieredResponseCache([MemoryLRUBackend(10)], ttls))
+
+
+def test_bundle_splits_into_legacy_shapes():
+    bundle = ClinicalBundle.model_validate(BUNDLE)
+    assert set(bundle.soap_data()) == {"soap_note", "ui_summary", "demographics", "low_confidence", "risk_flags"}
+    assert bundle.soap_data()["soap_note"]["plan"] == "- Sumatriptan 50mg PRN"
+    assert bundle.warnings()[0]["drug"] == "Sumatriptan"
+
+
+@pytest.mark.asyncio
+async def test_bundle_is_stashed_by_transcript(monkeypatch):
+    _fake_model(monkeypatch, json.dumps(BUNDLE))
+    bundle = await GeminiService.generate_clinical_bundle_async(UTTERANCES)
+    await GeminiService.stash_clinical_bundle(bundle)
+
+    assert await GeminiService.get_stashed_clinical_bundle(BUNDLE["transcript"]) == bundle
+    # An edited transcript must not reuse the stale bundle
+    assert await GeminiService.get_stashed_clinical_bundle(BUNDLE["transcript"] + " Edited.") is None
+
+
+@pytest.mark.asyncio
+async def test_invalid_bundle_raises_and_is_not_cached(monkeypatch):
+    _fake_model(monkeypatch, json.dumps({"transcript": "Doctor: hi"}))
+    with pytest.raises(Exception):
+        await GeminiService.generate_clinical_bundle_async(UTTERANCES)
+    assert llm_service.llm_cache.stats()["misses"] == 1
+    assert llm_service.llm_cache.backends[0]._entries == {}
+
+
+def test_bundle_mode_needs_the_response_cache(monkeypatch):
+    monkeypatch.setattr(llm_service.settings, "LLM_COMBINED_BUNDLE", True)
+    monkeypatch.setattr(llm_service, "llm_cache", TieredResponseCache([], {"clinical_bundle": 60}))
+    assert not GeminiService.clinical_bundle_enabled()
+    monkeypatch.setattr(llm_service, "llm_cache", TieredResponseCache([MemoryLRUBackend(10)], {"clinical_bundle": 60}))
+    assert GeminiService.clinical_bundle_enabled()
+
+
+def test_bundle_warnings_are_dropped_when_medications_changed():
+    from app.models.base import PatientProfile
+    from app.services.consultation_processor import _bundle_warnings
+
+    profile = PatientProfile(user_id=None, first_name="A", last_name="B", current_medications="Sertraline 50mg")
+    bundle = ClinicalBundle.model_validate({**BUNDLE, "checked_medications": "Sertraline 50mg"})
+    assert _bundle_warnings(bundle, profile)[0]["drug"] == "Sumatriptan"
+    profile.current_medications = "Sertraline 50mg, Tramadol 50mg"
+    assert _bundle_warnings(bundle, profile) is None
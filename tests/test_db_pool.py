@@ -0,0 +1,90 @@
+import asyncio
+import logging
+
+import pytest
+from sqlalchemy import exc as sa_exc, text
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine
+
+from app.core import db
+from app.core.db import InstrumentedQueuePool, pool_metrics, warn_if_session_held
+from app.services.rate_limiter import ProviderLimiter
+
+
+def test_pool_records_checkout_waits_and_timeouts(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool,
+        pool_size=1, max_overflow=0, pool_timeout=0.1,
+    )
+    before = pool_metrics.stats()
+    with engine.connect():
+        with pytest.raises(sa_exc.TimeoutError):
+            engine.connect()
+    with engine.connect():
+        pass
+
+    after = pool_metrics.stats()
+    assert after["checkouts"] - before["checkouts"] == 2
+    assert after["timeouts"] - before["timeouts"] == 1
+    assert engine.pool.checkedout() == 0
+
+    # SQLite keeps SQLAlchemy's default pool; other URLs get the tuned one
+    assert db._engine_options("sqlite:///x.db") == {}
+    assert db._engine_options("postgresql://u@h/db")["poolclass"] is InstrumentedQueuePool
+
+
+def _select_one(engine):
+    with Session(engine) as session:
+        session.exec(text("SELECT 1")).all()
+
+
+@pytest.mark.asyncio
+async def test_sessions_held_across_external_calls_are_reported(caplog):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    limiter = ProviderLimiter("gemini:test", 1)
+    held_before = pool_metrics.held_across_external_calls
+
+    async def job():
+        db.track_held_sessions()
+        with Session(engine) as session:
+            session.exec(text("SELECT 1"))
+            async with limiter.slot():  # Connection still checked out: warn
+                pass
+            session.commit()
+            async with limiter.slot():  # Released by the commit
+                pass
+        # A session opened and closed in a worker thread leaves nothing held
+        await asyncio.to_thread(_select_one, engine)
+        return warn_if_session_held("after")
+
+    async def other_job():
+        db.track_held_sessions()
+        await asyncio.sleep(0.01)
+        return warn_if_session_held("other")
+
+    with caplog.at_level(logging.WARNING, logger="app.core.db"):
+        # Each task tracks its own sessions
+        assert await asyncio.gather(job(), other_job()) == [False, False]
+    assert pool_metrics.held_across_external_calls - held_before == 1
+    assert [r.getMessage().split(" (")[0] for r in caplog.records] == ["DB session held across external call to gemini:test"]
+
+
+@pytest.mark.asyncio
+async def test_held_sessions_are_scoped_to_the_job_task():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    async def job():
+        db.track_held_sessions()
+        session = Session(engine)
+        # The transaction begins in a worker thread but is recorded on the job's scope
+        await asyncio.to_thread(session.exec, text("SELECT 1"))
+        held = warn_if_session_held("gemini:test")
+        session.close()
+        return held, warn_if_session_held("gemini:test")
+
+    async def unscoped():
+        with Session(engine) as session:
+            session.exec(text("SELECT 1"))
+            return warn_if_session_held("gemini:test")
+
+    assert await asyncio.gather(job(), unscoped()) == [(True, False), False]
@@ -0,0 +1,138 @@
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.models.base import MedicalTerm, MedicalTermCategory, PatientProfile, SOAPNote
+from app.services import drug_interactions, medication_normalizer
+from app.services.llm_cache import MemoryLRUBackend, TieredResponseCache
+from app.services.drug_interactions import SAFE, get_interaction_index
+from app.services.medication_normalizer import MedicationNormalizer, _VocabularyCache
+from app.services.safety_service import SafetyService
+
+
+@pytest.fixture
+def vocabulary(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(MedicalTerm(term="Apixaban", category=MedicalTermCategory.MEDICATION))
+        session.add(MedicalTerm(term="Migraine", category=MedicalTermCategory.DISEASE))
+        session.commit()
+    monkeypatch.setattr(medication_normalizer, "engine", engine)
+    cache = _VocabularyCache()
+    monkeypatch.setattr(medication_normalizer, "medication_vocabulary", cache)
+    monkeypatch.setattr("app.services.safety_service.medication_vocabulary", cache)
+    monkeypatch.setattr(drug_interactions, "llm_cache", TieredResponseCache([MemoryLRUBackend(64)], {"drug_pair": 3600}))
+    return cache
+
+
+def _check(plan, current_meds):
+    note = SOAPNote(soap_json={"soap_note": {"plan": plan}})
+    profile = PatientProfile(first_name="A", last_name="B", current_medications=current_meds)
+    return SafetyService.check_drug_interactions(note, profile)
+
+
+def test_index_resolves_aliases_classes_and_safe_pairs():
+    index = get_interaction_index()
+    interaction = index.lookup("Epilim", "Lamictal")
+    assert interaction.severity == "HIGH" and "lamotrigine" in interaction.message
+    # Class-level entry: any triptan with any SSRI
+    assert index.lookup("rizatriptan", "escitalopram").type == "WARNING"
+    assert index.lookup("Keppra", "sodium valproate") is SAFE
+    assert index.lookup("levetiracetam", "apixaban") is None
+
+
+def test_extractor_matches_whole_names_and_dosed_unknowns():
+    extractor = MedicationNormalizer({"valproate": "valproate", "sodium valproate": "valproate", "keppra": "levetiracetam"})
+    text = "Switch Keppra to sodium valproate 500mg BD; add Brivaracetam 50 mg. Take 2 tablets."
+    assert extractor.extract(text) == ["levetiracetam", "valproate", "brivaracetam"]
+    assert extractor.extract("valproates and Keppras") == []
+
+
+def test_extractor_includes_medical_term_medications(vocabulary):
+    extractor = vocabulary.get()
+    assert extractor.extract("Start apixaban, history of migraine") == ["apixaban"]
+    vocabulary.invalidate()
+    assert vocabulary.stale()
+
+
+@pytest.mark.asyncio
+async def test_known_pairs_skip_the_model(vocabulary, monkeypatch):
+    async def no_model(*args):
+        raise AssertionError("model must not be called")
+    monkeypatch.setattr(SafetyService.__module__ + ".GeminiService.check_drug_interactions_async", no_model)
+
+    warnings = await _check("- MRI Brain\n- Acetazolamide 250mg BID", "Furosemide 20mg OD")
+    assert [(w["drug"], w["interacts_with"], w["severity"]) for w in warnings] == [("Acetazolamide", "Furosemide", "MODERATE")]
+    assert await _check("Continue Keppra 500mg BD, add sodium valproate", "Levetiracetam 500mg") == []
+    assert await _check("Follow up in 6 weeks, MRI brain", "Warfarin") == []
+
+
+@pytest.mark.asyncio
+async def test_unknown_pairs_are_asked_once_and_memoized_per_pair(vocabulary, monkeypatch):
+    calls = []
+
+    async def model(pairs):
+        calls.append(pairs)
+        return {
+            pair: [{"type": "WARNING", "message": "Bleeding risk", "drug": "Apixaban", "severity": "HIGH"}] if "apixaban" in pair else []
+            for pair in pairs
+        }
+    monkeypatch.setattr(SafetyService.__module__ + ".GeminiService.check_drug_pairs_async", model)
+
+    warnings = await _check("Start Apixaban 5mg BD and Lamictal 25mg", "Epilim 500mg, Keppra 1g")
+    # lamotrigine + valproate and lamotrigine + levetiracetam come from the index
+    assert calls == [[("apixaban", "valproate"), ("apixaban", "levetiracetam"), ("apixaban", "lamotrigine")]]
+    assert [w["drug"] for w in warnings] == ["Lamotrigine", "Apixaban", "Apixaban", "Apixaban"]
+
+    # Another patient on an overlapping regimen: only the new pair reaches the model
+    warnings = await _check("Apixaban 5mg BD", "Keppra 1g, Sertraline 50mg")
+    assert calls[1:] == [[("apixaban", "sertraline")]]
+    assert len(warnings) == 2
+
+    assert await _check("Apixaban 5mg BD", "Levetiracetam, Valproate") != []
+    assert len(calls) == 2
+
+
+
+@pytest.mark.asyncio
+async def test_unrecognized_medications_and_history_still_reach_the_model(vocabulary, monkeypatch):
+    full_checks, condition_checks = [], []
+
+    async def full_check(current_meds, new_prescription):
+        full_checks.append((current_meds, new_prescription))
+        return [{"type": "CONTRAINDICATION", "message": "Checked in full", "drug": "?", "severity": "HIGH"}]
+
+    async def condition_check(history, drugs):
+        condition_checks.append((history, drugs))
+        return [{"type": "CONTRAINDICATION", "message": "Triptans are contraindicated after MI", "drug": "Sumatriptan", "severity": "HIGH"}]
+
+    async def no_pair_model(pairs):
+        raise AssertionError("pairs must come from the index")
+    monkeypatch.setattr(SafetyService.__module__ + ".GeminiService.check_drug_interactions_async", full_check)
+    monkeypatch.setattr(SafetyService.__module__ + ".GeminiService.check_drug_conditions_async", condition_check)
+    monkeypatch.setattr(SafetyService.__module__ + ".GeminiService.check_drug_pairs_async", no_pair_model)
+
+    # Undosed, but both are in the index
+    warnings = await _check("Start topiramate", "Combined oral contraceptive pill")
+    assert [(w["drug"], w["interacts_with"]) for w in warnings] == [("Topiramate", "Ethinylestradiol")]
+
+    # A prescribed drug the vocabulary does not know, or a non-drug medication list: the full check
+    assert await _check("Start perampanel", "Combined oral contraceptive pill") != []
+    assert await _check("Start Sumatriptan 50mg PRN", "Coronary artery disease, prior MI") != []
+    assert await _check("- Start brivaracetam\n- Continue levetiracetam 500mg bd", "Levetiracetam 500mg") != []
+    assert full_checks == [
+        ("Combined oral contraceptive pill", "start perampanel"),
+        ("Coronary artery disease, prior MI", "start sumatriptan 50mg prn"),
+        ("Levetiracetam 500mg", "- start brivaracetam\n- continue levetiracetam 500mg bd"),
+    ]
+
+    # Conditions in the history are checked against the new drugs even when every drug is known
+    note = SOAPNote(soap_json={"soap_note": {"plan": "Start Sumatriptan 50mg PRN\nMRI brain"}})
+    profile = PatientProfile(
+        first_name="A", last_name="B", current_medications="None", medical_history="Coronary artery disease, prior MI",
+    )
+    warnings = await SafetyService.check_drug_interactions(note, profile)
+    assert condition_checks == [("Coronary artery disease, prior MI", ["sumatriptan"])]
+    assert [w["message"] for w in warnings] == ["Triptans are contraindicated after MI"]
+    assert len(full_checks) == 3
@@ -0,0 +1,76 @@
+import pytest
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.models.base import ProcessingJob, JobType, JobStatus
+from app.services.job_queue import JobQueue
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        yield s
+
+
+def test_enqueue_reuses_waiting_job(session):
+    cid = uuid4()
+    first = JobQueue.enqueue(session, JobType.TRANSCRIPTION, cid, uuid4())
+    audio_id = uuid4()
+    second = JobQueue.enqueue(session, JobType.TRANSCRIPTION, cid, audio_id)
+
+    assert first.id == second.id
+    assert second.audio_file_id == audio_id
+
+
+def test_lease_is_exclusive(session):
+    JobQueue.enqueue(session, JobType.TRANSCRIPTION, uuid4())
+    JobQueue.enqueue(session, JobType.SOAP_GENERATION, uuid4())
+
+    leased = JobQueue.lease(session, "worker-a", limit=5)
+    assert len(leased) == 2
+    assert all(j.status == JobStatus.RUNNING and j.attempts == 1 for j in leased)
+
+    # Nothing left for a second worker while leases are valid
+    assert JobQueue.lease(session, "worker-b", limit=5) == []
+
+
+def test_expired_lease_is_picked_up_again(session):
+    job = JobQueue.enqueue(session, JobType.TRANSCRIPTION, uuid4())
+    JobQueue.lease(session, "worker-a", limit=1)
+
+    stored = session.get(ProcessingJob, job.id)
+    stored.leased_until = datetime.utcnow() - timedelta(seconds=1)
+    session.add(stored)
+    session.commit()
+
+    leased = JobQueue.lease(session, "worker-b", limit=1)
+    assert [j.id for j in leased] == [job.id]
+    assert leased[0].lease_owner == "worker-b"
+    assert leased[0].attempts == 2
+
+    # The old owner can no longer complete it
+    assert JobQueue.complete(session, job.id, "worker-a") is False
+    assert JobQueue.complete(session, job.id, "worker-b") is True
+
+
+def test_fail_retries_then_gives_up(session):
+    job = JobQueue.enqueue(session, JobType.SOAP_GENERATION, uuid4(), max_attempts=2)
+
+    JobQueue.lease(session, "w", limit=1)
+    assert JobQueue.fail(session, job.id, "w", "boom") == JobStatus.QUEUED
+
+    # Backoff delays the retry
+    assert JobQueue.lease(session, "w", limit=1) == []
+    stored = session.get(ProcessingJob, job.id)
+    stored.available_at = datetime.utcnow()
+    session.add(stored)
+    session.commit()
+
+    JobQueue.lease(session, "w", limit=1)
+    assert JobQueue.fail(session, job.id, "w", "boom again") == JobStatus.FAILED
+    session.refresh(stored)
+    assert stored.last_error == "boom again"
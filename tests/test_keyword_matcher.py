@@ -0,0 +1,131 @@
+import random
+import re
+
+import pytest
+
+from app.models.base import TriageCategory
+from app.services import triage_service
+from app.services.keyword_matcher import AhoCorasick
+from app.services.triage_service import TriageService, CRITICAL_KEYWORDS, HIGH_KEYWORDS, MODERATE_KEYWORDS
+
+
+def _reference(transcript):
+    # The original first-match-wins loops
+    text = transcript.lower()
+    for tier, keywords in ((TriageCategory.CRITICAL, CRITICAL_KEYWORDS), (TriageCategory.HIGH, HIGH_KEYWORDS), (TriageCategory.MODERATE, MODERATE_KEYWORDS)):
+        for keyword in keywords:
+            if keyword in text:
+                return tier, keyword
+    return TriageCategory.LOW, None
+
+
+def test_automaton_finds_overlapping_patterns_with_offsets():
+    automaton = AhoCorasick([("he", 1), ("she", 2), ("his", 3), ("hers", 4)])
+    assert sorted(automaton.iter_matches("ushers")) == [(1, 4, 2), (2, 4, 1), (2, 6, 4)]
+
+
+def test_automaton_works_on_token_sequences():
+    automaton = AhoCorasick([(("chest", "pain"), "cp"), (("pain",), "p")])
+    tokens = "crushing chest pain and more pain".split()
+    assert sorted(automaton.iter_matches(tokens)) == [(1, 3, "cp"), (2, 3, "p"), (5, 6, "p")]
+
+
+def test_reports_every_match_with_tier_and_offsets():
+    text = "Crushing chest pain since the morning, with a headache."
+    result = TriageService.evaluate_transcript(text)
+    assert result["triage_status"] == TriageCategory.CRITICAL
+    found = {(m["keyword"], m["start"], m["end"]) for m in result["matches"]}
+    assert ("crushing chest pain", 0, 19) in found
+    assert ("chest pain", 9, 19) in found
+    assert ("pain", 15, 19) in found
+    assert ("headache", 46, 54) in found
+    assert all(text.lower()[m["start"]:m["end"]] == m["keyword"] for m in result["matches"])
+
+
+def test_same_status_and_reason_as_keyword_loops():
+    # Whole keywords joined by spaces, no negation cues: both engines must agree
+    vocabulary = CRITICAL_KEYWORDS + HIGH_KEYWORDS + MODERATE_KEYWORDS + ["the", "patient", "reports", "mild"]
+    rng = random.Random(3)
+    for _ in range(300):
+        text = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 6)))
+        tier, keyword = _reference(text)
+        result = TriageService.evaluate_transcript(text)
+        assert result["triage_status"] == (tier if text else TriageCategory.LOW)
+        if keyword:
+            assert f"'{keyword}'" in result["reason"]
+
+
+def test_risk_flags_are_scanned_once_without_cross_flag_matches():
+    note = type("Note", (), {"risk_flags": {"flags": ["chest", "pain"]}, "soap_json": {}})()
+    assert TriageService.calculate_urgency(note, None) == (20, TriageCategory.LOW)
+    note.risk_flags = {"flags": ["Mild nausea", "Expressed thoughts of suicide"]}
+    assert TriageService.calculate_urgency(note, None) == (95, TriageCategory.CRITICAL)
+
+
+def test_matcher_rebuilds_when_keyword_lists_change(monkeypatch):
+    monkeypatch.setattr(triage_service, "HIGH_KEYWORDS", HIGH_KEYWORDS + ["aura"])
+    assert TriageService.evaluate_transcript("visual aura")["triage_status"] == TriageCategory.HIGH
+    monkeypatch.undo()
+    assert TriageService.evaluate_transcript("visual aura")["triage_status"] == TriageCategory.LOW
+
+
+def test_keywords_match_whole_words_and_plurals_only():
+    assert TriageService.evaluate_transcript("I enjoy painting")["triage_status"] == TriageCategory.LOW
+    assert TriageService.evaluate_transcript("fit for work")["triage_status"] == TriageCategory.LOW
+    result = TriageService.evaluate_transcript("Two seizures this week")
+    assert result["triage_status"] == TriageCategory.CRITICAL
+    assert result["reason"] == "Detected critical phrase: 'seizure'"
+    assert TriageService.evaluate_transcript("Recurring headaches")["triage_status"] == TriageCategory.MODERATE
+
+
+def test_negated_mentions_do_not_count():
+    result = TriageService.evaluate_transcript("Patient denies chest pain or shortness of breath. Mild cough.")
+    assert result["triage_status"] == TriageCategory.MODERATE
+    assert {m["keyword"] for m in result["matches"] if m["negated"]} == {"chest pain", "pain", "shortness of breath"}
+    # The scope ends at "but" and at sentence ends
+    assert TriageService.evaluate_transcript("No fever but crushing chest pain")["triage_status"] == TriageCategory.CRITICAL
+    assert TriageService.evaluate_transcript("No fever. Chest pain since noon.")["triage_status"] == TriageCategory.CRITICAL
+    # "No," answering a question is not a negation of what follows
+    assert TriageService.evaluate_transcript("No, I have chest pain")["triage_status"] == TriageCategory.CRITICAL
+
+
+def test_more_evidence_raises_score_within_tier():
+    once = TriageService.evaluate_transcript("Patient: I had a seizure.")
+    repeated = TriageService.evaluate_transcript("Patient: I had a seizure. Then another seizure and a convulsion.")
+    assert once["risk_score"] == 95
+    assert repeated["risk_score"] == 97
+    # Nested phrases count once
+    assert TriageService.evaluate_transcript("crushing chest pain")["risk_score"] == 95
+
+
+def test_negation_ends_at_the_clause():
+    result = TriageService.evaluate_transcript("No appetite, had a seizure this morning.")
+    assert result["triage_status"] == TriageCategory.CRITICAL
+    assert TriageService.evaluate_transcript("No fever; then a seizure")["triage_status"] == TriageCategory.CRITICAL
+
+
+def _occurrences(text):
+    # Every whole-word occurrence of every keyword, phrase words separated by anything but a clause break
+    found = set()
+    for keyword in CRITICAL_KEYWORDS + HIGH_KEYWORDS + MODERATE_KEYWORDS:
+        words = re.findall(r"[^\W_]+|_", keyword.lower())
+        phrase = r"[^\w.!?;:,\n]+".join(map(re.escape, words))
+        for match in re.finditer(rf"(?<!\w)(?=({phrase})(?!\w))", text.lower()):
+            found.add((keyword, match.start(1), match.end(1)))
+    return found
+
+
+def test_single_pass_finds_every_whole_word_occurrence():
+    vocabulary = CRITICAL_KEYWORDS + HIGH_KEYWORDS + MODERATE_KEYWORDS + [
+        "no", "denies", "but", ",", ".", "?", "\nDoctor:", "\nPatient:", "yes", "painting", "don't", "the",
+        "\u2014", "naïve", "(fever)", "chest.", "-",
+    ]
+    rng = random.Random(5)
+    texts = [" ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 12))) for _ in range(300)]
+    results = [triage_service.keyword_matcher.scan(text) for text in texts]
+    for text, matches in zip(texts, results):
+        assert {(m.keyword, m.start, m.end) for m in matches} == _occurrences(text)
+    assert triage_service.keyword_matcher.scan("Chest. Pain started at noon")[0].keyword == "pain"
+    # One pass over many texts gives each text's own result: no negation carried over
+    assert triage_service.keyword_matcher.scan_many(texts) == results
+    assert triage_service.keyword_matcher.scan_many(["Patient: I deny", "seizure", ""]) == [[], triage_service.keyword_matcher.scan("seizure"), []]
@@ -0,0 +1,133 @@
+import pytest
+from sqlmodel import SQLModel, create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.services.llm_cache import MemoryLRUBackend, SQLBackend, TieredResponseCache, make_key
+from app.services.llm_service import GeminiService
+import app.services.llm_service as llm_service
+import app.services.llm_runtime as llm_runtime
+
+TTLS = {"generate_intake_summary": 3600, "generate_clinical_document": 0}
+
+
+@pytest.fixture
+def sql_backend():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    return SQLBackend(engine)
+
+
+def test_key_covers_model_config_and_prompt():
+    base = make_key("gemini-2.5-flash", None, "prompt")
+    assert base == make_key("gemini-2.5-flash", {}, "prompt")
+    assert base != make_key("gemini-2.0-flash", None, "prompt")
+    assert base != make_key("gemini-2.5-flash", {"response_mime_type": "application/json"}, "prompt")
+    assert base != make_key("gemini-2.5-flash", None, "prompt!")
+
+
+def test_memory_lru_bounds_entries():
+    backend = MemoryLRUBackend(max_entries=2)
+    backend.set("a", "1", 60)
+    backend.set("b", "2", 60)
+    backend.get("a")
+    backend.set("c", "3", 60)
+    assert backend.get("b") is None
+    assert backend.get("a") == "1"
+
+
+def test_sql_tier_backfills_memory(sql_backend):
+    writer = TieredResponseCache([MemoryLRUBackend(10), sql_backend], TTLS)
+    writer.set("k", "summary", "generate_intake_summary")
+
+    # A new process only shares the SQL tier
+    reader = TieredResponseCache([MemoryLRUBackend(10), sql_backend], TTLS)
+    assert reader.get("k", "generate_intake_summary") == "summary"
+    assert reader.get("k", "generate_intake_summary") == "summary"
+    assert reader.stats()["hits"] == {"memory": 1, "sql": 1}
+
+
+def test_zero_ttl_disables_method():
+    cache = TieredResponseCache([MemoryLRUBackend(10)], TTLS)
+    cache.set("k", "doc", "generate_clinical_document")
+    assert cache.get("k") is None
+
+
+@pytest.mark.asyncio
+async def test_generate_serves_repeat_prompt_from_cache(monkeypatch):
+    calls = []
+
+    class FakeModel:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def generate_content(self, prompt):
+            calls.append(prompt)
+            return type("Response", (), {"text": '{"ok": true}'})()
+
+    monkeypatch.setattr(llm_runtime.genai, "GenerativeModel", FakeModel)
+    llm_runtime.model_registry.clear()
+    monkeypatch.setattr(llm_service, "llm_cache", TieredResponseCache([MemoryLRUBackend(10)], {"m": 60}))
+
+    first = await GeminiService._generate("m", "model", "same prompt", parse=GeminiService._parse_json_response)
+    second = await GeminiService._generate("m", "model", "same prompt", parse=GeminiService._parse_json_response)
+    assert first == second == {"ok": True}
+    assert len(calls) == 1
+
+
+def test_sql_set_overwrites_an_existing_row(sql_backend):
+    # Another process may have written the key between our lookup and insert
+    sql_backend.set("k", "old", 60, "generate_intake_summary", "model")
+    sql_backend.set("k", "new", 60, "generate_intake_summary", "model")
+    assert sql_backend.get("k") == "new"
+    assert not sql_backend._disabled
+
+
+def test_sql_tier_disabled_only_when_table_missing(sql_backend, monkeypatch):
+    from sqlalchemy.exc import OperationalError
+    import app.services.llm_cache as llm_cache_module
+
+    class FlakySession:
+        def __init__(self, *args, **kwargs):
+            raise OperationalError("SELECT", {}, Exception("server closed the connection unexpectedly"))
+
+    monkeypatch.setattr(llm_cache_module, "Session", FlakySession)
+    assert sql_backend.get("k") is None
+    assert not sql_backend._disabled
+    monkeypatch.undo()
+
+    missing = SQLBackend(create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool))
+    assert missing.get("k") is None
+    assert missing._disabled
+
+
+@pytest.mark.asyncio
+async def test_unparseable_cached_entry_is_dropped_and_regenerated(monkeypatch):
+    class FakeModel:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def generate_content(self, prompt):
+            return type("Response", (), {"text": '{"ok": true}'})()
+
+    monkeypatch.setattr(llm_runtime.genai, "GenerativeModel", FakeModel)
+    llm_runtime.model_registry.clear()
+    cache = TieredResponseCache([MemoryLRUBackend(10)], {"m": 60})
+    monkeypatch.setattr(llm_service, "llm_cache", cache)
+    key = make_key("model", None, "prompt")
+    cache.set(key, "not json", "m")
+
+    assert await GeminiService._generate("m", "model", "prompt", parse=GeminiService._parse_json_response) == {"ok": True}
+    assert cache.get(key, "m") == '{"ok": true}'
+
+
+@pytest.mark.asyncio
+async def test_soap_note_errors_keep_their_type(monkeypatch):
+    from tenacity import stop_after_attempt
+
+    async def failing_generate(*args, **kwargs):
+        raise TimeoutError("deadline exceeded")
+
+    monkeypatch.setattr(llm_service.settings, "USE_MOCK_AI", False)
+    monkeypatch.setattr(GeminiService, "_generate", failing_generate)
+    with pytest.raises(TimeoutError):
+        await GeminiService.generate_soap_note_async.retry_with(stop=stop_after_attempt(1))("transcript")
@@ -0,0 +1,33 @@
+import asyncio
+import time
+import pytest
+
+import app.services.llm_runtime as llm_runtime
+from app.services.llm_runtime import ModelRegistry, InstrumentedExecutor
+
+
+def test_registry_builds_each_config_once(monkeypatch):
+    built = []
+    monkeypatch.setattr(llm_runtime.genai, "GenerativeModel", lambda name, generation_config=None: built.append(name) or object())
+    registry = ModelRegistry()
+
+    a = registry.get("gemini-2.5-flash", {"response_mime_type": "application/json"})
+    b = registry.get("gemini-2.5-flash", {"response_mime_type": "application/json"})
+    c = registry.get("gemini-2.5-flash")
+
+    assert a is b
+    assert a is not c
+    assert len(built) == 2
+
+
+@pytest.mark.asyncio
+async def test_executor_bounds_concurrency_and_reports_waits():
+    executor = InstrumentedExecutor(max_workers=1, name="test-llm")
+    results = await asyncio.gather(*[executor.run(time.sleep, 0.05) for _ in range(3)])
+
+    stats = executor.stats()
+    assert results == [None, None, None]
+    assert stats["completed"] == 3 and stats["queued"] == 0 and stats["running"] == 0
+    assert stats["max_queue_depth"] >= 2
+    # The last call had to wait for the two before it on the single thread
+    assert stats["wait_ms_max"] >= 90
@@ -0,0 +1,57 @@
+import pytest
+
+from app.models.base import PatientProfile, SOAPNote
+from app.services.medication_normalizer import MedicationNormalizer, parse_dose, parse_frequency
+from app.services.safety_service import SafetyService
+
+NAMES = {
+    "valproate": "valproate",
+    "sodium valproate": "valproate",
+    "keppra": "levetiracetam",
+    "levetiracetam": "levetiracetam",
+    "lamotrigine": "lamotrigine",
+    "acetazolamide": "acetazolamide",
+}
+
+
+def test_doses_and_frequencies_are_normalized():
+    assert parse_dose("2.5 micrograms") == "2.5 mcg"
+    assert parse_frequency("250mg b.i.d.") == "twice daily"
+    assert parse_frequency("one tablet twice a day") == "twice daily"
+    assert parse_frequency("q6h") == parse_frequency("every 6 hours") == "every 6 hours"
+    assert parse_frequency("on the ward") is None
+
+
+def test_normalizer_reads_each_mention_in_one_pass():
+    normalizer = MedicationNormalizer(NAMES)
+    plan = "- MRI Brain\n- Keppra 500mg BD, sodium valproate 200 mg nocte\n- Brivaracetam 50 mg\n- Take 2 tablets"
+    assert [m.as_dict() for m in normalizer.normalize(plan)] == [
+        {"name": "levetiracetam", "text": "Keppra", "dose": "500 mg", "frequency": "twice daily", "match": "exact"},
+        {"name": "valproate", "text": "sodium valproate", "dose": "200 mg", "frequency": "at night", "match": "exact"},
+        {"name": "brivaracetam", "text": "Brivaracetam", "dose": "50 mg", "frequency": None, "match": "unknown"},
+    ]
+
+
+def test_misspellings_need_a_dose_to_count():
+    normalizer = MedicationNormalizer(NAMES)
+    mentions = normalizer.normalize("Lamotrigne 25mg od, then Acetazolamdie 250 mg")
+    assert [(m.name, m.match) for m in mentions] == [("lamotrigine", "fuzzy"), ("acetazolamide", "fuzzy")]
+    assert normalizer.normalize("discussed lamotrigne") == []
+    # Two edits away is not a misspelling
+    assert normalizer.extract("Lamotrgne 25mg") == ["lamotrgne"]
+
+
+@pytest.mark.asyncio
+async def test_safety_check_uses_stored_normalizations(monkeypatch):
+    def no_parsing():
+        raise AssertionError("stored medications must not be re-parsed")
+    monkeypatch.setattr("app.services.safety_service.medication_vocabulary.get", no_parsing)
+    monkeypatch.setattr("app.services.safety_service.medication_vocabulary.aget", no_parsing)
+
+    note = SOAPNote(soap_json={"soap_note": {"plan": "Start acetazolamide 250mg BD"}}, plan_medications=[{"name": "acetazolamide", "text": "acetazolamide"}])
+    profile = PatientProfile(
+        first_name="A", last_name="B", current_medications="Lasix 20mg",
+        normalized_medications=[{"name": "furosemide", "text": "Lasix"}],
+    )
+    warnings = await SafetyService.check_drug_interactions(note, profile)
+    assert [(w["drug"], w["interacts_with"]) for w in warnings] == [("Acetazolamide", "Furosemide")]
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.api.v1.users import list_my_patients
+from app.models.base import Appointment, Consultation, PatientProfile, User, UserRole
+
+NOW = datetime.utcnow()
+
+
+def _patient(session, first, last):
+    patient = User(email=f"{first}.{last}@example.com", password_hash="x", role=UserRole.PATIENT)
+    session.add(patient)
+    session.flush()
+    session.add(PatientProfile(user_id=patient.id, first_name=first, last_name=last))
+    return patient
+
+
+def _visit(session, doctor, patient, days_ago):
+    appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, scheduled_at=NOW - timedelta(days=days_ago))
+    session.add(appointment)
+    session.flush()
+    session.add(Consultation(
+        appointment_id=appointment.id, patient_id=patient.id, doctor_id=doctor.id,
+        created_at=NOW - timedelta(days=days_ago),
+    ))
+
+
+def _list(session, doctor, **params):
+    response = Response()
+    params = {"q": None, "cursor": None, "limit": None, **params}
+    rows = list_my_patients(response, session=session, current_user=doctor, **params)
+    return [f"{r['first_name']} {r['last_name']}" for r in rows], response.headers.get("X-Next-Cursor")
+
+
+def test_patient_list_is_one_grouped_keyset_query():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine, expire_on_commit=False) as session:
+        doctor = User(email="doc@example.com", password_hash="x", role=UserRole.DOCTOR)
+        other = User(email="other@example.com", password_hash="x", role=UserRole.DOCTOR)
+        session.add_all([doctor, other])
+        ada, bob, cy, dee = (_patient(session, *name) for name in [
+            ("ada", "lovelace"), ("bob", "smith"), ("cy", "smith"), ("dee", "100%"),
+        ])
+        _visit(session, doctor, ada, 30)
+        _visit(session, doctor, ada, 2)   # Latest visit wins
+        _visit(session, doctor, bob, 10)
+        _visit(session, doctor, cy, 5)
+        _visit(session, doctor, dee, 20)
+        _visit(session, other, bob, 1)    # Another doctor's visit is not counted
+        session.commit()
+
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+        # Without a limit, clients that do not page get the full list
+        names, next_cursor = _list(session, doctor)
+        assert names == ["ada lovelace", "cy smith", "bob smith", "dee 100%"]
+        assert next_cursor is None
+        assert len(statements) == 1
+        rows = list_my_patients(Response(), q=None, cursor=None, limit=1, session=session, current_user=doctor)
+        assert rows[0]["last_visit"] == NOW - timedelta(days=2)
+
+        pages, cursor = [], None
+        while True:
+            names, cursor = _list(session, doctor, limit=3 if not pages else 1, cursor=cursor)
+            pages.append(names)
+            if cursor is None:
+                break
+        assert pages == [["ada lovelace", "cy smith", "bob smith"], ["dee 100%"]]
+
+        assert _list(session, doctor, q="SMITH")[0] == ["cy smith", "bob smith"]
+        assert _list(session, doctor, q="ada love")[0] == ["ada lovelace"]
+        assert _list(session, doctor, q="0%")[0] == ["dee 100%"]  # Wildcards match literally
+        assert _list(session, doctor, q="%")[0] == ["dee 100%"]
+        assert _list(session, other)[0] == ["bob smith"]
+
+        with pytest.raises(HTTPException) as error:
+            _list(session, doctor, cursor="not-a-cursor")
+        assert error.value.status_code == 400
+
+
+def test_cursor_breaks_ties_on_patient_id():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        doctor = User(id=uuid4(), email="doc@example.com", password_hash="x", role=UserRole.DOCTOR)
+        session.add(doctor)
+        for i in range(5):
+            _visit(session, doctor, _patient(session, f"p{i}", "same-day"), 3)
+        session.commit()
+
+        seen, cursor = [], None
+        while True:
+            names, cursor = _list(session, doctor, limit=2, cursor=cursor)
+            seen.extend(names)
+            if cursor is None:
+                break
+        assert sorted(seen) == [f"p{i} same-day" for i in range(5)]
@@ -0,0 +1,73 @@
+import asyncio
+import time
+import pytest
+from sqlmodel import SQLModel, create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.services.rate_limiter import TokenBucket, DBTokenBucket, ProviderLimiter, is_quota_error
+
+
+def test_bucket_allows_burst_then_reports_wait():
+    bucket = TokenBucket(rate_per_minute=60, burst=2)
+    assert bucket.try_take() == 0
+    assert bucket.try_take() == 0
+    wait = bucket.try_take()
+    assert 0 < wait <= 1.0
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_in_arrival_order():
+    bucket = TokenBucket(rate_per_minute=1200, burst=1)  # one token every 50ms
+    order = []
+
+    async def caller(i):
+        await bucket.acquire()
+        order.append(i)
+
+    tasks = []
+    for i in range(4):
+        tasks.append(asyncio.create_task(caller(i)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    assert order == [0, 1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_limiter_caps_concurrency():
+    limiter = ProviderLimiter("test", max_concurrency=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*[call() for _ in range(6)])
+    assert peak == 2
+    assert limiter.stats()["acquired"] == 6
+
+
+def test_drain_on_throttle():
+    bucket = TokenBucket(rate_per_minute=600, burst=5)
+    limiter = ProviderLimiter("test", max_concurrency=0, bucket=bucket)
+    limiter.throttled()
+    assert bucket.try_take() > 0
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_db_bucket_is_shared_between_instances():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    a = DBTokenBucket("gemini:test", rate_per_minute=60, burst=2, engine=engine)
+    b = DBTokenBucket("gemini:test", rate_per_minute=60, burst=2, engine=engine)
+
+    assert a.try_take() == 0
+    assert b.try_take() == 0
+    assert a.try_take() > 0  # Both processes drew from the same two tokens
+
+
+def test_quota_error_detection():
+    assert is_quota_error(Exception("429 Resource has been exhausted"))
+    assert is_quota_error("Quota exceeded for model")
+    assert not is_quota_error(ValueError("bad json"))
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session as ORMSession
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+import app.services.consultation_processor as processor
+from app.core.db import track_held_sessions, warn_if_session_held
+from app.models.base import (
+    Appointment, AudioFile, Consultation, PatientProfile, SOAPNote, User, UserRole,
+)
+
+SOAP = {
+    "soap_note": {"subjective": "52-year-old with tremor.", "objective": "-", "assessment": "Essential tremor", "plan": "- Propranolol 40mg BID"},
+    "ui_summary": {"diagnosis": "Essential tremor", "prescription": "Propranolol 40mg BID", "notes": ""},
+    "demographics": {"age": 52, "gender": "F"},
+    "risk_flags": [],
+}
+
+
+@pytest.fixture
+def consultation_id(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(processor, "engine", engine)
+
+    with Session(engine) as session:
+        patient = User(email="p@example.com", password_hash="x", role=UserRole.PATIENT)
+        doctor = User(email="d@example.com", password_hash="x", role=UserRole.DOCTOR)
+        session.add_all([patient, doctor])
+        session.flush()
+        session.add(PatientProfile(user_id=patient.id, first_name="Ann", last_name="Lee", current_medications="Sertraline"))
+        appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, scheduled_at=datetime.utcnow())
+        session.add(appointment)
+        session.flush()
+        consultation = Consultation(appointment_id=appointment.id, patient_id=patient.id, doctor_id=doctor.id)
+        session.add(consultation)
+        session.flush()
+        session.add(AudioFile(consultation_id=consultation.id, file_name="a.wav", file_url="/a.wav", transcription="Doctor: Hi"))
+        session.commit()
+        return consultation.id, engine
+
+
+@pytest.mark.asyncio
+async def test_safety_check_overlaps_db_work_and_commits_once(consultation_id, monkeypatch):
+    cid, engine = consultation_id
+
+    async def fake_soap(*args, **kwargs):
+        return SOAP
+
+    async def slow_safety(soap_note, patient_profile):
+        await asyncio.sleep(0.3)
+        return [{"type": "WARNING", "message": "Interaction", "drug": "Propranolol"}]
+
+    def slow_triage(soap_note, patient_profile):
+        time.sleep(0.3)
+        return 40, "MODERATE"
+
+    monkeypatch.setattr(processor.GeminiService, "generate_soap_note_async", fake_soap)
+    monkeypatch.setattr(processor.SafetyService, "check_drug_interactions", slow_safety)
+    monkeypatch.setattr(processor.TriageService, "calculate_urgency", slow_triage)
+
+    commits = []
+    listener = lambda session: commits.append(session)
+    event.listen(ORMSession, "after_commit", listener)
+    try:
+        started = time.perf_counter()
+        await processor.process_soap_generation(cid)
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(ORMSession, "after_commit", listener)
+
+    assert elapsed < 0.55
+    assert len(commits) == 1
+
+    with Session(engine) as session:
+        consultation = session.get(Consultation, cid)
+        assert consultation.safety_warnings[0]["drug"] == "Propranolol"
+        assert consultation.urgency_score == 40
+        assert consultation.diagnosis == "Essential tremor"
+        assert session.query(SOAPNote).count() == 1
+        profile = session.query(PatientProfile).one()
+        assert profile.gender == "Female" and profile.date_of_birth is not None
+
+
+@pytest.mark.asyncio
+async def test_no_session_is_held_during_llm_calls_and_stale_results_are_discarded(consultation_id, monkeypatch):
+    cid, engine = consultation_id
+    track_held_sessions()
+    held = []
+
+    async def soap_while_doctor_edits(*args, **kwargs):
+        held.append(warn_if_session_held("gemini"))
+        # The doctor corrects the transcript while the note is being generated
+        with Session(engine) as session:
+            audio = session.query(AudioFile).one()
+            audio.transcription = "Doctor: Hello (corrected)"
+            session.add(audio)
+            session.commit()
+        return SOAP
+
+    async def no_warnings(soap_note, patient_profile):
+        held.append(warn_if_session_held("gemini"))
+        return []
+
+    monkeypatch.setattr(processor.GeminiService, "generate_soap_note_async", soap_while_doctor_edits)
+    monkeypatch.setattr(processor.SafetyService, "check_drug_interactions", no_warnings)
+    await processor.process_soap_generation(cid)
+
+    assert held == [False, False]
+    with Session(engine) as session:
+        # The note was generated from the old transcript: nothing is written
+        assert session.query(SOAPNote).count() == 0
+        assert session.get(Consultation, cid).diagnosis is None
+
+
+@pytest.mark.asyncio
+async def test_transcripts_do_not_overwrite_a_verified_transcript(consultation_id, monkeypatch, tmp_path):
+    cid, engine = consultation_id
+    track_held_sessions()
+    monkeypatch.chdir(tmp_path)
+    # Read from the stored file_url, as the transcode step does
+    (tmp_path / "media").mkdir()
+    (tmp_path / "media" / "a.wav").write_bytes(b"RIFF")
+    with Session(engine) as session:
+        audio = session.query(AudioFile).one()
+        audio.file_url = os.path.join("media", "a.wav")
+        session.add(audio)
+        session.commit()
+
+    async def transcribe_while_doctor_verifies(file_path, content_sha256=None):
+        assert file_path == os.path.join("media", "a.wav")
+        assert not warn_if_session_held("assemblyai")
+        with Session(engine) as session:
+            audio = session.query(AudioFile).one()
+            audio.transcription, audio.is_transcript_verified = "Doctor: Hi (verified)", True
+            session.add(audio)
+            session.commit()
+        return {"text": "Hi", "utterances": []}
+
+    monkeypatch.setattr(processor.AssemblyAIService, "transcribe_audio_async", transcribe_while_doctor_verifies)
+    await processor.process_transcription_only(cid)
+
+    with Session(engine) as session:
+        assert session.query(AudioFile).one().transcription == "Doctor: Hi (verified)"
+        assert session.get(Consultation, cid).status == "IN_PROGRESS"
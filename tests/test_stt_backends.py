@@ -0,0 +1,51 @@
+import pytest
+
+from app.core.config import settings
+from app.services import stt_backends
+from app.services.stt_backends import AssemblyAIBackend, TextGridReplayBackend, get_stt_backend
+from app.services.stt_service import AssemblyAIService
+
+
+@pytest.fixture
+def replay():
+    return TextGridReplayBackend("test-audio-transcripts")
+
+
+def test_replay_merges_doctor_and_patient_channels(replay):
+    result = replay.load("uploads/3f2a_day1_consultation01.wav")
+    utterances = result["utterances"]
+    assert {u["speaker"] for u in utterances} == {"A", "B"}
+    assert [u["start"] for u in utterances] == sorted(u["start"] for u in utterances)
+    assert utterances[0]["text"].startswith("Hello? Hi.")
+    assert "<UNSURE>" not in result["text"] and "<UNIN/>" not in result["text"]
+
+
+def test_replay_rejects_unknown_recordings(replay):
+    with pytest.raises(FileNotFoundError):
+        replay.load("uploads/voice-note.webm")
+    with pytest.raises(FileNotFoundError):
+        replay.load("uploads/day9_consultation99.wav")
+
+
+@pytest.mark.asyncio
+async def test_pipeline_entry_point_uses_configured_backend(monkeypatch):
+    monkeypatch.setattr(settings, "STT_BACKEND", "local")
+    monkeypatch.setattr(settings, "TRANSCRIPT_CACHE_ENABLED", False)
+    monkeypatch.setattr(stt_backends, "_backends", {})
+
+    result = await AssemblyAIService.transcribe_audio_async("day1_consultation02_doctor.wav")
+    assert result["id"] == "local-day1_consultation02"
+    assert result["utterances"]
+
+
+@pytest.mark.asyncio
+async def test_assemblyai_key_is_only_required_when_used(monkeypatch):
+    monkeypatch.setattr(settings, "ASSEMBLYAI_API_KEY", None)
+    with pytest.raises(RuntimeError):
+        await AssemblyAIBackend().transcribe("a.wav", {})
+
+
+def test_unknown_backend_name(monkeypatch):
+    monkeypatch.setattr(stt_backends, "_backends", {})
+    with pytest.raises(ValueError):
+        get_stt_backend("whisper")
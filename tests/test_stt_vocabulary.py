@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.core.config import settings
+from app.models.base import MedicalTerm, MedicalTermCategory
+from app.services import stt_vocabulary
+from app.services.stt_backends import AssemblyAIBackend
+from app.services.stt_service import AssemblyAIService
+from app.services.stt_vocabulary import DEFAULT_WORD_BOOST, _BoostVocabularyCache, record_term_usage
+
+
+@pytest.fixture
+def vocabulary(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(MedicalTerm(term="Brivaracetam", category=MedicalTermCategory.MEDICATION, usage_count=3))
+        session.add(MedicalTerm(term="Aura", category=MedicalTermCategory.SYMPTOM, usage_count=9))
+        session.add(MedicalTerm(term="Idiopathic intracranial hypertension", category=MedicalTermCategory.DISEASE))
+        session.add(MedicalTerm(term="Valproate", category=MedicalTermCategory.MEDICATION, usage_count=1))
+        session.commit()
+    monkeypatch.setattr(stt_vocabulary, "engine", engine)
+    cache = _BoostVocabularyCache()
+    monkeypatch.setattr(stt_vocabulary, "word_boost_vocabulary", cache)
+    monkeypatch.setattr("app.services.stt_service.word_boost_vocabulary", cache)
+    monkeypatch.setattr(AssemblyAIService, "_compiled", {})
+    return engine, cache
+
+
+def test_boost_list_is_ranked_by_usage_and_capped(vocabulary, monkeypatch):
+    _, cache = vocabulary
+    boost = cache.get().word_boost
+    assert boost[:4] == ["Aura", "Brivaracetam", "Valproate", "Idiopathic intracranial hypertension"]
+    # Defaults follow the table's terms without duplicates
+    assert boost[4:] == [w for w in DEFAULT_WORD_BOOST if w != "Valproate"]
+
+    monkeypatch.setattr(settings, "STT_WORD_BOOST_LIMIT", 2)
+    cache.invalidate()
+    assert cache.get().word_boost == ["Aura", "Brivaracetam"]
+
+
+@pytest.mark.asyncio
+async def test_compiled_options_are_reused_until_terms_change(vocabulary):
+    engine, cache = vocabulary
+    options, fingerprint = await AssemblyAIService._compiled_options(True)
+    again, same_fingerprint = await AssemblyAIService._compiled_options(True)
+    assert again is options and same_fingerprint == fingerprint
+
+    backend = AssemblyAIBackend()
+    assert backend._config(options) is backend._config(again)
+
+    cache.invalidate()
+    rebuilt, rebuilt_fingerprint = await AssemblyAIService._compiled_options(True)
+    assert rebuilt is not options and rebuilt["word_boost"] == options["word_boost"]
+    assert rebuilt_fingerprint == fingerprint
+    assert backend._config(rebuilt) is not backend._config(options)
+
+    # A re-ranked list keeps the transcript cache; a new term does not
+    with Session(engine) as session:
+        session.exec(select(MedicalTerm).where(MedicalTerm.term == "Valproate")).one().usage_count = 20
+        session.commit()
+    cache.invalidate()
+    reranked, reranked_fingerprint = await AssemblyAIService._compiled_options(True)
+    assert reranked["word_boost"][0] == "Valproate" and reranked_fingerprint == fingerprint
+
+    with Session(engine) as session:
+        session.add(MedicalTerm(term="Perampanel", category=MedicalTermCategory.MEDICATION))
+        session.commit()
+    cache.invalidate()
+    _, changed_fingerprint = await AssemblyAIService._compiled_options(True)
+    assert changed_fingerprint != fingerprint
+
+
+def test_transcripts_count_term_usage(vocabulary):
+    engine, cache = vocabulary
+    assert record_term_usage("Any aura before it? My brother has idiopathic intracranial hypertension, aura too.") == 2
+    assert record_term_usage("Nothing relevant here") == 0
+    with Session(engine) as session:
+        counts = dict(session.exec(select(MedicalTerm.term, MedicalTerm.usage_count)).all())
+    assert counts == {"Aura": 10, "Brivaracetam": 3, "Idiopathic intracranial hypertension": 1, "Valproate": 1}
@@ -0,0 +1,77 @@
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from app.api.deps import get_current_user
+from app.main import app
+from app.models.base import MedicalTermCategory, User, UserRole
+from app.services import term_index
+from app.services.term_index import MedicalTermIndex, TermEntry
+
+MEDICATION, DISEASE, SYMPTOM = MedicalTermCategory.MEDICATION, MedicalTermCategory.DISEASE, MedicalTermCategory.SYMPTOM
+
+
+def _entry(term, category):
+    return TermEntry(uuid4(), term, category, None, datetime(2026, 1, 1))
+
+
+@pytest.fixture
+def index():
+    return MedicalTermIndex([
+        _entry("Seizure", SYMPTOM),
+        _entry("Sumatriptan", MEDICATION),
+        _entry("Sodium valproate", MEDICATION),
+        _entry("Idiopathic intracranial hypertension", DISEASE),
+        _entry("Hypertension", DISEASE),
+        _entry("Status epilepticus", DISEASE),
+    ])
+
+
+def _terms(results):
+    return [r["term"] for r in results]
+
+
+def test_prefix_then_word_then_fuzzy(index):
+    assert _terms(index.search("s")) == ["Seizure", "Sodium valproate", "Status epilepticus", "Sumatriptan"]
+    assert _terms(index.search("Hyper")) == ["Hypertension", "Idiopathic intracranial hypertension"]
+    assert _terms(index.search("valp")) == ["Sodium valproate"]
+    assert _terms(index.search("siezure")) == ["Seizure"]
+    assert _terms(index.search("sumatr", category=DISEASE)) == []
+    assert _terms(index.search("s", category=MEDICATION, limit=1)) == ["Sodium valproate"]
+
+
+def test_incremental_updates_change_results_and_etag(index):
+    etag = index.etag("lev", None, 10)
+    assert index.search("lev") == []
+
+    entry = _entry("Levetiracetam", MEDICATION)
+    index.add(entry)
+    assert _terms(index.search("lev")) == ["Levetiracetam"]
+    assert index.etag("lev", None, 10) != etag
+
+    index.remove(entry.id)
+    assert index.search("lev") == []
+    assert _terms(index.search("s", category=MEDICATION)) == ["Sodium valproate", "Sumatriptan"]
+
+
+def test_search_endpoint_honours_if_none_match(client, index, monkeypatch):
+    class Loaded:
+        def get(self):
+            return index
+    monkeypatch.setattr("app.api.v1.medical_terms.medical_term_index", Loaded())
+    app.dependency_overrides[get_current_user] = lambda: User(email="d@example.com", password_hash="x", role=UserRole.DOCTOR)
+    try:
+        response = client.get("/api/v1/medical-terms/search", params={"q": "hyper", "category": "DISEASE"})
+        assert response.status_code == 200
+        assert _terms(response.json()) == ["Hypertension", "Idiopathic intracranial hypertension"]
+
+        etag = response.headers["ETag"]
+        again = client.get("/api/v1/medical-terms/search", params={"q": "hyper", "category": "DISEASE"}, headers={"If-None-Match": etag})
+        assert again.status_code == 304
+
+        index.add(_entry("Hyperventilation", SYMPTOM))
+        changed = client.get("/api/v1/medical-terms/search", params={"q": "hyper", "category": "DISEASE"}, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
@@ -0,0 +1,48 @@
+import os
+from app.services.transcript_cache import TranscriptCache, config_fingerprint
+
+
+def _audio(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_key_depends_on_content_and_config(tmp_path):
+    cache = TranscriptCache(str(tmp_path / "cache"), max_bytes=10_000)
+    a = _audio(tmp_path, "a.wav", b"same bytes")
+    b = _audio(tmp_path, "b.wav", b"same bytes")
+    c = _audio(tmp_path, "c.wav", b"other bytes")
+
+    fp = config_fingerprint({"speakers_expected": 2, "word_boost": ["Valproate"]})
+    assert cache.make_key(a, fp) == cache.make_key(b, fp)
+    assert cache.make_key(a, fp) != cache.make_key(c, fp)
+    assert cache.make_key(a, fp) != cache.make_key(a, config_fingerprint({"speakers_expected": 3}))
+
+
+def test_hit_miss_counters(tmp_path):
+    cache = TranscriptCache(str(tmp_path / "cache"), max_bytes=10_000)
+    assert cache.get("k1") is None
+    cache.put("k1", {"text": "hello", "utterances": []})
+    assert cache.get("k1") == {"text": "hello", "utterances": []}
+
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    entry = {"text": "x" * 100}
+    cache = TranscriptCache(str(tmp_path / "cache"), max_bytes=300)
+    cache.put("old", entry)
+    cache.put("used", entry)
+    cache.get("old")  # "used" is now the least recently used
+    cache.put("new", entry)
+
+    assert cache.get("used") is None
+    assert cache.get("old") == entry
+    assert cache.stats()["evictions"] == 1
+    assert not os.path.exists(tmp_path / "cache" / "used.json")
+
+    # A fresh instance rebuilds the index from disk
+    reopened = TranscriptCache(str(tmp_path / "cache"), max_bytes=300)
+    assert reopened.get("new") == entry
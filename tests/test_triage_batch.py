@@ -0,0 +1,75 @@
+import random
+from datetime import datetime
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.models.base import Appointment, Consultation, SOAPNote, TriageCategory, User, UserRole
+from app.services.triage_service import TriageService, CRITICAL_KEYWORDS, HIGH_KEYWORDS, MODERATE_KEYWORDS
+
+WORDS = CRITICAL_KEYWORDS + HIGH_KEYWORDS + MODERATE_KEYWORDS + ["stable", "patient", "reports", "none"]
+
+
+def _random_note(rng):
+    soap = {"soap_note": {
+        "subjective": " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 5))),
+        "assessment": " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 3))),
+    }}
+    flags = {"flags": [rng.choice(WORDS) for _ in range(rng.randint(0, 2))]}
+    return soap, flags
+
+
+def test_batch_matches_row_by_row():
+    rng = random.Random(11)
+    rows = [(i, *_random_note(rng)) for i in range(500)]
+    rows.append((500, None, None))
+    batch = TriageService.evaluate_batch(rows)
+    for key, soap_json, risk_flags in rows:
+        note = SOAPNote(soap_json=soap_json, risk_flags=risk_flags)
+        assert batch[key] == TriageService.calculate_urgency(note, None)
+
+
+def test_retriage_all_updates_changed_rows_in_chunks():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        patient = User(email="p@example.com", password_hash="x", role=UserRole.PATIENT)
+        doctor = User(email="d@example.com", password_hash="x", role=UserRole.DOCTOR)
+        session.add_all([patient, doctor])
+        session.flush()
+        notes = [
+            ({"soap_note": {"subjective": "sudden chest pain"}}, None),
+            ({"soap_note": {"assessment": "tension headache"}}, None),
+            ({"soap_note": {"subjective": "routine review"}}, None),
+            ({"soap_note": {"subjective": "seizure"}}, None),  # Manually triaged, must be kept
+        ]
+        for i, (soap_json, risk_flags) in enumerate(notes):
+            appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, scheduled_at=datetime.utcnow())
+            session.add(appointment)
+            session.flush()
+            consultation = Consultation(
+                appointment_id=appointment.id, patient_id=patient.id, doctor_id=doctor.id,
+                urgency_score=20, triage_category=TriageCategory.LOW,
+                triage_source="MANUAL" if i == 3 else "AI",
+            )
+            session.add(consultation)
+            session.flush()
+            session.add(SOAPNote(consultation_id=consultation.id, soap_json=soap_json, risk_flags=risk_flags))
+        # A consultation without a SOAP note is not scanned
+        appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, scheduled_at=datetime.utcnow())
+        session.add(appointment)
+        session.flush()
+        session.add(Consultation(appointment_id=appointment.id, patient_id=patient.id, doctor_id=doctor.id))
+        session.commit()
+
+        preview = TriageService.retriage_all(session, chunk_size=2, dry_run=True)
+        assert preview["scanned"] == 3 and preview["updated"] == 2
+
+        stats = TriageService.retriage_all(session, chunk_size=2)
+        assert stats["updated"] == 2
+        assert stats["by_category"] == {"CRITICAL": 1, "MODERATE": 1, "LOW": 1}
+
+    with Session(engine) as session:
+        categories = sorted(c.triage_category.value for c in session.query(Consultation).all() if c.triage_category)
+        assert categories == ["CRITICAL", "LOW", "LOW", "MODERATE"]
+        assert TriageService.retriage_all(session)["updated"] == 0
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from fastapi import Response
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.api.v1.admin import get_triage_queue
+from app.models.base import (
+    Appointment, AppointmentStatus, Consultation, PatientProfile, TriageCategory, User, UserRole,
+)
+
+NOW = datetime.utcnow()
+
+
+def _add(session, doctor, name, minutes_ago, status=AppointmentStatus.CHECKED_IN, category=None, score=None):
+    patient = User(email=f"{name}@example.com", password_hash="x", role=UserRole.PATIENT)
+    session.add(patient)
+    session.flush()
+    session.add(PatientProfile(user_id=patient.id, first_name=name, last_name="doe"))
+    appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, scheduled_at=NOW - timedelta(minutes=minutes_ago), status=status)
+    session.add(appointment)
+    session.flush()
+    if category or score:
+        session.add(Consultation(
+            appointment_id=appointment.id, patient_id=patient.id, doctor_id=doctor.id,
+            triage_category=category, urgency_score=score, triage_reason="seizure" if category else None,
+        ))
+
+
+def test_queue_is_one_ordered_paginated_query():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        doctor = User(email="doc@example.com", password_hash="x", role=UserRole.DOCTOR)
+        session.add(doctor)
+        session.flush()
+        _add(session, doctor, "low_early", 90)
+        _add(session, doctor, "critical_late", 5, category=TriageCategory.CRITICAL, score=95)
+        _add(session, doctor, "high", 30, category=TriageCategory.HIGH, score=70)
+        _add(session, doctor, "critical_early", 60, category=TriageCategory.CRITICAL, score=90)
+        _add(session, doctor, "untriaged", 45, score=30)  # Consultation without a category counts as LOW
+        _add(session, doctor, "done", 120, status=AppointmentStatus.COMPLETED, category=TriageCategory.CRITICAL)
+        session.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(1))
+    user = User(email="fd@example.com", password_hash="x", role=UserRole.FRONT_DESK)
+    with Session(engine) as session:
+        response = Response()
+        queue = get_triage_queue(response, limit=10, offset=0, session=session, current_user=user)
+        page = get_triage_queue(Response(), limit=2, offset=2, session=session, current_user=user)
+        # Clients that do not page get the whole queue
+        unpaged = get_triage_queue(Response(), limit=None, offset=0, session=session, current_user=user)
+
+    assert [q["name"] for q in queue] == ["Critical_early Doe", "Critical_late Doe", "High Doe", "Low_early Doe", "Untriaged Doe"]
+    assert [q["triageCategory"] for q in queue] == ["CRITICAL", "CRITICAL", "HIGH", "LOW", "LOW"]
+    assert [q["triageScore"] for q in queue] == [90, 95, 70, 20, 30]
+    assert queue[0]["triageReason"] == "seizure" and queue[0]["waitTime"] == 60
+    assert response.headers["X-Total-Count"] == "5"
+    assert page == queue[2:4] and unpaged == queue
+    # Rows plus total, per page, regardless of queue length
+    assert len(statements) == 6
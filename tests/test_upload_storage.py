@@ -0,0 +1,76 @@
+import hashlib
+import io
+import os
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.api.v1 import consultations
+from app.models.base import Consultation, User, UserRole
+
+from app.services import upload_storage
+from app.services.transcript_cache import TranscriptCache
+from app.services.upload_storage import UploadTooLarge, move_upload, save_upload
+
+
+def _upload(data: bytes, declared_size=None) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename="visit.webm", size=declared_size)
+
+
+@pytest.mark.asyncio
+async def test_save_upload_hashes_and_counts_in_one_pass(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_storage, "UPLOAD_CHUNK_SIZE", 1000)
+    data = os.urandom(4500)
+    stored = await save_upload(_upload(data), str(tmp_path / "a.webm"), max_bytes=5000)
+
+    assert stored.size == 4500 and stored.sha256 == hashlib.sha256(data).hexdigest()
+    assert (tmp_path / "a.webm").read_bytes() == data
+    assert os.listdir(tmp_path) == ["a.webm"]
+
+    moved = await move_upload(stored, str(tmp_path / "b.webm"))
+    assert (moved.size, moved.sha256) == (stored.size, stored.sha256)
+    assert os.listdir(tmp_path) == ["b.webm"]
+
+    # The upload's hash stands in for re-reading the file
+    cache = TranscriptCache(str(tmp_path / "cache"), 1024)
+    assert cache.make_key(moved.path, "fp") == cache.make_key("missing.webm", "fp", moved.sha256)
+
+
+@pytest.mark.asyncio
+async def test_oversized_uploads_stop_streaming_and_leave_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_storage, "UPLOAD_CHUNK_SIZE", 1000)
+    upload = _upload(os.urandom(5001))
+    with pytest.raises(UploadTooLarge):
+        await save_upload(upload, str(tmp_path / "a.webm"), max_bytes=5000)
+    assert os.listdir(tmp_path) == []
+
+    # A declared size over the cap is rejected before reading anything
+    upload = _upload(os.urandom(10), declared_size=10_000)
+    with pytest.raises(UploadTooLarge):
+        await save_upload(upload, str(tmp_path / "a.webm"), max_bytes=5000)
+    assert upload.file.tell() == 0 and os.listdir(tmp_path) == []
+
+
+class _FailingSession:
+    """Finds the consultation, then fails on the first query after the upload is stored."""
+
+    async def get(self, model, id):
+        return Consultation(id=id)
+
+    async def exec(self, statement):
+        raise RuntimeError("database unavailable")
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_handler_removes_the_stored_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(consultations, "UPLOAD_DIR", str(tmp_path))
+    doctor = User(email="doc@example.com", hashed_password="x", role=UserRole.DOCTOR)
+
+    with pytest.raises(HTTPException) as exc:
+        await consultations.upload_audio(
+            uuid4(), file=_upload(os.urandom(100)), source=None,
+            session=_FailingSession(), current_user=doctor,
+        )
+    assert exc.value.status_code == 500
+    assert os.listdir(tmp_path) == []